@@ -9,6 +9,7 @@ import asyncio
 import json
 import os
 import threading
+import time
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import argparse
 from random import random, seed
@@ -25,6 +26,7 @@ from datetime import datetime, timedelta
 
 from joblib import load
 
+from common.cooldown import STATUS_PATH, create_status
 from stopwatch import Stopwatch
 
 from dataclasses import dataclass
@@ -245,20 +247,35 @@ def simulate_workload_random(function: str):
 
 pr_lock = threading.Lock()
 number_of_parallel_requests_pending = 0
+# requests the RequestHandler is working on, including those that did not reach the model yet
+number_of_requests_in_progress = 0
+last_completion_time = None
 startedCommands = {}
 
+# resolve the models relative to this file, so that the simulator can run in any working directory,
+# e.g., one per instance of a parallel sweep
+MODELS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Models")
+
+
+def load_requests_mapping(path: str) -> dict:
+    if path.endswith(".json"):
+        with open(path) as mapping_file:
+            return json.load(mapping_file)
+
+    return load(path)
+
+
 if MASCOTS2022:
-    predictive_model = load("Models/gs_model_prod_workload_mascots2022.joblib")
-    known_request_types = load("Models/gs_requests_mapping_prod_workload_mascots2022.joblib")
+    predictive_model = load(os.path.join(MODELS_DIRECTORY, "gs_model_prod_workload_mascots2022.joblib"))
+    known_request_types = load(os.path.join(MODELS_DIRECTORY, "gs_requests_mapping_prod_workload_mascots2022.joblib"))
 
     logger.debug(type(predictive_model))
 else:
     # predictive_model = load("Models/gs_model_LR_03-11-2022.joblib")
     # known_request_types = load("Models/gs_requests_mapping_03-11-2022.joblib")
 
-    predictive_model = load("Models/gs_model_DT_18-03-2023.joblib")
-    with open("Models/gs_requests_mapping_18-03-2023.json") as mapping_file:
-        known_request_types = json.load(mapping_file)
+    predictive_model = load(os.path.join(MODELS_DIRECTORY, "gs_model_DT_18-03-2023.joblib"))
+    known_request_types = load_requests_mapping(os.path.join(MODELS_DIRECTORY, "gs_requests_mapping_18-03-2023.json"))
 
     logger.debug(type(predictive_model))
 
@@ -269,7 +286,7 @@ async def simulate_workload_using_predictive_model(function: str, stopwatch: Sto
     by a predictive model.
     """
 
-    global number_of_parallel_requests_pending
+    global number_of_parallel_requests_pending, last_completion_time
 
     with pr_lock:
         number_of_parallel_requests_at_beginning = number_of_parallel_requests_pending
@@ -329,6 +346,7 @@ async def simulate_workload_using_predictive_model(function: str, stopwatch: Sto
 
     with pr_lock:
         number_of_parallel_requests_pending -= 1
+        last_completion_time = time.time()
 
     startedCommands.pop(tid)
 
@@ -401,6 +419,10 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         request_path = self.path
 
+        if request_path == STATUS_PATH:
+            self.send_status()
+            return
+
         print("\n----- Request Start ----->\n")
         print("Request path:", request_path)
         print("Request headers:", self.headers)
@@ -410,7 +432,33 @@ class RequestHandler(BaseHTTPRequestHandler):
         self.send_header("Set-Cookie", "foo=bar")
         self.end_headers()
 
+    def send_status(self):
+        with pr_lock:
+            status = create_status(
+                number_of_requests_in_progress,
+                max(0, number_of_requests_in_progress - number_of_parallel_requests_pending),
+                last_completion_time
+            )
+
+        body = json.dumps(status).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
     def do_POST(self):
+        global number_of_requests_in_progress
+
+        with pr_lock:
+            number_of_requests_in_progress += 1
+        try:
+            self.handle_command()
+        finally:
+            with pr_lock:
+                number_of_requests_in_progress -= 1
+
+    def handle_command(self):
 
         request_path = self.path
 
@@ -456,14 +504,13 @@ class RequestHandler(BaseHTTPRequestHandler):
     do_DELETE = do_GET
 
 
-def main():
+def main(port: int = 1337):
     scheduler.start()
 
     # inject_a_fault_every_s_seconds(60)
     if MASCOTS2020:
         inject_three_faults_in_a_row()
 
-    port = 1337
     logger.info('Listening on localhost:%s' % port)
     server = ThreadingHTTPServerWithBigQueue(('', port), RequestHandler)
     server.serve_forever()
@@ -509,11 +556,20 @@ if __name__ == "__main__":
     parser.add_argument('--prod', dest='workload_model', action='store_const',
                         const="production", default="staging",
                         help='simulate production workload (default: simulate staging workload)')
+    parser.add_argument('--port', type=int, default=1337, help='port to listen on (default: 1337)')
+    parser.add_argument('--model', help='predictive model to use, e.g., Models/gs_model_Ridge_18-03-2023.joblib')
+    parser.add_argument('--mapping', help='request type mapping of the model (.json or .joblib)')
 
     args = parser.parse_args()
 
     current_model = model_production if args.workload_model == "production" else model_staging
 
+    if args.model is not None:
+        predictive_model = load(args.model)
+        logger.info("Predictive model: %s", args.model)
+    if args.mapping is not None:
+        known_request_types = load_requests_mapping(args.mapping)
+
     logger.info("Workload to simulate: %s", args.workload_model)
 
     # initialize the random seed value to get reproducible random sequences
@@ -522,4 +578,4 @@ if __name__ == "__main__":
     # use one worker for now, because the program is not using shared memory
     # uvicorn.run("ARS_simulation:app", host="0.0.0.0", port=1337, log_level="warning", workers=1, backlog = 1024)
 
-    main()
+    main(args.port)
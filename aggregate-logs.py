@@ -1,9 +1,161 @@
+import csv
 import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy
 import typer
 
+from common.response_time_histogram import ResponseTimeHistogram
+
 app = typer.Typer()
 
+
+@dataclass
+class ClientStatistics:
+    """
+    Running statistics of the steps with the same number of clients, over all log files.
+    Response times are in seconds, like in the logs; the histograms count them in milliseconds.
+    The response times of every run are kept for the table printed to stdout.
+    """
+    runs: int = 0
+    avgs: List[float] = field(default_factory=list)
+    maxs: List[float] = field(default_factory=list)
+    max_of_max: float = -math.inf
+    avg_histogram: ResponseTimeHistogram = field(default_factory=ResponseTimeHistogram)
+    max_histogram: ResponseTimeHistogram = field(default_factory=ResponseTimeHistogram)
+
+    def add(self, avgs: numpy.ndarray, maxs: numpy.ndarray):
+        self.runs += len(avgs)
+        self.avgs.extend(avgs.tolist())
+        self.maxs.extend(maxs.tolist())
+        self.max_of_max = max(self.max_of_max, float(maxs.max()))
+        self.avg_histogram.add(avgs * 1000)
+        self.max_histogram.add(maxs * 1000)
+
+    def merge(self, other: 'ClientStatistics'):
+        self.runs += other.runs
+        self.avgs.extend(other.avgs)
+        self.maxs.extend(other.maxs)
+        self.max_of_max = max(self.max_of_max, other.max_of_max)
+        self.avg_histogram.merge(other.avg_histogram)
+        self.max_histogram.merge(other.max_histogram)
+
+    @property
+    def mean_avg(self) -> float:
+        return sum(self.avgs) / self.runs
+
+    @property
+    def mean_max(self) -> float:
+        return sum(self.maxs) / self.runs
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "runs": self.runs,
+            "mean_avg": self.mean_avg,
+            "mean_max": self.mean_max,
+            "max_max": self.max_of_max,
+            "p50_avg": self.avg_histogram.percentile(0.5) / 1000,
+            "p95_avg": self.avg_histogram.percentile(0.95) / 1000,
+            "p50_max": self.max_histogram.percentile(0.5) / 1000,
+            "p95_max": self.max_histogram.percentile(0.95) / 1000,
+        }
+
+
+def parse_line(line: str) -> Optional[Tuple[float, float, float]]:
+    """
+    Parses lines like `Clients: 10: avg: 0.5s, max: 2.1s` into (clients, avg, max).
+    """
+    if 'Clients' not in line:
+        return None
+
+    lineAfterClients = line.split('Clients')[1]
+
+    cleanedLine = lineAfterClients.replace('s', '')
+    cleanedLine = cleanedLine.replace(',', '')
+    cleanedLine = cleanedLine.replace('avg', '')
+    cleanedLine = cleanedLine.replace('max', '')
+
+    splittedLine = cleanedLine.split(':')
+
+    clients = float(splittedLine[1])
+    avg = float(splittedLine[3])
+    max = float(splittedLine[4])
+
+    return clients, avg, max
+
+
+def aggregate_file(path: Path) -> Dict[float, ClientStatistics]:
+    values: Dict[float, Tuple[List[float], List[float]]] = {}
+
+    with open(path, 'r') as file_obj:
+        for line in file_obj:
+            parsed = parse_line(line)
+            if parsed is None:
+                continue
+
+            clients, avg, max = parsed
+            if clients not in values:
+                values[clients] = ([], [])
+            values[clients][0].append(avg)
+            values[clients][1].append(max)
+
+    results: Dict[float, ClientStatistics] = {}
+    for clients, (avgs, maxs) in values.items():
+        results[clients] = ClientStatistics()
+        results[clients].add(numpy.array(avgs), numpy.array(maxs))
+
+    return results
+
+
+def aggregate_files(paths, jobs: int) -> Dict[float, ClientStatistics]:
+    """
+    Reads the files in `jobs` processes and merges their statistics in the order of `paths`.
+    """
+    results: Dict[float, ClientStatistics] = {}
+
+    def merge(file_results: Dict[float, ClientStatistics]):
+        for clients, statistics in file_results.items():
+            if clients not in results:
+                results[clients] = statistics
+            else:
+                results[clients].merge(statistics)
+
+    if jobs <= 1:
+        for path in paths:
+            merge(aggregate_file(path))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for file_results in executor.map(aggregate_file, paths, chunksize=8):
+                merge(file_results)
+
+    return dict(sorted(results.items()))
+
+
+def write_csv(summaries: Dict[float, Dict[str, float]], path: Path):
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        columns = None
+        for clients, summary in summaries.items():
+            if columns is None:
+                columns = list(summary.keys())
+                writer.writerow(["num_clients"] + columns)
+            writer.writerow([clients] + [summary[c] for c in columns])
+
+
+def write_json(summaries: Dict[float, Dict[str, float]], path: Path):
+    with open(path, 'w') as json_file:
+        json.dump(
+            [{"num_clients": clients, **summary} for clients, summary in summaries.items()],
+            json_file,
+            indent=2
+        )
+
+
 @app.command()
 def main(
     directory: str = typer.Argument(
@@ -14,92 +166,38 @@ def main(
         "*locust-parameter-variation*.log",
         "--pattern", "-p",
         help="File pattern to search for"
+    ),
+    jobs: int = typer.Option(
+        os.cpu_count() or 1,
+        "--jobs", "-j",
+        help="Number of processes that read the log files"
     )
 ):
     """Aggregate locust parameter variation logs."""
-    results = []
-    
     search_dir = Path(directory)
     if not search_dir.exists():
         typer.echo(f"Error: Directory '{directory}' does not exist", err=True)
         raise typer.Exit(1)
 
-    for path in search_dir.rglob(pattern):
-        # print(path)
-
-        with open(path, 'r') as file_obj:
-            for line in file_obj:
-                if 'Clients' not in line:
-                    continue
-
-                lineAfterClients = line.split('Clients')[1]
-
-                cleanedLine = lineAfterClients.replace('s', '')
-                cleanedLine = cleanedLine.replace(',', '')
-                cleanedLine = cleanedLine.replace('avg', '')
-                cleanedLine = cleanedLine.replace('max', '')
-
-                splittedLine = cleanedLine.split(':')
-
-                clients = float(splittedLine[1])
-                avg = float(splittedLine[3])
-                max = float(splittedLine[4])
-
-                # print(f"{clients}, {avg}, {max}")
-
-                found = False
-                for kv in results:
-                    if kv['num_clients'] == clients:
-                        kv['values'].append(
-                            {
-                                'avg': avg,
-                                'max': max
-                            }
-                        )
-                        found = True
-
-                if not found:
-                    results.append(
-                        {
-                            'num_clients': clients,
-                            'values': [{'avg': avg, 'max': max}],
-                            'mean_of_values': {'avg': 0, 'max': 0}
-                        }
-                    )
-
-    results.sort(key=lambda r: r['num_clients'])
-
-    for result in results:
-        mean_avg = 0
-        mean_max = 0
-        for value in result['values']:
-            mean_avg += value['avg']
-            mean_max += value['max']
-        mean_avg /= len(result['values'])
-        mean_max /= len(result['values'])
-        result['mean_of_values']['avg'] = mean_avg
-        result['mean_of_values']['max'] = mean_max
-
-    json_string = json.dumps(results, indent=2)
-    # print(json_string)
+    paths = list(search_dir.rglob(pattern))
+    results = aggregate_files(paths, jobs)
+    summaries = {clients: statistics.summary() for clients, statistics in results.items()}
 
     print("# Clients, Avg. Response Time, Max Response Time, Mean Avg. Response Time, Mean Max Response Time")
-    for result in results:
-        for value in result['values']:
-            print(f"{result['num_clients']}, {value['avg']}, {value['max']}, {result['mean_of_values']['avg']}, {result['mean_of_values']['max']}")
+    for clients, statistics in results.items():
+        for avg, max in zip(statistics.avgs, statistics.maxs):
+            print(f"{clients}, {avg}, {max}, {statistics.mean_avg}, {statistics.mean_max}")
 
     output_file = search_dir / "aggregated_logs.log"
     with open(output_file, 'w') as file_obj:
-        for result in results:
-            file_obj.write(f"Clients: {result['num_clients']}: "
-                           f"avg: {result['mean_of_values']['avg']}, "
-                           f"max: {result['mean_of_values']['max']}\n")
-
-if __name__ == "__main__":
-    app()
-
-
-
+        for clients, statistics in results.items():
+            file_obj.write(f"Clients: {clients}: "
+                           f"avg: {statistics.mean_avg}, "
+                           f"max: {statistics.mean_max}\n")
 
+    write_csv(summaries, search_dir / "aggregated_logs.csv")
+    write_json(summaries, search_dir / "aggregated_logs.json")
 
 
+if __name__ == "__main__":
+    app()
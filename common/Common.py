@@ -1,42 +1,249 @@
 import logging
 import os
+import re
+import subprocess
+import time
+from collections import deque
+from dataclasses import dataclass, field
 from os import path
-from re import search
 from datetime import datetime, timedelta
-from typing import Dict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
+import numpy
 
-def read_response_times_from_locust_logfile(path: str):
-    response_times = []
-    time_stamps = []
+from common.locust_fleet import LocustWorkerFleet, default_number_of_workers, locust_executable, pin_to_cpus
 
-    if 'locust_log' not in path:
-        return response_times
+_TIME_STAMP_PATTERN = re.compile(r'\[(.*?)\]')
+_REQUEST_TYPE_PATTERN = re.compile(r'\(.*\)')
+_RESPONSE_TIME_PATTERN = re.compile(r'(?<=Response time\s)\d*')
+
+# the locustfiles import the common package, also when Locust runs in another working directory
+_REPOSITORY_DIRECTORY = path.dirname(path.dirname(path.abspath(__file__)))
+
+_EPOCH = datetime(1970, 1, 1)
+_NS_PER_SECOND = 1_000_000_000
+_NS_PER_MS = 1_000_000
+
+# Locust logs with millisecond resolution, so requests logged within the same millisecond get the same time stamp.
+# To keep the time stamps unique, we shift such a time stamp by 100 µs until it does not collide anymore.
+_COLLISION_OFFSET_NS = 100_000
+
+
+@dataclass
+class ResponseTimes:
+    """
+    Columnar representation of the response times in a Locust log file.
+    `request_type_codes[i]` indexes `request_types`; -1 means the line had no request type.
+    """
+    time_stamps_ns: numpy.ndarray = field(default_factory=lambda: numpy.empty(0, dtype=numpy.int64))
+    request_type_codes: numpy.ndarray = field(default_factory=lambda: numpy.empty(0, dtype=numpy.int32))
+    response_times_ms: numpy.ndarray = field(default_factory=lambda: numpy.empty(0, dtype=numpy.float64))
+    request_types: List[str] = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.time_stamps_ns)
+
+    @property
+    def time_stamps(self) -> numpy.ndarray:
+        return self.time_stamps_ns.astype('datetime64[ns]')
+
+    def request_type_of(self, code: int) -> Optional[str]:
+        return None if code < 0 else self.request_types[code]
+
+    @staticmethod
+    def concatenate(chunks: List['ResponseTimes']) -> 'ResponseTimes':
+        if len(chunks) == 0:
+            return ResponseTimes()
+
+        # the request type codes of all chunks refer to the same (growing) table, so the last table is valid for all
+        return ResponseTimes(
+            numpy.concatenate([c.time_stamps_ns for c in chunks]),
+            numpy.concatenate([c.request_type_codes for c in chunks]),
+            numpy.concatenate([c.response_times_ms for c in chunks]),
+            list(chunks[-1].request_types)
+        )
+
+
+class _TimestampDeduplicator:
+    """
+    Keeps time stamps unique in O(1) per time stamp.
+    Only the time stamps of the last second are remembered because the log is written in chronological order.
+    """
+
+    def __init__(self, window_ns: int = _NS_PER_SECOND, recent_time_stamps_ns=()):
+        self._window_ns = window_ns
+        self._seen = set()
+        self._order = deque()
+        self._latest = 0
+
+        for time_stamp_ns in sorted(recent_time_stamps_ns):
+            self._remember(int(time_stamp_ns))
+
+    def make_unique(self, time_stamp_ns: int) -> int:
+        while time_stamp_ns in self._seen:
+            time_stamp_ns += _COLLISION_OFFSET_NS
+
+        self._remember(time_stamp_ns)
+
+        return time_stamp_ns
 
-    with open(path) as logfile:
-        for line in logfile:
-            if 'Response time' not in line:
+    def _remember(self, time_stamp_ns: int):
+        self._seen.add(time_stamp_ns)
+        self._order.append(time_stamp_ns)
+
+        self._latest = max(self._latest, time_stamp_ns)
+        while self._order[0] < self._latest - self._window_ns:
+            self._seen.discard(self._order.popleft())
+
+
+class _TimestampParser:
+    """
+    Parses time stamps like [2020-06-30 15:20:02,168] by slicing the fixed format
+    and caching the days, falling back to strptime for anything else.
+    """
+
+    def __init__(self):
+        self._days_in_ns: Dict[str, int] = {}
+
+    def parse(self, line: str) -> int:
+        if len(line) > 24 and line[0] == '[' and line[24] == ']' and line[11] == ' ' and line[20] == ',':
+            day = line[1:11]
+            day_in_ns = self._days_in_ns.get(day)
+            if day_in_ns is None:
+                day_in_ns = self._to_ns(datetime(int(day[0:4]), int(day[5:7]), int(day[8:10])))
+                self._days_in_ns[day] = day_in_ns
+
+            seconds = int(line[12:14]) * 3600 + int(line[15:17]) * 60 + int(line[18:20])
+            return day_in_ns + seconds * _NS_PER_SECOND + int(line[21:24]) * _NS_PER_MS
+
+        time_stamp = datetime.strptime(_TIME_STAMP_PATTERN.search(line).group(), '[%Y-%m-%d %H:%M:%S,%f]')
+        return self._to_ns(time_stamp)
+
+    @staticmethod
+    def _to_ns(time_stamp: datetime) -> int:
+        return datetime_to_ns(time_stamp)
+
+
+def datetime_to_ns(time_stamp: datetime) -> int:
+    delta = time_stamp - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * _NS_PER_SECOND + delta.microseconds * 1000
+
+
+def ns_to_datetime(time_stamp_ns: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=time_stamp_ns // 1000)
+
+
+def iter_response_times_from_locust_logfile(
+        path: str,
+        start_offset: int = 0,
+        end_offset: int = None,
+        recent_time_stamps_ns=()
+) -> Iterator[Tuple[int, Optional[str], float]]:
+    """
+    Streams (time stamp in ns, request type, response time in ms) from a Locust log file in a single pass.
+
+    Only the lines within the byte range [start_offset, end_offset) are parsed.
+    When continuing a previous parse, pass the time stamps of its last second as `recent_time_stamps_ns`,
+    so that they are taken into account for keeping time stamps unique.
+    """
+    time_stamp_parser = _TimestampParser()
+    deduplicator = _TimestampDeduplicator(recent_time_stamps_ns=recent_time_stamps_ns)
+
+    with open(path, 'rb') as logfile:
+        logfile.seek(start_offset)
+        offset = start_offset
+
+        for raw_line in logfile:
+            offset += len(raw_line)
+            if end_offset is not None and offset > end_offset:
+                break
+
+            if b'Response time' not in raw_line:
                 continue
 
-            time_stamp = datetime.strptime(search('\\[.*\\]', line).group(), '[%Y-%m-%d %H:%M:%S,%f]')
-            request_type = search('\\(.*\\)', line)
+            line = raw_line.decode('utf-8', errors='replace')
+
+            time_stamp_ns = deduplicator.make_unique(time_stamp_parser.parse(line))
+
+            request_type = _REQUEST_TYPE_PATTERN.search(line)
             if request_type is not None:
-                request_type = request_type.group()
-                request_type = request_type.strip('()')
-            response_time = search('(?<=Response time\\s)\\d*', line).group()
-
-            while True:
-                if time_stamp in time_stamps:
-                    time_stamp += timedelta(microseconds=100)
-                else:
-                    break
+                request_type = request_type.group().strip('()')
 
-            time_stamps.append(time_stamp)
-            response_times.append({
-                "time_stamp": time_stamp,
-                "request_type": request_type,
-                "response_time_ms": float(response_time)
-            })
+            response_time = _RESPONSE_TIME_PATTERN.search(line).group()
+
+            yield time_stamp_ns, request_type, float(response_time)
+
+
+def iter_response_time_chunks_from_locust_logfile(
+        path: str,
+        chunk_size: int = 100_000,
+        start_offset: int = 0,
+        end_offset: int = None,
+        previous: ResponseTimes = None
+) -> Iterator[ResponseTimes]:
+    """
+    Like `read_response_times_from_locust_logfile_as_columns`, but yields chunks of at most `chunk_size` rows,
+    so that the memory required does not depend on the size of the log file.
+
+    Pass the result of a previous parse as `previous` to continue it at `start_offset`;
+    the request type codes of the chunks then extend the request types of `previous`.
+    """
+    request_types: List[str] = []
+    recent_time_stamps_ns = ()
+    if previous is not None:
+        request_types = list(previous.request_types)
+        if len(previous) > 0:
+            latest = previous.time_stamps_ns.max()
+            recent_time_stamps_ns = previous.time_stamps_ns[previous.time_stamps_ns >= latest - _NS_PER_SECOND]
+
+    request_type_codes: Dict[str, int] = {request_type: code for code, request_type in enumerate(request_types)}
+
+    time_stamps_ns = numpy.empty(chunk_size, dtype=numpy.int64)
+    codes = numpy.empty(chunk_size, dtype=numpy.int32)
+    response_times_ms = numpy.empty(chunk_size, dtype=numpy.float64)
+
+    i = 0
+    for time_stamp_ns, request_type, response_time_ms in iter_response_times_from_locust_logfile(
+            path, start_offset, end_offset, recent_time_stamps_ns
+    ):
+        if request_type is None:
+            code = -1
+        else:
+            code = request_type_codes.get(request_type)
+            if code is None:
+                code = len(request_types)
+                request_type_codes[request_type] = code
+                request_types.append(request_type)
+
+        time_stamps_ns[i] = time_stamp_ns
+        codes[i] = code
+        response_times_ms[i] = response_time_ms
+        i += 1
+
+        if i == chunk_size:
+            yield ResponseTimes(time_stamps_ns.copy(), codes.copy(), response_times_ms.copy(), list(request_types))
+            i = 0
+
+    if i > 0:
+        yield ResponseTimes(time_stamps_ns[:i].copy(), codes[:i].copy(), response_times_ms[:i].copy(), list(request_types))
+
+
+def read_response_times_from_locust_logfile_as_columns(path: str) -> ResponseTimes:
+    return ResponseTimes.concatenate(list(iter_response_time_chunks_from_locust_logfile(path)))
+
+
+def read_response_times_from_locust_logfile(path: str):
+    response_times = []
+
+    if 'locust_log' not in path:
+        return response_times
+
+    for time_stamp_ns, request_type, response_time_ms in iter_response_times_from_locust_logfile(path):
+        response_times.append({
+            "time_stamp": ns_to_datetime(time_stamp_ns),
+            "request_type": request_type,
+            "response_time_ms": response_time_ms
+        })
 
     return response_times
 
@@ -46,65 +253,87 @@ def call_locust_and_distribute_work(
         clients, 
         runtime_in_min, 
         use_load_test_shape=True, 
-        num_workers=5, 
-        use_manual_runtime_management=False
+        num_workers=None,
+        use_manual_runtime_management=False,
+        should_stop: Optional[Callable[[], bool]] = None,
+        poll_interval_s=1,
+        master_port: Optional[int] = None,
+        cpus: Optional[List[int]] = None,
+        working_directory: Optional[str] = None
     ):
+    """
+    Runs a distributed load test with a master and `num_workers` workers (default: one per CPU core).
+    The workers are supervised by a LocustWorkerFleet and are terminated once the master has finished.
+    If `should_stop` is given, it is called every `poll_interval_s` seconds while the master is running;
+    as soon as it returns True, the master is stopped, which makes Locust write its statistics and quit.
+    To run several load tests at the same time, give each one its own `master_port`, `cpus` to pin
+    the master and its workers to, and `working_directory` for the log and csv files.
+    """
     logger = logging.getLogger('call_locust_and_distribute_work')
 
-    params = f"-f {locust_script} "
-    params += f"--host={url} "
-    params += "--headless "
-    params += "--stop-timeout 10 "
-    params += "--only-summary "
+    if num_workers is None:
+        num_workers = default_number_of_workers()
 
-    locust_path = "locust"
-    if path.exists("venv/bin/locust"):
-        locust_path = "venv/bin/locust"
-
-    for i in range(0, num_workers):
-        logger.info(f"Starting {i+1}. worker")
-
-        if use_manual_runtime_management:
-            os.system(
-                f"env use_load_test_shape={use_load_test_shape} \
-                env EXPERIMENT_RUNTIME={runtime_in_min} \
-                {locust_path} {params} \
-                --logfile worker_log_{clients}.{i+1}.log \
-                --worker &"
-            )
-        else:
-            os.system(
-                f"env use_load_test_shape={use_load_test_shape} \
-                {locust_path} {params} \
-                --logfile worker_log_{clients}.{i+1}.log \
-                --worker &"
-            )
+    locust_path = locust_executable()
 
-    logger.info("Starting master to run for %s min", runtime_in_min)
-    logger.info(f"--expect-workers={num_workers}")
+    locust_command = [
+        locust_path,
+        "-f", path.abspath(locust_script),
+        f"--host={url}",
+        "--headless",
+        "--stop-timeout", "10",
+        "--only-summary"
+    ]
 
+    env = os.environ.copy()
+    env["use_load_test_shape"] = str(use_load_test_shape)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [_REPOSITORY_DIRECTORY, env.get("PYTHONPATH")]))
+    # for the load test shape of the master, the workers get their index from the fleet
+    env["LOCUST_WORKER_COUNT"] = str(num_workers)
     if use_manual_runtime_management:
-        os.system(
-            f"env use_load_test_shape={use_load_test_shape} \
-            env EXPERIMENT_RUNTIME={runtime_in_min} \
-            {locust_path} {params} \
-                --users={clients} --spawn-rate={num_workers * 100} \
-                --logfile locust_log_{clients}.log \
-                --csv=loadtest_{clients}_clients \
-                --master \
-                --expect-workers={num_workers}"
-        )
-    else:
-        os.system(
-            f"env use_load_test_shape={use_load_test_shape} \
-            {locust_path} {params} \
-                --run-time={runtime_in_min}m \
-                --users={clients} --spawn-rate={num_workers * 100} \
-                --logfile locust_log_{clients}.log \
-                --csv=loadtest_{clients}_clients \
-                --master \
-                --expect-workers={num_workers}"
-        )
+        env["EXPERIMENT_RUNTIME"] = str(runtime_in_min)
+
+    master_command = locust_command + [
+        f"--users={clients}", f"--spawn-rate={num_workers * 100}",
+        "--logfile", f"locust_log_{clients}.log",
+        f"--csv=loadtest_{clients}_clients",
+        "--master",
+        f"--expect-workers={num_workers}"
+    ]
+    if not use_manual_runtime_management:
+        master_command.append(f"--run-time={runtime_in_min}m")
+
+    worker_command = locust_command
+    if master_port is not None:
+        master_command.append(f"--master-bind-port={master_port}")
+        worker_command = locust_command + [f"--master-port={master_port}"]
+
+    fleet = LocustWorkerFleet(
+        worker_command,
+        lambda i: f"worker_log_{clients}.{i}.log",
+        num_workers,
+        env,
+        cwd=working_directory,
+        cpus=cpus
+    )
+    with fleet:
+        logger.info("Starting master to run for %s min", runtime_in_min)
+        logger.info(f"--expect-workers={num_workers}")
+
+        if should_stop is None:
+            subprocess.run(master_command, env=env, cwd=working_directory, preexec_fn=pin_to_cpus(cpus))
+            return
+
+        master = subprocess.Popen(master_command, env=env, cwd=working_directory, preexec_fn=pin_to_cpus(cpus))
+        try:
+            while master.poll() is None:
+                if should_stop():
+                    logger.info("Stopping master early")
+                    master.terminate()
+                    break
+                time.sleep(poll_interval_s)
+        finally:
+            master.wait()
 
 
 def call_locust_with(locust_script, url, clients, runtime_in_min=-1, omit_csv_files=False, use_load_test_shape=True, locust_logfile="locust_log.log"):
@@ -120,9 +349,7 @@ def call_locust_with(locust_script, url, clients, runtime_in_min=-1, omit_csv_fi
     if omit_csv_files is False:
         params += f"--csv=loadtest_{clients}_clients "
     
-    locust_path = "locust"
-    if path.exists("venv/bin/locust"):
-        locust_path = "venv/bin/locust"
+    locust_path = locust_executable()
 
     if runtime_in_min > 0:
         os.system(
@@ -0,0 +1,151 @@
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+# Importing gevent is fine here, because this module is only imported by locustfiles.
+import gevent
+import numpy
+from gevent.pool import Pool
+
+from common.response_time_histogram import ResponseTimeHistogram
+from common.workload_trace import TraceReplay, WorkloadTrace
+
+# Open-loop load generation: requests are sent at precomputed arrival times, independent of the response times,
+# so that a slow system under test does not slow down the load like it does with users that wait for responses.
+# An arrival schedule is a sorted array of send times in seconds since the start of the schedule.
+
+
+def poisson_arrivals(rate_per_s: float, duration_s: float, seed: int = 42) -> numpy.ndarray:
+    """
+    Arrivals of a Poisson process, i.e., with exponentially distributed inter-arrival times.
+    """
+    random = numpy.random.default_rng(seed)
+    # a few more than expected, so that one draw almost always covers the duration
+    expected = int(rate_per_s * duration_s + 6 * numpy.sqrt(rate_per_s * duration_s) + 10)
+
+    arrivals = numpy.cumsum(random.exponential(1 / rate_per_s, expected))
+    while arrivals[-1] < duration_s:
+        more = arrivals[-1] + numpy.cumsum(random.exponential(1 / rate_per_s, expected))
+        arrivals = numpy.concatenate((arrivals, more))
+
+    return arrivals[arrivals < duration_s]
+
+
+def arrivals_from_counts(requests_per_second: numpy.ndarray, seed: int = 42) -> numpy.ndarray:
+    """
+    Spreads the requests of every second uniformly at random within the second, e.g., the recorded requests per second.
+    """
+    random = numpy.random.default_rng(seed)
+    seconds = numpy.repeat(numpy.arange(len(requests_per_second), dtype=numpy.float64), requests_per_second)
+
+    return numpy.sort(seconds + random.random(len(seconds)))
+
+
+def schedule_from_environment(trace: WorkloadTrace) -> numpy.ndarray:
+    """
+    OPEN_LOOP_ARRIVALS selects the schedule:
+    "trace" (default) replays the recorded requests per second, configured like TraceReplay (WORKLOAD_REPLAY_*);
+    "poisson" sends OPEN_LOOP_RATE requests per second on average (default: the maximum of the trace)
+    for OPEN_LOOP_DURATION seconds (default: one hour).
+    """
+    arrivals = os.environ.get('OPEN_LOOP_ARRIVALS', 'trace').lower()
+    seed = int(os.environ.get('OPEN_LOOP_SEED', 42))
+
+    if arrivals == "poisson":
+        return poisson_arrivals(
+            float(os.environ.get('OPEN_LOOP_RATE', trace.max_requests_per_second)),
+            float(os.environ.get('OPEN_LOOP_DURATION', 3600)),
+            seed
+        )
+
+    if arrivals == "trace":
+        replay = TraceReplay.from_environment(trace, force=True)
+        return arrivals_from_counts(replay.requests_per_second_series(), seed)
+
+    raise ValueError(f"Unknown OPEN_LOOP_ARRIVALS {arrivals}, use trace or poisson")
+
+
+class OpenLoopDriver:
+    """
+    Sends a request at every arrival of the schedule in its own greenlet.
+    At most `max_in_flight` requests are sent concurrently; if all of them are waiting for responses,
+    the next request is sent late. How late every request was sent is recorded as the lag of the load generator,
+    so that a lag that grows tells that the load generator, not the system under test, is the bottleneck.
+    """
+
+    def __init__(
+            self,
+            schedule: numpy.ndarray,
+            send: Callable[[int, float], None],
+            max_in_flight: int = 1000,
+            report_interval_s: float = 10
+    ):
+        self.schedule = schedule
+        self._send = send
+        self._pool = Pool(max_in_flight)
+        self._report_interval_s = report_interval_s
+        self._logger = logging.getLogger('OpenLoopDriver')
+
+        self.lag = ResponseTimeHistogram()
+        self._interval_lag = ResponseTimeHistogram()
+        self._lags_ms = []
+        self.number_of_late_requests = 0
+
+    def _flush_lags(self):
+        lags_ms = numpy.array(self._lags_ms)
+        self._lags_ms = []
+        self.lag.add(lags_ms)
+        self._interval_lag.add(lags_ms)
+
+    def _report(self, progress: int):
+        self._flush_lags()
+        if self._interval_lag.count > 0:
+            self._logger.info(
+                f"Sent {progress}/{len(self.schedule)} requests; "
+                f"lag behind schedule in the last {self._report_interval_s} s: "
+                f"p50 {self._interval_lag.percentile(0.5):.0f} ms, "
+                f"p99 {self._interval_lag.percentile(0.99):.0f} ms, "
+                f"max {self._interval_lag.max_ms:.0f} ms; "
+                f"{self._pool.free_count()} of {self._pool.size} requests free"
+            )
+        self._interval_lag = ResponseTimeHistogram()
+
+    def run(self, should_stop: Optional[Callable[[], bool]] = None):
+        """
+        Blocks until every request of the schedule was sent and answered, or until `should_stop` returns True.
+        `send` is called with the index of the request in the schedule and its intended send time (time.time()).
+        """
+        start = time.monotonic()
+        start_wall_clock = time.time()
+        next_report = self._report_interval_s
+
+        for i, arrival_s in enumerate(self.schedule.tolist()):
+            now = time.monotonic() - start
+            if arrival_s > now:
+                gevent.sleep(arrival_s - now)
+
+            # blocks while max_in_flight requests are waiting for responses
+            self._pool.wait_available()
+
+            now = time.monotonic() - start
+            lag_ms = max(now - arrival_s, 0) * 1000
+            self._lags_ms.append(lag_ms)
+            if lag_ms >= 1000:
+                self.number_of_late_requests += 1
+
+            self._pool.spawn(self._send, i, start_wall_clock + arrival_s)
+
+            if now >= next_report:
+                self._report(i + 1)
+                next_report = now + self._report_interval_s
+                if should_stop is not None and should_stop():
+                    break
+
+        self._pool.join()
+        self._flush_lags()
+
+        self._logger.info(
+            f"Lag behind schedule: p50 {self.lag.percentile(0.5):.0f} ms, p99 {self.lag.percentile(0.99):.0f} ms, "
+            f"max {self.lag.max_ms:.0f} ms; {self.number_of_late_requests} requests were sent more than 1 s late"
+        )
@@ -0,0 +1,156 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import Optional
+
+# Real-time requirements every configuration has to comply with.
+AVG_TIME_ALLOWED_IN_S = 10
+MAX_TIME_ALLOWED_IN_S = 30
+
+# CapacitySearchShape appends the result of every step to this file
+CAPACITY_SEARCH_RESULTS_FILE = "capacity_search_results.jsonl"
+
+
+def complies_with_real_time_requirements(average_response_time_s: float, max_response_time_s: float) -> bool:
+    exceeds_average_response_time = average_response_time_s > AVG_TIME_ALLOWED_IN_S
+    exceeds_max_response_time = max_response_time_s > MAX_TIME_ALLOWED_IN_S
+
+    return not (exceeds_average_response_time or exceeds_max_response_time)
+
+
+class CapacitySearch(ABC):
+    """
+    Decides which number of clients to test next, based on whether the previous numbers
+    complied with the real-time requirements.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.last_compliant_num_clients: Optional[int] = None
+        self.first_failed_num_clients: Optional[int] = None
+        self.has_reached_limit = False
+
+    @abstractmethod
+    def next_number_of_clients(self) -> Optional[int]:
+        """
+        Returns the number of clients to test next or None if the search is finished.
+        """
+        pass
+
+    @abstractmethod
+    def report(self, num_clients: int, is_compliant: bool):
+        pass
+
+    def summary(self) -> str:
+        if self.has_reached_limit:
+            return f"System reached limit at {self.limit}. Last execution was with: {self.last_compliant_num_clients}"
+
+        return f"System failed at {self.first_failed_num_clients}"
+
+
+class LinearCapacitySearch(CapacitySearch):
+    """
+    Increases the number of clients linearly (multiplier, 2*multiplier, ...)
+    until a number of clients does not comply with the real-time requirements or the limit is reached.
+    """
+
+    def __init__(self, multiplier: int, limit: int):
+        super().__init__(limit)
+        self.multiplier = multiplier
+        self._x = 1
+        self._is_finished = False
+
+    def next_number_of_clients(self) -> Optional[int]:
+        if self._is_finished:
+            return None
+
+        num_clients = max(self._x * self.multiplier, 1)
+        if num_clients >= self.limit:
+            self.has_reached_limit = True
+            self._is_finished = True
+            return None
+
+        return num_clients
+
+    def report(self, num_clients: int, is_compliant: bool):
+        logging.getLogger('LinearCapacitySearch').info(f"{num_clients} clients --> {is_compliant}")
+
+        if is_compliant:
+            self.last_compliant_num_clients = num_clients
+            self._x += 1
+        else:
+            self.first_failed_num_clients = num_clients
+            self._is_finished = True
+
+
+class AdaptiveCapacitySearch(CapacitySearch):
+    """
+    Brackets the number of clients at which the system fails by doubling the number of clients,
+    starting with `start`. Then, bisects the bracket until it is at most `resolution` clients wide.
+    Every number of clients tested during the bisection is repeated up to `repeats` times and
+    decided by majority, because results close to the capacity of the system are noisy.
+    """
+
+    def __init__(self, start: int, limit: int, resolution: int = 100, repeats: int = 3):
+        super().__init__(limit)
+        self._logger = logging.getLogger('AdaptiveCapacitySearch')
+
+        self.resolution = max(resolution, 1)
+        self.repeats = max(repeats, 1)
+
+        self.lower: int = 0
+        self.upper: Optional[int] = None
+
+        self._next = max(min(start, limit), 1)
+        self._votes = []
+
+    @property
+    def is_bisecting(self) -> bool:
+        return self.upper is not None
+
+    def next_number_of_clients(self) -> Optional[int]:
+        return self._next
+
+    def report(self, num_clients: int, is_compliant: bool):
+        if self.is_bisecting:
+            self._votes.append(is_compliant)
+            compliant_votes = sum(self._votes)
+            failed_votes = len(self._votes) - compliant_votes
+            majority = self.repeats // 2 + 1
+
+            if compliant_votes < majority and failed_votes < majority:
+                self._logger.info(f"{num_clients} clients --> {is_compliant}, "
+                                  f"repeating ({compliant_votes}:{failed_votes}); bracket: [{self.lower}, {self.upper}]")
+                return
+
+            is_compliant = compliant_votes >= majority
+            self._votes = []
+
+        if is_compliant:
+            self.lower = num_clients
+            self.last_compliant_num_clients = num_clients
+        else:
+            self.upper = num_clients
+            self.first_failed_num_clients = num_clients
+
+        self._logger.info(f"{num_clients} clients --> {is_compliant}; bracket: [{self.lower}, {self.upper}]")
+
+        if not self.is_bisecting:
+            if num_clients >= self.limit:
+                self.has_reached_limit = True
+                self._next = None
+            else:
+                self._next = min(num_clients * 2, self.limit)
+        elif self.upper - self.lower <= self.resolution:
+            self._next = None
+        else:
+            self._next = (self.lower + self.upper) // 2
+
+
+def create_capacity_search(strategy: str, multiplier: int, limit: int, resolution: int = 100,
+                           repeats: int = 3) -> CapacitySearch:
+    if strategy == "linear":
+        return LinearCapacitySearch(multiplier, limit)
+    if strategy == "adaptive":
+        return AdaptiveCapacitySearch(multiplier, limit, resolution, repeats)
+
+    raise ValueError(f"Unknown capacity search strategy: {strategy}")
@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+
+import gevent
+from locust import LoadTestShape, events
+from locust.env import Environment
+
+from common.coordinated_omission import corrected_total, is_coordinated_omission_corrected
+from common.capacity_search import create_capacity_search, complies_with_real_time_requirements, \
+    CAPACITY_SEARCH_RESULTS_FILE
+from common.step_controller import StepController, StepDecision
+
+# Import CapacitySearchShape into a locustfile to search for the capacity of the system under test
+# within one Locust session, instead of starting Locust for every number of clients.
+# Locust uses the first LoadTestShape it finds in the locustfile, so import it conditionally, e.g.,
+#
+# if os.environ.get('CAPACITY_SEARCH'):
+#     from common.capacity_search_shape import CapacitySearchShape
+
+# noinspection PyTypeChecker
+locust_environment: Environment = None
+
+
+@events.init.add_listener
+def on_locust_init(environment: Environment, **kwargs):
+    global locust_environment
+    locust_environment = environment
+
+
+class CapacitySearchShape(LoadTestShape):
+    """
+    Steps the number of users according to a capacity search.
+    Every step runs for CAPACITY_SEARCH_STEP_DURATION seconds; the statistics are reset at the beginning of a step
+    and evaluated against the real-time requirements at its end.
+    With CAPACITY_SEARCH_EARLY_STOPPING, a StepController watches the statistics every second instead,
+    ends a step as soon as it clearly fails and extends borderline steps.
+    The result of every step is appended to CAPACITY_SEARCH_RESULTS as json line.
+    With CORRECT_COORDINATED_OMISSION, the corrected response times are evaluated instead of the raw ones.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._logger = logging.getLogger('CapacitySearchShape')
+
+        multiplier = int(os.environ.get('CAPACITY_SEARCH_MULTIPLIER', 200))
+        limit = int(os.environ.get('CAPACITY_SEARCH_LIMIT', 20000))
+        self._step_duration_s = float(os.environ.get('CAPACITY_SEARCH_STEP_DURATION', 60))
+        self._results_file = os.environ.get('CAPACITY_SEARCH_RESULTS', CAPACITY_SEARCH_RESULTS_FILE)
+
+        self._search = create_capacity_search(
+            os.environ.get('CAPACITY_SEARCH_STRATEGY', 'linear'),
+            multiplier,
+            limit,
+            int(os.environ.get('CAPACITY_SEARCH_RESOLUTION', 100)),
+            int(os.environ.get('CAPACITY_SEARCH_REPEATS', 3))
+        )
+
+        self._use_early_stopping = os.environ.get('CAPACITY_SEARCH_EARLY_STOPPING', '').lower() in ('1', 'true', 'yes')
+        self._step_controller = None
+
+        self._num_clients = self._search.next_number_of_clients()
+        self._step_start = None
+
+    def _start_step(self, run_time: float):
+        self._logger.info(f"Starting step with {self._num_clients} clients")
+        locust_environment.runner.stats.reset_all()
+        self._step_start = run_time
+        if self._use_early_stopping:
+            self._step_controller = StepController(nominal_duration_s=self._step_duration_s)
+
+    @staticmethod
+    def _evaluated_total():
+        stats = locust_environment.runner.stats
+        if is_coordinated_omission_corrected():
+            return corrected_total(stats.entries.values())
+
+        return stats.total
+
+    def _finish_step(self):
+        total = self._evaluated_total()
+        average_response_time_s = total.avg_response_time / 1000
+        max_response_time_s = total.max_response_time / 1000
+
+        if total.num_requests == 0:
+            self._logger.error("Something went wrong: no requests were sent")
+            is_compliant = False
+        elif self._step_controller is not None and self._step_controller.decision is not StepDecision.CONTINUE:
+            is_compliant = self._step_controller.decision is StepDecision.PASS
+        else:
+            is_compliant = complies_with_real_time_requirements(average_response_time_s, max_response_time_s)
+
+        self._logger.info(f"Clients: {self._num_clients}: avg: {average_response_time_s}s, max: {max_response_time_s}s")
+        self._logger.info(f"--> {is_compliant}")
+
+        with open(self._results_file, 'a') as results_file:
+            results_file.write(json.dumps({
+                "num_clients": self._num_clients,
+                "avg": total.avg_response_time,
+                "min": total.min_response_time or 0,
+                "max": total.max_response_time,
+                "num_requests": total.num_requests,
+                "is_compliant": is_compliant
+            }) + "\n")
+
+        self._search.report(self._num_clients, is_compliant)
+        self._num_clients = self._search.next_number_of_clients()
+
+    def _is_step_finished(self, run_time: float) -> bool:
+        if self._step_controller is None:
+            return run_time - self._step_start >= self._step_duration_s
+
+        total = self._evaluated_total()
+        decision = self._step_controller.observe(
+            run_time - self._step_start,
+            total.num_requests,
+            total.total_response_time,
+            total.max_response_time
+        )
+        return decision is not StepDecision.CONTINUE
+
+    def tick(self):
+        if self._num_clients is None:
+            return None
+
+        run_time = self.get_run_time()
+
+        if self._step_start is None:
+            self._start_step(run_time)
+        elif self._is_step_finished(run_time):
+            self._finish_step()
+
+            if self._num_clients is None:
+                self._logger.info(f"Finished capacity search. {self._search.summary()}")
+                # Locust does not quit by itself in headless mode when the shape stops the test
+                gevent.spawn_later(2, locust_environment.runner.quit)
+                return None
+
+            self._start_step(run_time)
+
+        return self._num_clients, max(self._num_clients / 10, 100)
@@ -15,6 +15,8 @@ _use_http2 = os.getenv('USE_HTTP_2', '').lower() in ('1', 'true', 'yes')
 from stopwatch import Stopwatch
 from httpx import Client, Limits
 
+from common.coordinated_omission import is_coordinated_omission_corrected, record_periodic_request
+
 class RepeatingClient(ABC):
     """
     Base class that implements the repetition, but not the actual data transfer.
@@ -86,6 +88,9 @@ class RepeatingClient(ABC):
         self.parent_user.wait_time = original_wait_time
         total_time_ms = int(stopwatch.duration * 1000)
         events.request_success.fire(request_type="POST", name=endpoint, response_time=total_time_ms, response_length=0)
+        if is_coordinated_omission_corrected():
+            # the device intends to send a request every wait time, also while it is still repeating this one
+            record_periodic_request(self.parent_user.environment, endpoint, total_time_ms, original_wait_time())
 
         logger.info("[%i] (%i) Response time %s ms", self.ID, request_id, total_time_ms)
 
@@ -0,0 +1,79 @@
+import json
+import logging
+import time
+import urllib.request
+from typing import Callable, Optional
+
+# The simulators answer GET /status with a json object like
+# {"in_flight": 0, "queued": 0, "last_completion_time": 1690000000.0}
+# in_flight: requests that are currently processed,
+# queued: requests that were received but are not processed yet,
+# last_completion_time: seconds since the epoch, when the last request was completed (null if none was).
+STATUS_PATH = "/status"
+
+
+def create_status(in_flight: int, queued: int, last_completion_time: Optional[float], **details) -> dict:
+    return {
+        "in_flight": in_flight,
+        "queued": queued,
+        "last_completion_time": last_completion_time,
+        **details
+    }
+
+
+def is_idle(status: dict) -> bool:
+    return status.get("in_flight", 0) == 0 and status.get("queued", 0) == 0
+
+
+def fetch_status_over_http(url: str, timeout_s: float = 2) -> Optional[dict]:
+    """
+    Returns the status of the simulator at `url` or None, if it does not provide one, e.g., the real system.
+    """
+    try:
+        with urllib.request.urlopen(url.rstrip("/") + STATUS_PATH, timeout=timeout_s) as response:
+            return json.loads(response.read())
+    except (OSError, ValueError):
+        return None
+
+
+def wait_until_system_is_idle(
+        fetch_status: Callable[[], Optional[dict]],
+        settle_time_s: float = 10,
+        poll_interval_s: float = 1,
+        timeout_s: float = 300,
+        fallback_sleep_s: float = 60
+) -> bool:
+    """
+    Polls the status of the system under test until it has no requests in flight or queued
+    for `settle_time_s` seconds in a row.
+    Sleeps for `fallback_sleep_s` instead, if the system does not provide its status.
+    Returns whether the system became idle before `timeout_s`.
+    """
+    logger = logging.getLogger('wait_until_system_is_idle')
+
+    status = fetch_status()
+    if status is None:
+        logger.info(f"System under test does not provide its status. Sleeping for {fallback_sleep_s}s ...")
+        time.sleep(fallback_sleep_s)
+        return True
+
+    start = time.monotonic()
+    idle_since = None
+    while True:
+        now = time.monotonic()
+
+        if status is not None and is_idle(status):
+            if idle_since is None:
+                idle_since = now
+            if now - idle_since >= settle_time_s:
+                logger.info(f"System under test is idle after {now - start:.0f}s")
+                return True
+        else:
+            idle_since = None
+
+        if now - start >= timeout_s:
+            logger.warning(f"System under test did not become idle within {timeout_s}s: {status}")
+            return False
+
+        time.sleep(poll_interval_s)
+        status = fetch_status()
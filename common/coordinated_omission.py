@@ -0,0 +1,104 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+# Load generators that wait for a response before they send the next request stop sending while the system stalls.
+# The requests that should have been sent during the stall are never measured ("coordinated omission"),
+# so the measured response times understate what, e.g., alarm devices in the field experience.
+#
+# With CORRECT_COORDINATED_OMISSION, the load generators additionally record corrected response times,
+# measured from the time the request was intended to be sent according to the schedule of the user.
+# The corrected response times are logged as stats entries with the type CORRECTED next to the raw ones,
+# e.g., "POST /ID_REQ_X" and "CORRECTED /ID_REQ_X" in the csv files,
+# without being counted in the "Aggregated" statistics of the raw response times.
+
+CORRECTED = "CORRECTED"
+
+
+def is_coordinated_omission_corrected() -> bool:
+    return os.environ.get('CORRECT_COORDINATED_OMISSION', '').lower() in ('1', 'true', 'yes')
+
+
+def corrected_response_times_ms(response_time_ms: float, interval_ms: float) -> List[float]:
+    """
+    Returns the response time of a request of a user that intends to send a request every `interval_ms`,
+    followed by the response times of the requests the user would have sent while waiting for the response.
+    Their intended send times are `interval_ms`, 2 * `interval_ms`, ... after the request was sent,
+    and they would have been answered not before this request, like HdrHistogram's recordValueWithExpectedInterval.
+    """
+    response_times_ms = [response_time_ms]
+    if interval_ms <= 0:
+        return response_times_ms
+
+    missed_response_time_ms = response_time_ms - interval_ms
+    while missed_response_time_ms >= interval_ms:
+        response_times_ms.append(missed_response_time_ms)
+        missed_response_time_ms -= interval_ms
+
+    return response_times_ms
+
+
+def _log_corrected(environment, name: str, response_time_ms: float, response_length: int):
+    # logged to the entry only; RequestStats.log_request would also add it to the total of the raw response times
+    environment.stats.get(name, CORRECTED).log(response_time_ms, response_length)
+
+
+def record_periodic_request(environment, name: str, response_time_ms: float, interval_s: float,
+                            response_length: int = 0):
+    """
+    Records the corrected response times of a request of a user that sends a request every `interval_s`,
+    e.g., the wait time of an alarm device.
+    """
+    for corrected_response_time_ms in corrected_response_times_ms(response_time_ms, interval_s * 1000):
+        _log_corrected(environment, name, corrected_response_time_ms, response_length)
+
+
+def record_scheduled_request(environment, name: str, intended_send_time: float, response_length: int = 0):
+    """
+    Records the response time of a request that has just been answered, measured from its intended send time (time.time()),
+    e.g., from its arrival in an open-loop schedule.
+    """
+    _log_corrected(environment, name, max(time.time() - intended_send_time, 0) * 1000, response_length)
+
+
+@dataclass
+class CorrectedTotal:
+    """
+    The corrected response times in ms of all requests, with the attributes of the Locust StatsEntry that are evaluated.
+    """
+    num_requests: int = 0
+    total_response_time: float = 0
+    min_response_time: Optional[float] = None
+    max_response_time: float = 0
+
+    @property
+    def avg_response_time(self) -> float:
+        return self.total_response_time / self.num_requests if self.num_requests > 0 else 0
+
+
+def corrected_total(entries: Iterable) -> CorrectedTotal:
+    """
+    Sums the corrected response times of the Locust stats entries, e.g., `environment.runner.stats.entries.values()`.
+    """
+    total = CorrectedTotal()
+    for entry in entries:
+        if entry.method != CORRECTED or entry.num_requests == 0:
+            continue
+
+        total.num_requests += entry.num_requests
+        total.total_response_time += entry.total_response_time
+        if total.min_response_time is None or entry.min_response_time < total.min_response_time:
+            total.min_response_time = entry.min_response_time
+        total.max_response_time = max(total.max_response_time, entry.max_response_time)
+
+    return total
+
+
+def rows_to_evaluate(rows: List[dict]) -> List[dict]:
+    """
+    Returns the rows of a Locust stats csv file with corrected response times, if there are any, otherwise all rows.
+    """
+    corrected_rows = [row for row in rows if row.get('Type') == CORRECTED]
+
+    return corrected_rows if len(corrected_rows) > 0 else rows
@@ -0,0 +1,222 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy
+
+from common.Common import datetime_to_ns
+
+# Classifies responses by the fault windows of fault injection runs.
+# The fault injectors log lines like
+#   *ARS-1* ARS faulted @2024-05-02 10:11:12.123456; operator will be notified in 5.2s
+#   *ARS-1* ARS recovered @2024-05-02 10:11:42.654321
+# A fault window of a service starts when it faulted and ends when it recovered.
+# Responses within a window are "during fault", responses within `recovery_tail_s` after a window are "recovery"
+# and all other responses are "normal".
+
+NORMAL = 0
+DURING_FAULT = 1
+RECOVERY = 2
+CATEGORIES = {NORMAL: "normal", DURING_FAULT: "during fault", RECOVERY: "recovery"}
+
+# responses that were sent during a fault can take up to the max response time allowed
+DEFAULT_RECOVERY_TAIL_S = 30
+
+FAULT_THRESHOLD_S = 10
+EN50136_MAX_RESPONSE_TIME_S = 30
+
+_FAULTED_PATTERN = re.compile(r"\*(.*)\*.*((?<=faulted @)[^;]*)")
+_RECOVERED_PATTERN = re.compile(r"\*(.*)\*.*((?<=recovered @).*)")
+
+# a fault that never recovered lasts until the end of time
+_NEVER_NS = numpy.iinfo(numpy.int64).max
+
+
+def _parse_time_stamp(string: str) -> datetime:
+    string = string.strip()
+    try:
+        return datetime.strptime(string, '%Y-%m-%d %H:%M:%S.%f')
+    except ValueError:
+        # datetime omits the microseconds when they are 0
+        return datetime.strptime(string, '%Y-%m-%d %H:%M:%S')
+
+
+def read_fault_events(path: Path) -> Tuple[List[Tuple[str, datetime]], List[Tuple[str, datetime]]]:
+    """
+    Returns the (service, time) of every fault and of every recovery in the fault injector log `path`.
+    """
+    faults = []
+    recoveries = []
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line in f:
+            if "faulted" in line:
+                match = _FAULTED_PATTERN.search(line)
+                if match:
+                    faults.append((match.group(1), _parse_time_stamp(match.group(2))))
+            elif "recovered" in line:
+                match = _RECOVERED_PATTERN.search(line)
+                if match:
+                    recoveries.append((match.group(1), _parse_time_stamp(match.group(2))))
+
+    return faults, recoveries
+
+
+@dataclass
+class FaultWindows:
+    """
+    Sorted, non-overlapping fault windows [starts_ns[i], ends_ns[i]) of a service.
+    """
+    service: str
+    starts_ns: numpy.ndarray
+    ends_ns: numpy.ndarray
+
+    @property
+    def durations_s(self) -> numpy.ndarray:
+        is_recovered = self.ends_ns != _NEVER_NS
+        return (self.ends_ns[is_recovered] - self.starts_ns[is_recovered]) / 1e9
+
+    @property
+    def recovered_ends_ns(self) -> numpy.ndarray:
+        return self.ends_ns[self.ends_ns != _NEVER_NS]
+
+
+def fault_windows_of(
+        faults: Iterable[Tuple[str, datetime]],
+        recoveries: Iterable[Tuple[str, datetime]]
+) -> Dict[str, FaultWindows]:
+    """
+    Pairs every fault of a service with the next recovery of the same service.
+    Faults of a service that is already faulted and recoveries of a service that is not faulted are ignored.
+    """
+    events: Dict[str, List[Tuple[int, bool]]] = {}
+    for service, time_stamp in faults:
+        events.setdefault(service, []).append((datetime_to_ns(time_stamp), True))
+    for service, time_stamp in recoveries:
+        events.setdefault(service, []).append((datetime_to_ns(time_stamp), False))
+
+    windows = {}
+    for service, service_events in sorted(events.items()):
+        starts = []
+        ends = []
+        for time_stamp_ns, is_fault in sorted(service_events):
+            if is_fault and len(starts) == len(ends):
+                starts.append(time_stamp_ns)
+            elif not is_fault and len(starts) > len(ends):
+                ends.append(time_stamp_ns)
+        if len(starts) > len(ends):
+            ends.append(_NEVER_NS)
+
+        windows[service] = FaultWindows(
+            service,
+            numpy.array(starts, dtype=numpy.int64),
+            numpy.array(ends, dtype=numpy.int64)
+        )
+
+    return windows
+
+
+def _union(starts_ns: numpy.ndarray, ends_ns: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Merges overlapping intervals, so that both the starts and the ends of the result are sorted.
+    """
+    if len(starts_ns) == 0:
+        return starts_ns, ends_ns
+
+    order = numpy.argsort(starts_ns, kind='stable')
+    starts_ns = starts_ns[order]
+    ends_ns = numpy.maximum.accumulate(ends_ns[order])
+
+    # an interval starts a new merged interval if it starts after all previous ones have ended
+    is_new = numpy.r_[True, starts_ns[1:] > ends_ns[:-1]]
+    last_of_merged = numpy.r_[numpy.flatnonzero(is_new)[1:] - 1, len(starts_ns) - 1]
+
+    return starts_ns[is_new], ends_ns[last_of_merged]
+
+
+def _is_within(time_stamps_ns: numpy.ndarray, starts_ns: numpy.ndarray, ends_ns: numpy.ndarray) -> numpy.ndarray:
+    i = numpy.searchsorted(starts_ns, time_stamps_ns, side='right') - 1
+    within = i >= 0
+    within[within] = time_stamps_ns[within] < ends_ns[i[within]]
+
+    return within
+
+
+class FaultWindowIndex:
+    """
+    Fault windows of all services, merged into sorted interval arrays,
+    so that millions of responses are classified with a binary search each.
+    """
+
+    def __init__(self, windows: Dict[str, FaultWindows]):
+        self.windows = windows
+
+        starts = [w.starts_ns for w in windows.values()]
+        ends = [w.ends_ns for w in windows.values()]
+        self._fault_starts_ns, self._fault_ends_ns = _union(
+            numpy.concatenate(starts) if starts else numpy.empty(0, dtype=numpy.int64),
+            numpy.concatenate(ends) if ends else numpy.empty(0, dtype=numpy.int64)
+        )
+
+    @staticmethod
+    def from_logfiles(paths: Iterable[Path]) -> 'FaultWindowIndex':
+        faults = []
+        recoveries = []
+        for path in paths:
+            f, r = read_fault_events(path)
+            faults += f
+            recoveries += r
+
+        return FaultWindowIndex(fault_windows_of(faults, recoveries))
+
+    def __len__(self):
+        return len(self._fault_starts_ns)
+
+    def classify(self, time_stamps_ns: numpy.ndarray, recovery_tail_s: float = DEFAULT_RECOVERY_TAIL_S) -> numpy.ndarray:
+        """
+        Returns NORMAL, DURING_FAULT or RECOVERY for every time stamp.
+        """
+        categories = numpy.full(len(time_stamps_ns), NORMAL, dtype=numpy.int8)
+        if len(self) == 0:
+            return categories
+
+        is_recovered = self._fault_ends_ns != _NEVER_NS
+        tail_starts_ns = self._fault_ends_ns[is_recovered]
+        tail_ends_ns = tail_starts_ns + int(recovery_tail_s * 1e9)
+        categories[_is_within(time_stamps_ns, tail_starts_ns, tail_ends_ns)] = RECOVERY
+
+        # a recovery tail can overlap the next fault, then the fault wins
+        categories[_is_within(time_stamps_ns, self._fault_starts_ns, self._fault_ends_ns)] = DURING_FAULT
+
+        return categories
+
+
+def summarize_by_category(response_times_s: numpy.ndarray, categories: numpy.ndarray) -> Dict[str, Dict[str, float]]:
+    """
+    Returns the number of responses, the response time percentiles and the number of SLA violations per category.
+    """
+    summary = {}
+    for category, name in CATEGORIES.items():
+        times = response_times_s[categories == category]
+        count = len(times)
+        if count > 0:
+            p50, p95, p99 = numpy.percentile(times, [50, 95, 99]).tolist()
+            maximum = float(times.max())
+        else:
+            p50 = p95 = p99 = maximum = 0
+        above_fault_threshold = int(numpy.count_nonzero(times > FAULT_THRESHOLD_S))
+        above_max_response_time = int(numpy.count_nonzero(times > EN50136_MAX_RESPONSE_TIME_S))
+
+        summary[name] = {
+            "count": count,
+            "p50": p50,
+            "p95": p95,
+            "p99": p99,
+            "max": maximum,
+            f"above_{FAULT_THRESHOLD_S}s": above_fault_threshold,
+            f"above_{EN50136_MAX_RESPONSE_TIME_S}s": above_max_response_time,
+            "violation_ratio": above_max_response_time / count if count > 0 else 0,
+        }
+
+    return summary
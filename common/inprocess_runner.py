@@ -0,0 +1,289 @@
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# Importing locust monkey patches the standard library with gevent,
+# so import this module only in processes that run a load test.
+import gevent
+import locust
+import numpy
+from locust.argument_parser import parse_options
+from locust.log import HOSTNAME
+from locust.main import load_locustfile, create_environment
+from locust.stats import StatsEntry
+
+from common.locust_fleet import LocustWorkerFleet, locust_executable
+from common.response_time_histogram import ResponseTimeHistogram
+
+# Runs a locustfile within this process, like `locust -f <locustfile> --headless` would,
+# and returns the statistics Locust collected in memory, instead of writing and re-reading csv and log files.
+
+PERCENTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+
+
+@dataclass
+class RequestStatistics:
+    method: str
+    name: str
+    num_requests: int
+    num_failures: int
+    avg_response_time_ms: float
+    min_response_time_ms: float
+    max_response_time_ms: float
+    total_rps: float
+    percentiles_ms: Dict[float, float] = field(default_factory=dict)
+
+    @property
+    def request_type(self) -> str:
+        """
+        Request type as in the Locust log, e.g., "GET login" for /tools.descartes.teastore.webui/login?x=1.
+        """
+        request_name = self.name.split('/')[-1].split('?')[0]
+        if request_name == "":
+            request_name = "index"
+
+        return f"{self.method} {request_name}"
+
+    @staticmethod
+    def of(entry: StatsEntry) -> 'RequestStatistics':
+        return RequestStatistics(
+            method=entry.method or "",
+            name=entry.name,
+            num_requests=entry.num_requests,
+            num_failures=entry.num_failures,
+            avg_response_time_ms=entry.avg_response_time,
+            min_response_time_ms=entry.min_response_time or 0,
+            max_response_time_ms=entry.max_response_time,
+            total_rps=entry.total_rps,
+            percentiles_ms={
+                p: entry.get_response_time_percentile(p) if entry.num_requests > 0 else 0
+                for p in PERCENTILES
+            }
+        )
+
+
+@dataclass
+class InProcessRunResult:
+    total: RequestStatistics
+    requests: List[RequestStatistics]
+    errors: Dict[str, int]
+
+    def requests_by_type(self) -> Dict[str, RequestStatistics]:
+        """
+        Merges the statistics of requests with the same type, e.g., product pages with different ids,
+        by taking the largest average and max and the smallest min, like executor.py does with the csv files.
+        """
+        merged: Dict[str, RequestStatistics] = {}
+        for r in self.requests:
+            request_type = r.request_type
+            if request_type not in merged:
+                merged[request_type] = RequestStatistics(
+                    r.method, request_type, 0, 0, 0, r.min_response_time_ms, 0, 0
+                )
+
+            m = merged[request_type]
+            m.num_requests += r.num_requests
+            m.num_failures += r.num_failures
+            m.avg_response_time_ms = max(m.avg_response_time_ms, r.avg_response_time_ms)
+            m.min_response_time_ms = min(m.min_response_time_ms, r.min_response_time_ms)
+            m.max_response_time_ms = max(m.max_response_time_ms, r.max_response_time_ms)
+            m.total_rps += r.total_rps
+
+        return merged
+
+
+class _IntervalStatistics:
+    """
+    Collects the responses of the current interval, e.g., of the last second.
+    """
+
+    def __init__(self, environment):
+        self._environment = environment
+        self._response_times_ms: List[float] = []
+        self._num_failures = 0
+        self._start = time.monotonic()
+
+        environment.events.request_success.add_listener(self._on_success)
+        environment.events.request_failure.add_listener(self._on_failure)
+
+    def _on_success(self, response_time, **kwargs):
+        self._response_times_ms.append(response_time)
+
+    def _on_failure(self, response_time, **kwargs):
+        self._response_times_ms.append(response_time)
+        self._num_failures += 1
+
+    def remove_listeners(self):
+        self._environment.events.request_success.remove_listener(self._on_success)
+        self._environment.events.request_failure.remove_listener(self._on_failure)
+
+    def flush(self) -> dict:
+        now = time.monotonic()
+        duration_s = max(now - self._start, 1e-9)
+
+        histogram = ResponseTimeHistogram()
+        histogram.add(numpy.asarray(self._response_times_ms, dtype=numpy.float64))
+
+        total = self._environment.stats.total
+        statistics = {
+            "time": time.time(),
+            "user_count": self._environment.runner.user_count,
+            "rps": histogram.count / duration_s,
+            "failures_per_s": self._num_failures / duration_s,
+            "num_requests": total.num_requests,
+            "num_failures": total.num_failures,
+            "avg": histogram.mean_ms,
+            "p50": histogram.percentile(0.5),
+            "p95": histogram.percentile(0.95),
+            "p99": histogram.percentile(0.99),
+            "max": histogram.max_ms if histogram.count > 0 else 0
+        }
+
+        self._response_times_ms = []
+        self._num_failures = 0
+        self._start = now
+
+        return statistics
+
+
+def _log_to_file(logfile: str) -> logging.Handler:
+    """
+    Writes the log records to `logfile` in the format of `locust --logfile`, so that the usual tools can parse it.
+    """
+    handler = logging.FileHandler(logfile)
+    handler.setLevel(logging.INFO)
+    handler.setFormatter(logging.Formatter(f"[%(asctime)s] {HOSTNAME}/%(levelname)s/%(name)s: %(message)s"))
+
+    root_logger = logging.getLogger()
+    root_logger.addHandler(handler)
+    # the locustfiles log every response with INFO
+    if root_logger.getEffectiveLevel() > logging.INFO:
+        root_logger.setLevel(logging.INFO)
+
+    return handler
+
+
+def _monitor(environment, runner, on_statistics, should_stop, interval_s: float):
+    logger = logging.getLogger('run_locust_in_process')
+
+    # per-interval statistics are only available for requests that are reported to this process
+    interval_statistics = _IntervalStatistics(environment) if on_statistics is not None else None
+    try:
+        while True:
+            gevent.sleep(interval_s)
+
+            if interval_statistics is not None:
+                on_statistics(interval_statistics.flush())
+
+            if should_stop is not None and should_stop():
+                logger.info("Stopping load test on request")
+                runner.quit()
+                return
+    finally:
+        if interval_statistics is not None:
+            interval_statistics.remove_listeners()
+
+
+def run_locust_in_process(
+        locust_script: str,
+        url: str,
+        clients: int,
+        runtime_in_min: float = -1,
+        spawn_rate: float = 100,
+        use_load_test_shape: bool = True,
+        logfile: Optional[str] = None,
+        num_workers: int = 0,
+        master_port: int = 5557,
+        on_statistics: Callable[[dict], None] = None,
+        should_stop: Callable[[], bool] = None,
+        statistics_interval_s: float = 1
+) -> InProcessRunResult:
+    """
+    Runs the users of `locust_script` in this process with a LocalRunner,
+    or, with `num_workers` > 0, with a MasterRunner and `num_workers` worker processes.
+    The test runs until the locustfile quits the runner or `runtime_in_min` has passed.
+
+    While the test runs, `on_statistics` is called every `statistics_interval_s` seconds
+    with the throughput and response time percentiles of that interval,
+    and the test is stopped as soon as `should_stop` returns True.
+    """
+    logger = logging.getLogger('run_locust_in_process')
+
+    # the locustfiles read these when they are imported; the workers get their index from the fleet
+    os.environ["use_load_test_shape"] = str(use_load_test_shape)
+    os.environ["LOCUST_WORKER_COUNT"] = str(max(num_workers, 1))
+
+    _, user_classes, shape_class = load_locustfile(locust_script)
+
+    options = parse_options([
+        "-f", locust_script,
+        f"--host={url}",
+        "--headless",
+        f"--users={clients}",
+        f"--spawn-rate={spawn_rate}",
+        "--stop-timeout", "10"
+    ])
+
+    environment = create_environment(
+        list(user_classes.values()),
+        options,
+        events=locust.events,
+        shape_class=shape_class
+    )
+
+    handler = _log_to_file(logfile) if logfile is not None else None
+
+    fleet = None
+    try:
+        if num_workers > 0:
+            runner = environment.create_master_runner(master_bind_port=master_port)
+            fleet = LocustWorkerFleet(
+                [locust_executable(), "-f", locust_script, f"--host={url}", "--headless", f"--master-port={master_port}"],
+                lambda i: f"worker_log_{clients}.{i}.log",
+                num_workers
+            )
+            fleet.start()
+            while runner.worker_count < num_workers:
+                gevent.sleep(0.5)
+        else:
+            runner = environment.create_local_runner()
+
+        environment.events.init.fire(environment=environment, runner=runner, web_ui=None)
+
+        if runtime_in_min > 0:
+            gevent.spawn_later(runtime_in_min * 60, runner.quit)
+
+        logger.info(f"Starting {len(user_classes)} user classes in process with {clients} clients")
+        if shape_class is not None:
+            runner.start_shape()
+        else:
+            runner.start(clients, spawn_rate)
+
+        monitor = None
+        if on_statistics is not None or should_stop is not None:
+            monitor = gevent.spawn(
+                _monitor, environment, runner, on_statistics, should_stop, statistics_interval_s
+            )
+
+        runner.greenlet.join()
+        runner.quit()
+
+        if monitor is not None:
+            monitor.kill()
+
+        environment.events.quitting.fire(environment=environment, reverse=True)
+    finally:
+        if fleet is not None:
+            fleet.stop()
+        if handler is not None:
+            logging.getLogger().removeHandler(handler)
+            handler.close()
+
+    stats = environment.stats
+    return InProcessRunResult(
+        total=RequestStatistics.of(stats.total),
+        requests=[RequestStatistics.of(entry) for entry in stats.entries.values()],
+        errors={error.to_name(): error.occurrences for error in stats.errors.values()}
+    )
@@ -0,0 +1,195 @@
+import logging
+import os
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+import psutil
+
+
+def default_number_of_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def locust_executable() -> str:
+    """
+    Returns the Locust of the virtual environment of the repository, if there is one, otherwise the one on the PATH.
+    """
+    if os.path.exists("venv/bin/locust"):
+        return os.path.abspath("venv/bin/locust")
+
+    return "locust"
+
+
+def pin_to_cpus(cpus: Optional[Iterable[int]]) -> Optional[Callable[[], None]]:
+    """
+    Returns a preexec_fn for subprocess.Popen that pins the new process to the given CPUs.
+    """
+    if cpus is None:
+        return None
+
+    cpus = set(cpus)
+    return lambda: os.sched_setaffinity(0, cpus)
+
+
+@dataclass
+class _Worker:
+    index: int
+    process: subprocess.Popen
+    started_at: float
+    restarts: int = 0
+    # cpu times of processes of this worker that already terminated, e.g., before a restart
+    finished_cpu_time_s: float = 0
+    last_cpu_time_s: float = 0
+    ps_process: Optional[psutil.Process] = field(default=None, repr=False)
+
+
+class LocustWorkerFleet:
+    """
+    Starts Locust workers as subprocesses and supervises them:
+    crashed workers are restarted, and stopping the fleet terminates every worker, so that
+    no worker of one load test connects to the master of the next one.
+    Every worker gets LOCUST_WORKER_INDEX and LOCUST_WORKER_COUNT to select its shard of the workload,
+    see common/sharding.py; a restarted worker keeps its index.
+    """
+
+    def __init__(
+            self,
+            locust_command: List[str],
+            logfile_of_worker: Callable[[int], str],
+            num_workers: int = None,
+            env: Dict[str, str] = None,
+            health_check_interval_s: float = 2,
+            max_restarts_per_worker: int = 3,
+            cwd: str = None,
+            cpus: Iterable[int] = None
+    ):
+        self._logger = logging.getLogger('LocustWorkerFleet')
+
+        self._locust_command = locust_command
+        self._logfile_of_worker = logfile_of_worker
+        self.num_workers = num_workers if num_workers is not None else default_number_of_workers()
+        self._env = env
+        self._health_check_interval_s = health_check_interval_s
+        self._max_restarts_per_worker = max_restarts_per_worker
+        self._cwd = cwd
+        self._cpus = cpus
+
+        self._workers: Dict[int, _Worker] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _spawn(self, index: int) -> subprocess.Popen:
+        command = self._locust_command + ["--logfile", self._logfile_of_worker(index), "--worker"]
+
+        env = dict(self._env if self._env is not None else os.environ)
+        env["LOCUST_WORKER_INDEX"] = str(index - 1)
+        env["LOCUST_WORKER_COUNT"] = str(self.num_workers)
+
+        return subprocess.Popen(
+            command,
+            env=env,
+            cwd=self._cwd,
+            preexec_fn=pin_to_cpus(self._cpus),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+    def start(self):
+        for index in range(1, self.num_workers + 1):
+            self._logger.info(f"Starting {index}. worker")
+            process = self._spawn(index)
+            self._workers[index] = _Worker(index, process, time.monotonic(), ps_process=self._ps_process_of(process))
+
+        self._stopped.clear()
+        self._monitor = threading.Thread(target=self._monitor_workers, name='LocustWorkerFleet', daemon=True)
+        self._monitor.start()
+
+    @staticmethod
+    def _ps_process_of(process: subprocess.Popen) -> Optional[psutil.Process]:
+        try:
+            return psutil.Process(process.pid)
+        except psutil.Error:
+            return None
+
+    def _sample_cpu_time(self, worker: _Worker):
+        if worker.ps_process is None:
+            return
+        try:
+            cpu_times = worker.ps_process.cpu_times()
+            worker.last_cpu_time_s = cpu_times.user + cpu_times.system
+        except psutil.Error:
+            pass
+
+    def check_health(self):
+        """
+        Restarts workers that terminated with an error.
+        Workers that terminated regularly, i.e., because the master told them to quit, are left alone.
+        """
+        with self._lock:
+            for worker in self._workers.values():
+                self._sample_cpu_time(worker)
+
+                return_code = worker.process.poll()
+                if return_code is None or return_code == 0 or self._stopped.is_set():
+                    continue
+
+                if worker.restarts >= self._max_restarts_per_worker:
+                    continue
+
+                self._logger.warning(f"{worker.index}. worker crashed with exit code {return_code}; restarting it")
+                worker.finished_cpu_time_s += worker.last_cpu_time_s
+                worker.last_cpu_time_s = 0
+                worker.restarts += 1
+                worker.process = self._spawn(worker.index)
+                worker.ps_process = self._ps_process_of(worker.process)
+
+    def _monitor_workers(self):
+        while not self._stopped.wait(self._health_check_interval_s):
+            self.check_health()
+
+    def stop(self, timeout_s: float = 10):
+        self._stopped.set()
+        if self._monitor is not None:
+            self._monitor.join()
+
+        with self._lock:
+            for worker in self._workers.values():
+                self._sample_cpu_time(worker)
+                if worker.process.poll() is None:
+                    worker.process.terminate()
+
+            deadline = time.monotonic() + timeout_s
+            for worker in self._workers.values():
+                try:
+                    worker.process.wait(max(0.0, deadline - time.monotonic()))
+                except subprocess.TimeoutExpired:
+                    self._logger.warning(f"{worker.index}. worker did not terminate; killing it")
+                    worker.process.kill()
+                    worker.process.wait()
+
+        self.report()
+
+    def cpu_time_of_workers_s(self) -> Dict[int, float]:
+        return {index: w.finished_cpu_time_s + w.last_cpu_time_s for index, w in self._workers.items()}
+
+    def report(self):
+        now = time.monotonic()
+        for index, cpu_time_s in self.cpu_time_of_workers_s().items():
+            worker = self._workers[index]
+            wall_time_s = max(now - worker.started_at, 1e-9)
+            self._logger.info(
+                f"{index}. worker: CPU time: {cpu_time_s:.1f}s "
+                f"({100 * cpu_time_s / wall_time_s:.0f}% of {wall_time_s:.0f}s), "
+                f"restarts: {worker.restarts}"
+            )
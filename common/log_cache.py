@@ -0,0 +1,229 @@
+import hashlib
+import logging
+import os
+import zipfile
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+import numpy
+
+from common.Common import ResponseTimes, iter_response_time_chunks_from_locust_logfile
+
+# Parsed log files are stored next to the log file, e.g., locust_log.log.npz.
+# A cache entry is valid as long as the log file has the same size and modification time.
+# If the log file has only grown, e.g., because the load test is still running,
+# only the appended lines are parsed and appended to the cache entry.
+# Other log files, e.g., ARS_simulation_*.log, are parsed by a fallback parser and cached as a whole.
+# Log files without response times get no cache entry.
+# The arrays are stored uncompressed, so that an up-to-date cache entry can also be read in chunks.
+
+CACHE_SUFFIX = ".npz"
+CACHE_VERSION = 2
+
+LOCUST_PARSER = "locust"
+FALLBACK_PARSER = "fallback"
+
+# used to recognize that a log file was replaced rather than appended to
+_HEAD_SIZE = 4096
+
+
+def cache_path_for(path: str) -> Path:
+    return Path(str(path) + CACHE_SUFFIX)
+
+
+def _hash_of_head(path: str) -> str:
+    with open(path, 'rb') as logfile:
+        return hashlib.sha1(logfile.read(_HEAD_SIZE)).hexdigest()
+
+
+def _end_of_last_complete_line(path: str, size: int) -> int:
+    """
+    Returns the offset after the last newline within the first `size` bytes,
+    because a log file that is still written to may end with a partially written line.
+    """
+    block_size = 64 * 1024
+    with open(path, 'rb') as logfile:
+        end = size
+        while end > 0:
+            start = max(0, end - block_size)
+            logfile.seek(start)
+            block = logfile.read(end - start)
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+
+    return 0
+
+
+def _load(cache_path: Path) -> Optional[dict]:
+    try:
+        with numpy.load(cache_path, allow_pickle=False) as data:
+            entry = {key: data[key] for key in data.files}
+    except (OSError, ValueError) as e:
+        logging.getLogger('log_cache').warning(f"Ignoring unreadable cache {cache_path}: {e}")
+        return None
+
+    if int(entry['version']) != CACHE_VERSION:
+        return None
+
+    return entry
+
+
+def _load_metadata(cache_path: Path) -> Optional[dict]:
+    """
+    Like `_load`, but without the response times; the members of an .npz file are read on access only.
+    """
+    try:
+        with numpy.load(cache_path, allow_pickle=False) as data:
+            entry = {key: data[key] for key in ('version', 'size', 'mtime_ns', 'parser', 'request_types')}
+    except (OSError, ValueError, KeyError) as e:
+        logging.getLogger('log_cache').warning(f"Ignoring unreadable cache {cache_path}: {e}")
+        return None
+
+    if int(entry['version']) != CACHE_VERSION:
+        return None
+
+    return entry
+
+
+class _ArrayReader:
+    """
+    Reads a one-dimensional array of an .npz file sequentially, without loading it at once.
+    """
+
+    def __init__(self, archive: zipfile.ZipFile, key: str):
+        self._member = archive.open(key + '.npy')
+        version = numpy.lib.format.read_magic(self._member)
+        if version == (1, 0):
+            shape, _, self._dtype = numpy.lib.format.read_array_header_1_0(self._member)
+        else:
+            shape, _, self._dtype = numpy.lib.format.read_array_header_2_0(self._member)
+        self.length = shape[0]
+
+    def read(self, count: int) -> numpy.ndarray:
+        return numpy.frombuffer(self._member.read(count * self._dtype.itemsize), dtype=self._dtype)
+
+
+def _save(cache_path: Path, response_times: ResponseTimes, size: int, mtime_ns: int, parsed_offset: int,
+          head_hash: str, parser: str):
+    temporary_path = cache_path.with_name(cache_path.name + ".tmp")
+    try:
+        with open(temporary_path, 'wb') as cache_file:
+            numpy.savez(
+                cache_file,
+                version=numpy.int64(CACHE_VERSION),
+                size=numpy.int64(size),
+                mtime_ns=numpy.int64(mtime_ns),
+                parsed_offset=numpy.int64(parsed_offset),
+                head_hash=numpy.str_(head_hash),
+                parser=numpy.str_(parser),
+                time_stamps_ns=response_times.time_stamps_ns,
+                request_type_codes=response_times.request_type_codes,
+                response_times_ms=response_times.response_times_ms,
+                request_types=numpy.array(response_times.request_types, dtype=numpy.str_)
+            )
+        os.replace(temporary_path, cache_path)
+    except OSError as e:
+        logging.getLogger('log_cache').warning(f"Could not write cache {cache_path}: {e}")
+
+
+def load_response_times_cached(
+        path: str,
+        fallback: Optional[Callable[[str], ResponseTimes]] = None
+) -> ResponseTimes:
+    """
+    Returns the response times of a Locust log file, parsing only what is not in its cache yet.
+    If the log file contains no Locust response times, it is parsed by `fallback`, if given.
+    """
+    logger = logging.getLogger('load_response_times_cached')
+
+    path = str(path)
+    stat = os.stat(path)
+    cache_path = cache_path_for(path)
+
+    entry = _load(cache_path) if cache_path.exists() else None
+
+    head_hash = _hash_of_head(path)
+
+    previous = None
+    start_offset = 0
+    if entry is not None:
+        cached = ResponseTimes(
+            entry['time_stamps_ns'],
+            entry['request_type_codes'],
+            entry['response_times_ms'],
+            entry['request_types'].tolist()
+        )
+
+        if int(entry['size']) == stat.st_size and int(entry['mtime_ns']) == stat.st_mtime_ns:
+            logger.debug(f"Cache hit for {path}")
+            return cached
+
+        if str(entry['parser']) == LOCUST_PARSER \
+                and stat.st_size >= int(entry['size']) and str(entry['head_hash']) == head_hash:
+            logger.info(f"{path} has grown, parsing from offset {int(entry['parsed_offset'])}")
+            previous = cached
+            start_offset = int(entry['parsed_offset'])
+
+    end_offset = _end_of_last_complete_line(path, stat.st_size)
+
+    chunks = list(iter_response_time_chunks_from_locust_logfile(
+        path,
+        start_offset=start_offset,
+        end_offset=end_offset,
+        previous=previous
+    ))
+    if previous is not None:
+        chunks.insert(0, previous)
+
+    response_times = ResponseTimes.concatenate(chunks)
+
+    parser = LOCUST_PARSER
+    if len(response_times) == 0 and fallback is not None:
+        # the fallback parsers read whole files, so a grown file is parsed again
+        response_times = fallback(path)
+        parser = FALLBACK_PARSER
+
+    if len(response_times) == 0:
+        if cache_path.exists():
+            os.remove(cache_path)
+        return response_times
+
+    _save(cache_path, response_times, stat.st_size, stat.st_mtime_ns, end_offset, head_hash, parser)
+
+    return response_times
+
+
+def iter_response_time_chunks_cached(path: str, chunk_size: int = 100_000) -> Iterator[ResponseTimes]:
+    """
+    Like `iter_response_time_chunks_from_locust_logfile`, the memory required does not depend on the size of the log file.
+    If the cache of the log file is up to date, the chunks are read from the cache instead of parsing the log file.
+    """
+    path = str(path)
+    stat = os.stat(path)
+    cache_path = cache_path_for(path)
+
+    entry = _load_metadata(cache_path) if cache_path.exists() else None
+    if entry is None or str(entry['parser']) != LOCUST_PARSER \
+            or int(entry['size']) != stat.st_size or int(entry['mtime_ns']) != stat.st_mtime_ns:
+        yield from iter_response_time_chunks_from_locust_logfile(path, chunk_size=chunk_size)
+        return
+
+    logging.getLogger('iter_response_time_chunks_cached').debug(f"Cache hit for {path}")
+
+    # the request type codes of all chunks refer to the table of the whole log file
+    request_types = entry['request_types'].tolist()
+    with zipfile.ZipFile(cache_path) as archive:
+        time_stamps_ns = _ArrayReader(archive, 'time_stamps_ns')
+        request_type_codes = _ArrayReader(archive, 'request_type_codes')
+        response_times_ms = _ArrayReader(archive, 'response_times_ms')
+
+        for start in range(0, time_stamps_ns.length, chunk_size):
+            count = min(chunk_size, time_stamps_ns.length - start)
+            yield ResponseTimes(
+                time_stamps_ns.read(count),
+                request_type_codes.read(count),
+                response_times_ms.read(count),
+                request_types
+            )
@@ -0,0 +1,204 @@
+import heapq
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+import numpy
+import typer
+
+from common.Common import ResponseTimes, iter_response_time_chunks_from_locust_logfile, \
+    read_response_times_from_locust_logfile_as_columns, ns_to_datetime
+
+# call_locust_and_distribute_work writes the log of the master to locust_log_{clients}.log
+# and the log of the i-th worker to worker_log_{clients}.{i}.log.
+# In a distributed run, the responses are logged by the workers, so a run is analyzed by merging all of its logs.
+# Run `python3 -m common.log_ingestion <clients>` from the repository directory for a summary per worker.
+MASTER = 0
+
+_MASTER_LOGFILE_PATTERN = re.compile(r'^locust_log_(\d+)\.log$')
+_WORKER_LOGFILE_PATTERN = re.compile(r'worker_log_\d+\.(\d+)\.log$')
+
+_END_OF_FILE = None
+
+
+class WorkerRecord(NamedTuple):
+    time_stamp_ns: int
+    worker: int
+    request_type: Optional[str]
+    response_time_ms: float
+
+
+def find_logfiles_of_run(clients: int, directory: str = ".") -> Dict[int, Path]:
+    """
+    Returns the log files written by one call of call_locust_and_distribute_work, keyed by worker (0 is the master).
+    """
+    logfiles = {}
+
+    master_logfile = Path(directory) / f"locust_log_{clients}.log"
+    if master_logfile.exists():
+        logfiles[MASTER] = master_logfile
+
+    for path in Path(directory).glob(f"worker_log_{clients}.*.log"):
+        match = _WORKER_LOGFILE_PATTERN.search(path.name)
+        if match is not None:
+            logfiles[int(match.group(1))] = path
+
+    return dict(sorted(logfiles.items()))
+
+
+def find_logfiles_of_run_of(master_logfile: Path) -> Dict[int, Path]:
+    """
+    Returns the log files of the distributed run the master log file locust_log_{clients}.log belongs to,
+    or an empty dict for other log files.
+    """
+    match = _MASTER_LOGFILE_PATTERN.match(Path(master_logfile).name)
+    if match is None:
+        return {}
+
+    return find_logfiles_of_run(int(match.group(1)), str(Path(master_logfile).parent))
+
+
+def parse_logfiles_in_parallel(logfiles: Dict[int, Path], processes: int = None) -> Dict[int, ResponseTimes]:
+    """
+    Parses every log file in a process pool. Use `merge_logfiles` if the run does not fit into memory.
+    """
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {
+            worker: executor.submit(read_response_times_from_locust_logfile_as_columns, str(path))
+            for worker, path in logfiles.items()
+        }
+
+        return {worker: future.result() for worker, future in futures.items()}
+
+
+def _produce_chunks(path: str, queue: multiprocessing.Queue, chunk_size: int):
+    try:
+        for chunk in iter_response_time_chunks_from_locust_logfile(path, chunk_size):
+            queue.put(chunk)
+    except Exception as e:
+        queue.put(e)
+    finally:
+        queue.put(_END_OF_FILE)
+
+
+def _records_from(queue: multiprocessing.Queue, worker: int) -> Iterator[WorkerRecord]:
+    while True:
+        chunk = queue.get()
+        if chunk is _END_OF_FILE:
+            return
+        if isinstance(chunk, Exception):
+            raise chunk
+
+        request_types = chunk.request_types
+        for time_stamp_ns, code, response_time_ms in zip(
+                chunk.time_stamps_ns.tolist(),
+                chunk.request_type_codes.tolist(),
+                chunk.response_times_ms.tolist()
+        ):
+            yield WorkerRecord(time_stamp_ns, worker, None if code < 0 else request_types[code], response_time_ms)
+
+
+def merge_logfiles(
+        logfiles: Dict[int, Path],
+        chunk_size: int = 10_000,
+        chunks_per_file: int = 2
+) -> Iterator[WorkerRecord]:
+    """
+    Yields the records of all log files in chronological order, tagged with the worker that logged them.
+
+    Every log file is parsed by its own process, so parsing scales with the number of cores.
+    The processes hand over chunks through bounded queues, so at most
+    (chunks_per_file + 1) * chunk_size records per file are held in memory.
+    Every file needs its own producer because the merge needs the next record of every file to proceed.
+    """
+    producers = []
+    iterators = []
+    for worker, path in logfiles.items():
+        queue = multiprocessing.Queue(maxsize=chunks_per_file)
+        producer = multiprocessing.Process(target=_produce_chunks, args=(str(path), queue, chunk_size), daemon=True)
+        producer.start()
+
+        producers.append(producer)
+        iterators.append(_records_from(queue, worker))
+
+    try:
+        yield from heapq.merge(*iterators, key=lambda record: record.time_stamp_ns)
+    finally:
+        for producer in producers:
+            if producer.is_alive():
+                producer.terminate()
+            producer.join()
+
+
+def read_logfiles_of_run(logfiles: Dict[int, Path], chunk_size: int = 100_000) -> ResponseTimes:
+    """
+    Returns the responses of all log files of a run in chronological order, as merged by `merge_logfiles`.
+    """
+    request_types: List[str] = []
+    request_type_codes: Dict[str, int] = {}
+
+    chunks = []
+    time_stamps_ns, codes, response_times_ms = [], [], []
+    for record in merge_logfiles(logfiles):
+        if record.request_type is None:
+            code = -1
+        else:
+            code = request_type_codes.get(record.request_type)
+            if code is None:
+                code = len(request_types)
+                request_type_codes[record.request_type] = code
+                request_types.append(record.request_type)
+
+        time_stamps_ns.append(record.time_stamp_ns)
+        codes.append(code)
+        response_times_ms.append(record.response_time_ms)
+
+        if len(time_stamps_ns) == chunk_size:
+            chunks.append((time_stamps_ns, codes, response_times_ms))
+            time_stamps_ns, codes, response_times_ms = [], [], []
+    chunks.append((time_stamps_ns, codes, response_times_ms))
+
+    return ResponseTimes.concatenate([
+        ResponseTimes(
+            numpy.array(chunk_time_stamps_ns, dtype=numpy.int64),
+            numpy.array(chunk_codes, dtype=numpy.int32),
+            numpy.array(chunk_response_times_ms, dtype=numpy.float64),
+            request_types
+        )
+        for chunk_time_stamps_ns, chunk_codes, chunk_response_times_ms in chunks
+    ])
+
+
+def main(
+        clients: int = typer.Argument(..., help="Number of clients of the run, as used in the names of the log files"),
+        directory: str = typer.Option(".", "--directory", "-d", help="Directory containing the log files")
+):
+    """Merge the master and worker logs of a run and print a summary per worker."""
+    logfiles = find_logfiles_of_run(clients, directory)
+    if len(logfiles) == 0:
+        typer.echo(f"No log files for {clients} clients found in {directory}", err=True)
+        raise typer.Exit(1)
+
+    response_times_by_worker = parse_logfiles_in_parallel(logfiles)
+
+    for worker, path in logfiles.items():
+        response_times = response_times_by_worker[worker]
+        if len(response_times) == 0:
+            print(f"{worker}: {path.name}: 0 responses")
+            continue
+
+        print(f"{worker}: {path.name}: {len(response_times)} responses, "
+              f"avg: {response_times.response_times_ms.mean():.0f} ms, "
+              f"max: {response_times.response_times_ms.max():.0f} ms")
+
+    time_stamps_ns = [r.time_stamps_ns for r in response_times_by_worker.values() if len(r) > 0]
+    if len(time_stamps_ns) > 0:
+        first = min(int(t.min()) for t in time_stamps_ns)
+        last = max(int(t.max()) for t in time_stamps_ns)
+        print(f"From {ns_to_datetime(first)} to {ns_to_datetime(last)}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,284 @@
+import csv
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from common.Common import call_locust_and_distribute_work
+from common.capacity_search import complies_with_real_time_requirements
+from common.cooldown import fetch_status_over_http
+from common.coordinated_omission import rows_to_evaluate
+from common.locust_fleet import pin_to_cpus
+
+# Runs the steps of a parameter variation concurrently, every step against its own simulator instance.
+# Every instance is a pair of ARS simulator and Locust (master and workers), pinned to its own set of CPUs,
+# listening on its own ports and writing to its own working directory.
+
+_ARS_SIMULATION = Path(__file__).resolve().parent.parent / "ARS_simulation.py"
+
+DEFAULT_MODEL = "Models/gs_model_DT_18-03-2023.joblib"
+DEFAULT_MAPPING = "Models/gs_requests_mapping_18-03-2023.json"
+
+
+def mapping_for_model(model: str) -> str:
+    """
+    Returns the request type mapping that was created together with the model, e.g.,
+    Models/gs_requests_mapping_18-03-2023.json for Models/gs_model_Ridge_18-03-2023.joblib and
+    Models/gs_requests_mapping_prod_workload_mascots2022.joblib for Models/gs_model_prod_workload_mascots2022.joblib.
+    """
+    model = Path(model)
+    if "_model_" not in model.stem:
+        raise FileNotFoundError(f"{model} is not named like <system>_model_<name>")
+    system, name = model.stem.split("_model_", 1)
+
+    # the name may start with the algorithm, which is not part of the name of the mapping
+    parts = name.split("_")
+    for i in range(len(parts)):
+        for suffix in (".json", ".joblib"):
+            mapping = model.parent / f"{system}_requests_mapping_{'_'.join(parts[i:])}{suffix}"
+            if mapping.exists():
+                return str(mapping)
+
+    raise FileNotFoundError(f"No request type mapping found for {model}")
+
+
+@dataclass
+class SweepInstance:
+    index: int
+    port: int
+    master_port: int
+    cpus: List[int]
+    working_directory: Path
+
+    @property
+    def url(self) -> str:
+        return f"http://localhost:{self.port}"
+
+
+@dataclass
+class SweepStep:
+    num_clients: int
+    model: str = DEFAULT_MODEL
+    mapping: str = DEFAULT_MAPPING
+
+
+@dataclass
+class SweepResult:
+    step: SweepStep
+    average_response_time_ms: float
+    min_response_time_ms: float
+    max_response_time_ms: float
+
+    @property
+    def is_compliant(self) -> bool:
+        if self.average_response_time_ms == 0 or self.max_response_time_ms == 0:
+            return False
+
+        return complies_with_real_time_requirements(
+            self.average_response_time_ms / 1000,
+            self.max_response_time_ms / 1000
+        )
+
+
+def available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cpus(num_instances: int, cpus: List[int] = None) -> List[List[int]]:
+    """
+    Splits the CPUs into `num_instances` disjoint, contiguous sets of (almost) equal size.
+    """
+    cpus = cpus if cpus is not None else available_cpus()
+    if num_instances > len(cpus):
+        raise ValueError(f"Cannot run {num_instances} instances on {len(cpus)} CPUs")
+
+    size, remainder = divmod(len(cpus), num_instances)
+    partitions = []
+    start = 0
+    for i in range(num_instances):
+        end = start + size + (1 if i < remainder else 0)
+        partitions.append(cpus[start:end])
+        start = end
+
+    return partitions
+
+
+def create_instances(
+        num_instances: int,
+        output_directory: str,
+        first_port: int = 1337,
+        first_master_port: int = 5557
+) -> List[SweepInstance]:
+    instances = []
+    for i, cpus in enumerate(partition_cpus(num_instances)):
+        working_directory = Path(output_directory) / f"instance_{i}"
+        working_directory.mkdir(parents=True, exist_ok=True)
+
+        instances.append(SweepInstance(
+            index=i,
+            port=first_port + i,
+            # Locust uses the bind port and the one after it
+            master_port=first_master_port + 2 * i,
+            cpus=cpus,
+            working_directory=working_directory
+        ))
+
+    return instances
+
+
+def _start_simulator(instance: SweepInstance, step: SweepStep, startup_timeout_s: float = 120) -> subprocess.Popen:
+    logger = logging.getLogger('parallel_sweep')
+
+    simulator = subprocess.Popen(
+        [
+            sys.executable, str(_ARS_SIMULATION),
+            "--port", str(instance.port),
+            "--model", os.path.abspath(step.model),
+            "--mapping", os.path.abspath(step.mapping)
+        ],
+        cwd=instance.working_directory,
+        preexec_fn=pin_to_cpus(instance.cpus),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.monotonic() + startup_timeout_s
+    while fetch_status_over_http(instance.url) is None:
+        if simulator.poll() is not None:
+            raise RuntimeError(f"Simulator of instance {instance.index} terminated with {simulator.returncode}")
+        if time.monotonic() > deadline:
+            simulator.kill()
+            raise RuntimeError(f"Simulator of instance {instance.index} did not start within {startup_timeout_s}s")
+        time.sleep(0.5)
+
+    logger.info(f"Instance {instance.index}: simulator with {step.model} listening on {instance.port}")
+
+    return simulator
+
+
+def _stop_simulator(simulator: subprocess.Popen):
+    simulator.terminate()
+    try:
+        simulator.wait(10)
+    except subprocess.TimeoutExpired:
+        simulator.kill()
+        simulator.wait()
+
+
+def _read_stats(path: Path) -> Tuple[float, float, float]:
+    """
+    Returns the largest average, min and max response time over all rows, like locust-parameter-variation.py,
+    over the rows with corrected response times, if there are any.
+    """
+    avg = min_ = max_ = 0.0
+    with open(path, newline='') as csvfile:
+        for row in rows_to_evaluate(list(csv.DictReader(csvfile))):
+            avg = max(avg, float(row['Average Response Time']))
+            min_ = max(min_, float(row['Min Response Time']))
+            max_ = max(max_, float(row['Max Response Time']))
+
+    return avg, min_, max_
+
+
+def _run_step(
+        locust_script: str,
+        instance: SweepInstance,
+        step: SweepStep,
+        runtime_in_min: int
+) -> SweepResult:
+    logger = logging.getLogger('parallel_sweep')
+    logger.info(f"Instance {instance.index}: {step.num_clients} clients against {step.model} "
+                f"on CPUs {instance.cpus}")
+
+    # a fresh simulator per step, so that no residual load of a previous step leaks into this one
+    simulator = _start_simulator(instance, step)
+    try:
+        call_locust_and_distribute_work(
+            locust_script,
+            instance.url,
+            step.num_clients,
+            runtime_in_min=runtime_in_min,
+            use_load_test_shape=False,
+            num_workers=len(instance.cpus),
+            use_manual_runtime_management=True,
+            master_port=instance.master_port,
+            cpus=instance.cpus,
+            working_directory=str(instance.working_directory)
+        )
+    finally:
+        _stop_simulator(simulator)
+
+    avg, min_, max_ = _read_stats(instance.working_directory / f"loadtest_{step.num_clients}_clients_stats.csv")
+
+    return SweepResult(step, avg, min_, max_)
+
+
+def run_sweep(
+        locust_script: str,
+        steps: List[SweepStep],
+        instances: List[SweepInstance],
+        runtime_in_min: int = 1,
+        stop_model_at_first_failure: bool = True
+) -> List[SweepResult]:
+    """
+    Runs the steps on the instances, as many at the same time as there are instances.
+    Steps are started in the given order; with `stop_model_at_first_failure`, steps with more clients
+    than a failed step of the same model are skipped, like the sequential parameter variation does.
+    """
+    logger = logging.getLogger('parallel_sweep')
+
+    free_instances = queue.Queue()
+    for instance in instances:
+        free_instances.put(instance)
+
+    lock = threading.Lock()
+    first_failure: Dict[str, int] = {}
+
+    def run(step: SweepStep) -> Optional[SweepResult]:
+        instance = free_instances.get()
+        try:
+            with lock:
+                if stop_model_at_first_failure and step.num_clients > first_failure.get(step.model, step.num_clients):
+                    logger.info(f"Skipping {step.num_clients} clients against {step.model}")
+                    return None
+
+            result = _run_step(locust_script, instance, step, runtime_in_min)
+
+            if not result.is_compliant:
+                with lock:
+                    first_failure[step.model] = min(first_failure.get(step.model, step.num_clients), step.num_clients)
+
+            return result
+        finally:
+            free_instances.put(instance)
+
+    with ThreadPoolExecutor(max_workers=len(instances)) as executor:
+        results = [result for result in executor.map(run, steps) if result is not None]
+
+    return sorted(results, key=lambda r: (r.step.model, r.step.num_clients))
+
+
+def write_results_log(results: List[SweepResult], path: Path):
+    """
+    Writes the results in the format of locust-parameter-variation.log,
+    so that aggregate-logs.py and loadtest_plotter.py can read them.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as log:
+        for result in sorted(results, key=lambda r: r.step.num_clients):
+            time_stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S,%f")[:-3]
+            log.write(f"{time_stamp} Clients: {result.step.num_clients}: "
+                      f"avg: {result.average_response_time_ms / 1000}s, "
+                      f"max: {result.max_response_time_ms / 1000}s\n")
+            log.write(f"{time_stamp} --> {result.is_compliant}\n")
@@ -0,0 +1,126 @@
+import json
+import os
+import struct
+from typing import Iterator, List, Optional
+
+# Messages between executor.py and mininet/teastore_topo.py over named pipes.
+# Every frame is a 4-byte big-endian length followed by a UTF-8 encoded json object
+# {"v": <protocol version>, "type": <message type>, ...payload}.
+# Readers ignore message types they do not know, so that new types can be added without breaking old readers.
+
+PROTOCOL_VERSION = 1
+
+# executor -> orchestrator
+EXECUTOR_PIPE = "/tmp/locust_executor_pipe"
+PROFILE = "profile"  # {"name": load intensity profile}
+STATS = "stats"  # statistics of the last second, see common/inprocess_runner.py
+FIN = "fin"  # the load test has finished
+
+# orchestrator -> executor
+CONTROL_PIPE = "/tmp/locust_executor_control_pipe"
+STOP = "stop"  # {"reason": ...} end the load test now
+
+_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(message_type: str, **payload) -> bytes:
+    body = json.dumps({"v": PROTOCOL_VERSION, "type": message_type, **payload}).encode()
+    return _HEADER.pack(len(body)) + body
+
+
+def write_frame(fd: int, message_type: str, **payload):
+    frame = encode_frame(message_type, **payload)
+    written = 0
+    while written < len(frame):
+        written += os.write(fd, frame[written:])
+
+
+def _decode(body: bytes) -> dict:
+    message = json.loads(body)
+    if not isinstance(message, dict) or "type" not in message:
+        raise ProtocolError(f"Not a message: {body[:100]}")
+    if message.get("v", 0) > PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version {message.get('v')}")
+
+    return message
+
+
+class FrameReader:
+    """
+    Reassembles frames from the chunks read from a pipe.
+    """
+
+    def __init__(self, fd: int):
+        self._fd = fd
+        self._buffer = bytearray()
+        self.is_closed = False
+
+    def _next_frame_in_buffer(self) -> Optional[dict]:
+        if len(self._buffer) < _HEADER.size:
+            return None
+
+        (length,) = _HEADER.unpack_from(self._buffer)
+        if length > MAX_FRAME_SIZE:
+            raise ProtocolError(f"Frame of {length} bytes exceeds {MAX_FRAME_SIZE} bytes")
+        if len(self._buffer) < _HEADER.size + length:
+            return None
+
+        body = bytes(self._buffer[_HEADER.size:_HEADER.size + length])
+        del self._buffer[:_HEADER.size + length]
+
+        return _decode(body)
+
+    def read_frame(self) -> Optional[dict]:
+        """
+        Blocks until the next frame arrived; returns None when the writer closed the pipe.
+        """
+        while True:
+            frame = self._next_frame_in_buffer()
+            if frame is not None:
+                return frame
+
+            chunk = os.read(self._fd, 64 * 1024)
+            if not chunk:
+                self.is_closed = True
+                return None
+            self._buffer += chunk
+
+    def __iter__(self) -> Iterator[dict]:
+        while True:
+            frame = self.read_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def read_available_frames(self) -> List[dict]:
+        """
+        Returns the frames that arrived so far, without blocking; the pipe has to be opened with O_NONBLOCK.
+        """
+        while not self.is_closed:
+            try:
+                chunk = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not chunk:
+                # no writer at the moment, one might open the pipe later
+                break
+            self._buffer += chunk
+
+        frames = []
+        while True:
+            frame = self._next_frame_in_buffer()
+            if frame is None:
+                return frames
+            frames.append(frame)
+
+
+def open_pipe(path: str, flags: int) -> int:
+    if not os.path.exists(path):
+        os.mkfifo(path)
+
+    return os.open(path, flags)
@@ -0,0 +1,53 @@
+from typing import Tuple
+
+import numpy
+
+# Reduces response time series to a number of points that only depends on the resolution of the figure,
+# so that plotting a run with millions of responses takes as long as plotting a short run.
+
+# Response times above this are plotted exactly, e.g., faults (10 s) and violations of EN 50136 (30 s).
+OUTLIER_THRESHOLD_S = 10
+
+
+def min_max_downsample(x: numpy.ndarray, y: numpy.ndarray, num_buckets: int) -> numpy.ndarray:
+    """
+    Splits the x range into `num_buckets` equally wide buckets, e.g., one per pixel,
+    and returns the indices of the smallest and the largest y of every bucket, sorted by x.
+    The envelope of the series stays the same, so spikes are not smoothed away.
+    """
+    if len(x) <= 2 * num_buckets:
+        return numpy.arange(len(x))
+
+    x_min = x.min()
+    width = (x.max() - x_min) / num_buckets
+    if width == 0:
+        buckets = numpy.zeros(len(x), dtype=numpy.int64)
+    else:
+        buckets = numpy.minimum(((x - x_min) / width).astype(numpy.int64), num_buckets - 1)
+
+    # sorted by bucket and, within a bucket, by y: the first index of a bucket is its min, the last one its max
+    order = numpy.lexsort((y, buckets))
+    sorted_buckets = buckets[order]
+    starts = numpy.flatnonzero(numpy.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    ends = numpy.r_[starts[1:], len(order)] - 1
+
+    indices = numpy.unique(numpy.concatenate((order[starts], order[ends])))
+
+    return indices[numpy.argsort(x[indices], kind='stable')]
+
+
+def split_outliers(
+        x: numpy.ndarray,
+        y: numpy.ndarray,
+        threshold: float = OUTLIER_THRESHOLD_S
+) -> Tuple[Tuple[numpy.ndarray, numpy.ndarray], Tuple[numpy.ndarray, numpy.ndarray]]:
+    """
+    Returns ((x, y) below or at the threshold, (x, y) above the threshold).
+    """
+    is_outlier = y > threshold
+
+    return (x[~is_outlier], y[~is_outlier]), (x[is_outlier], y[is_outlier])
+
+
+def log_bins(y_min: float, y_max: float, num_bins: int) -> numpy.ndarray:
+    return numpy.logspace(numpy.log10(y_min), numpy.log10(y_max), num_bins + 1)
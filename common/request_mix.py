@@ -0,0 +1,140 @@
+import csv
+import logging
+import os
+import random
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# A request mix assigns a weight to every command, e.g., its share of the recorded production traffic,
+# so that the load generators send the commands in the same proportions as in production instead of uniformly.
+# Request mix files are csv files with a header, e.g.,
+#   request,weight
+#   ID_REQ_LCMD_MONGETMASTERSTATUS,5321
+#   ID_GET_PLZ_LISTE,12
+# and optionally an hour column (0-23) for mixes that change over the day:
+#   hour,request,weight
+#   ,ID_REQ_LCMD_MONGETMASTERSTATUS,5321
+#   3,ID_REQ_LCMD_MONGETMASTERSTATUS,800
+# Rows without an hour form the default mix, which is used for the hours without rows of their own;
+# without such rows, the default mix is the sum of the hourly mixes.
+
+
+class AliasTable:
+    """
+    Draws an index with a probability proportional to its weight in constant time (Vose's alias method).
+    """
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        total = float(sum(weights))
+        if n == 0 or total <= 0 or min(weights) < 0:
+            raise ValueError("An alias table requires non-negative weights with a positive sum")
+
+        self._probability = [0.0] * n
+        self._alias = list(range(n))
+
+        scaled = [weight * n / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._probability[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1
+            (small if scaled[more] < 1 else large).append(more)
+
+        # the rest has a probability of 1, up to rounding errors
+        for i in small + large:
+            self._probability[i] = 1.0
+
+    def __len__(self):
+        return len(self._probability)
+
+    def draw(self, random_source: random.Random = random) -> int:
+        i = random_source.randrange(len(self._probability))
+
+        return i if random_source.random() < self._probability[i] else self._alias[i]
+
+
+class RequestMix:
+    """
+    Draws commands according to a default mix and optionally one mix per hour of the day.
+    """
+
+    def __init__(self, weights: Dict[str, float], hourly_weights: Optional[Dict[int, Dict[str, float]]] = None):
+        self._requests, self._table = self._table_of(weights)
+        self._hourly = {hour: self._table_of(hour_weights) for hour, hour_weights in (hourly_weights or {}).items()}
+
+    @staticmethod
+    def _table_of(weights: Dict[str, float]):
+        requests = [request for request, weight in weights.items() if weight > 0]
+        return requests, AliasTable([weights[request] for request in requests])
+
+    @property
+    def is_hourly(self) -> bool:
+        return len(self._hourly) > 0
+
+    @property
+    def requests(self) -> List[str]:
+        names = set(self._requests)
+        for requests, _ in self._hourly.values():
+            names.update(requests)
+
+        return sorted(names)
+
+    def choose(self, random_source: random.Random = random, hour: Optional[int] = None) -> str:
+        """
+        Draws a command of the mix of the hour, or of the default mix if the hour is None or has no mix of its own.
+        """
+        requests, table = self._hourly.get(hour, (self._requests, self._table))
+
+        return requests[table.draw(random_source)]
+
+    @staticmethod
+    def from_csv(path: str) -> 'RequestMix':
+        weights: Dict[str, float] = defaultdict(float)
+        hourly_weights: Dict[int, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+        with open(path, newline='') as csvfile:
+            for row in csv.DictReader(csvfile):
+                request = row['request'].strip()
+                weight = float(row['weight'])
+                hour = (row.get('hour') or '').strip()
+                if hour == '':
+                    weights[request] += weight
+                    continue
+
+                if not 0 <= int(hour) < 24:
+                    raise ValueError(f"{path}: {hour} is not an hour of the day")
+                hourly_weights[int(hour)][request] += weight
+
+        if len(weights) == 0:
+            for hour_weights in hourly_weights.values():
+                for request, weight in hour_weights.items():
+                    weights[request] += weight
+
+        return RequestMix(weights, hourly_weights)
+
+    @staticmethod
+    def from_environment(known_requests: Iterable[str] = ()) -> Optional['RequestMix']:
+        """
+        Returns the mix of REQUEST_MIX_FILE, or None if it is not set.
+        Warns about commands that are not `known_requests`, e.g., the names of All_Request_Names.log.
+        """
+        path = os.environ.get('REQUEST_MIX_FILE')
+        if not path:
+            return None
+
+        logger = logging.getLogger('RequestMix')
+
+        mix = RequestMix.from_csv(path)
+        known_requests = set(known_requests)
+        if len(known_requests) > 0:
+            unknown_requests = [request for request in mix.requests if request not in known_requests]
+            if len(unknown_requests) > 0:
+                logger.warning(f"{len(unknown_requests)} requests of {path} are unknown: {unknown_requests}")
+
+        hourly = f" with mixes for {len(mix._hourly)} hours" if mix.is_hourly else ""
+        logger.info(f"Drawing {len(mix.requests)} requests according to {path}{hourly}")
+
+        return mix
@@ -0,0 +1,152 @@
+import csv
+import json
+import math
+from typing import Dict, Iterable, List
+
+import numpy
+
+from common.Common import ResponseTimes
+
+# Response times are counted in buckets whose width grows with the response time (log-linear),
+# so that every percentile is within RELATIVE_ERROR of the exact one,
+# while a histogram has a fixed size independent of the number of response times.
+
+RELATIVE_ERROR = 0.01
+# Response times above this are counted in the last bucket (about 28 hours)
+MAX_RESPONSE_TIME_MS = 1e8
+
+_LOG_BASE = math.log1p(RELATIVE_ERROR)
+# bucket 0: response times below 1 ms, bucket i: [(1 + e)^(i - 1), (1 + e)^i) ms
+NUMBER_OF_BUCKETS = 2 + int(math.ceil(math.log(MAX_RESPONSE_TIME_MS) / _LOG_BASE))
+
+PERCENTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+
+
+def _bucket_of(response_times_ms: numpy.ndarray) -> numpy.ndarray:
+    buckets = numpy.zeros(len(response_times_ms), dtype=numpy.int64)
+    at_least_1_ms = response_times_ms >= 1
+    buckets[at_least_1_ms] = 1 + numpy.floor(numpy.log(response_times_ms[at_least_1_ms]) / _LOG_BASE).astype(numpy.int64)
+
+    return numpy.minimum(buckets, NUMBER_OF_BUCKETS - 1)
+
+
+def _upper_bound_of(bucket: int) -> float:
+    if bucket == 0:
+        return 1
+
+    return math.exp(bucket * _LOG_BASE)
+
+
+def bucket_counts(response_times_ms: numpy.ndarray) -> numpy.ndarray:
+    return numpy.bincount(_bucket_of(response_times_ms), minlength=NUMBER_OF_BUCKETS)
+
+
+def percentile_of_counts(counts: numpy.ndarray, count: int, q: float) -> float:
+    """
+    Returns the upper bound of the bucket that contains the `q` percentile of the `count` response times in `counts`.
+    """
+    rank = max(1, int(math.ceil(q * count)))
+
+    return _upper_bound_of(int(numpy.searchsorted(numpy.cumsum(counts), rank)))
+
+
+class ResponseTimeHistogram:
+    """
+    Count, sum, min and max are exact; percentiles are estimated from the histogram.
+    Histograms of the same request type, e.g., of different log files, can be merged.
+    """
+
+    def __init__(self):
+        self.counts = numpy.zeros(NUMBER_OF_BUCKETS, dtype=numpy.int64)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.min_ms = math.inf
+        self.max_ms = -math.inf
+
+    def add(self, response_times_ms: numpy.ndarray):
+        if len(response_times_ms) == 0:
+            return
+
+        self.counts += bucket_counts(response_times_ms)
+        self.count += len(response_times_ms)
+        self.sum_ms += float(response_times_ms.sum())
+        self.min_ms = min(self.min_ms, float(response_times_ms.min()))
+        self.max_ms = max(self.max_ms, float(response_times_ms.max()))
+
+    def merge(self, other: 'ResponseTimeHistogram'):
+        self.counts += other.counts
+        self.count += other.count
+        self.sum_ms += other.sum_ms
+        self.min_ms = min(self.min_ms, other.min_ms)
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    @property
+    def mean_ms(self) -> float:
+        return self.sum_ms / self.count if self.count > 0 else 0
+
+    def percentile(self, q: float) -> float:
+        if self.count == 0:
+            return 0
+
+        return min(max(percentile_of_counts(self.counts, self.count, q), self.min_ms), self.max_ms)
+
+    def summary(self) -> Dict[str, float]:
+        summary = {
+            "count": self.count,
+            "mean": self.mean_ms,
+            "min": self.min_ms if self.count > 0 else 0,
+            "max": self.max_ms if self.count > 0 else 0,
+        }
+        for q in PERCENTILES:
+            summary[f"p{q * 100:g}"] = self.percentile(q)
+
+        return summary
+
+
+def aggregate_response_times(chunks: Iterable[ResponseTimes]) -> Dict[str, ResponseTimeHistogram]:
+    """
+    Aggregates the response times of every request type in one pass over the chunks.
+    Lines without a request type are ignored.
+    """
+    histograms: Dict[str, ResponseTimeHistogram] = {}
+
+    for chunk in chunks:
+        codes = chunk.request_type_codes
+        order = numpy.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        sorted_response_times = chunk.response_times_ms[order]
+
+        unique_codes, starts = numpy.unique(sorted_codes, return_index=True)
+        ends = numpy.append(starts[1:], len(sorted_codes))
+        for code, start, end in zip(unique_codes.tolist(), starts.tolist(), ends.tolist()):
+            if code < 0:
+                continue
+
+            request_type = chunk.request_type_of(code)
+            if request_type not in histograms:
+                histograms[request_type] = ResponseTimeHistogram()
+            histograms[request_type].add(sorted_response_times[start:end])
+
+    return dict(sorted(histograms.items()))
+
+
+def summarize(histograms: Dict[str, ResponseTimeHistogram]) -> Dict[str, Dict[str, float]]:
+    return {request_type: histogram.summary() for request_type, histogram in histograms.items()}
+
+
+def write_summary_as_json(summary: Dict[str, Dict[str, float]], path: str):
+    with open(path, 'w') as json_file:
+        json.dump(summary, json_file, indent=2)
+
+
+def write_summary_as_csv(summary: Dict[str, Dict[str, float]], path: str):
+    columns: List[str] = []
+    for statistics in summary.values():
+        columns = list(statistics.keys())
+        break
+
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["Request Type"] + columns)
+        for request_type, statistics in summary.items():
+            writer.writerow([request_type] + [statistics[c] for c in columns])
@@ -0,0 +1,159 @@
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional, Tuple
+
+import numpy
+
+from common.response_time_histogram import NUMBER_OF_BUCKETS, bucket_counts, percentile_of_counts
+
+# Response time percentiles over a window that slides over the run in steps of, e.g., one second.
+# The window is the sum of the histograms of its steps, so memory depends on the window length, not on the run length,
+# and the percentiles have the relative error of common/response_time_histogram.py.
+
+_NS_PER_SECOND = 1_000_000_000
+
+
+@dataclass
+class RollingPercentiles:
+    """
+    One entry per step: `time_s` is the end of the window relative to the first response,
+    `throughput_rps` the responses per second within the window and the response times are in ms (0 without responses).
+    """
+    time_s: numpy.ndarray
+    throughput_rps: numpy.ndarray
+    p50_ms: numpy.ndarray
+    p95_ms: numpy.ndarray
+    p99_ms: numpy.ndarray
+    max_ms: numpy.ndarray
+
+
+@dataclass
+class _Step:
+    counts: numpy.ndarray
+    count: int
+    min_ms: float
+    max_ms: float
+
+
+class RollingPercentileEngine:
+    """
+    Consumes response times in chronological chunks, e.g., from iter_response_time_chunks_from_locust_logfile,
+    and computes the percentiles of every `window_s` long window, moved by `step_s`.
+    """
+
+    def __init__(self, window_s: float = 10, step_s: float = 1):
+        if step_s <= 0 or window_s < step_s:
+            raise ValueError(f"Window ({window_s} s) must be at least one step ({step_s} s) long")
+
+        self.window_s = window_s
+        self.step_s = step_s
+        self._step_ns = int(step_s * _NS_PER_SECOND)
+        self._steps_per_window = int(math.ceil(window_s / step_s))
+
+        self._window: Deque[_Step] = deque()
+        self._window_counts = numpy.zeros(NUMBER_OF_BUCKETS, dtype=numpy.int64)
+        self._window_count = 0
+        self._start_ns: Optional[int] = None
+        self._next_step = 0
+        # response times of the step that may continue in the next chunk
+        self._pending: List[numpy.ndarray] = []
+        self._rows: List[Tuple[float, float, float, float, float, float]] = []
+
+    def _push(self, response_times_ms: numpy.ndarray):
+        if len(response_times_ms) > 0:
+            step = _Step(
+                bucket_counts(response_times_ms),
+                len(response_times_ms),
+                float(response_times_ms.min()),
+                float(response_times_ms.max())
+            )
+        else:
+            step = _Step(numpy.zeros(NUMBER_OF_BUCKETS, dtype=numpy.int64), 0, math.inf, 0)
+
+        self._window.append(step)
+        self._window_counts += step.counts
+        self._window_count += step.count
+        if len(self._window) > self._steps_per_window:
+            oldest = self._window.popleft()
+            self._window_counts -= oldest.counts
+            self._window_count -= oldest.count
+
+        self._next_step += 1
+        self._rows.append(self._statistics_of_window())
+
+    def _statistics_of_window(self) -> Tuple[float, float, float, float, float, float]:
+        time_s = self._next_step * self.step_s
+        duration_s = len(self._window) * self.step_s
+        if self._window_count == 0:
+            return time_s, 0, 0, 0, 0, 0
+
+        min_ms = min(s.min_ms for s in self._window)
+        max_ms = max(s.max_ms for s in self._window)
+
+        def percentile(q: float) -> float:
+            return min(max(percentile_of_counts(self._window_counts, self._window_count, q), min_ms), max_ms)
+
+        return (
+            time_s,
+            self._window_count / duration_s,
+            percentile(0.5),
+            percentile(0.95),
+            percentile(0.99),
+            max_ms
+        )
+
+    def add(self, time_stamps_ns: numpy.ndarray, response_times_ms: numpy.ndarray):
+        """
+        Adds the response times of the next chunk; every time stamp has to be later than the steps that were already
+        completed, which holds for chunks in the order of the log file.
+        """
+        if len(time_stamps_ns) == 0:
+            return
+
+        if self._start_ns is None:
+            self._start_ns = int(time_stamps_ns.min())
+
+        steps = (time_stamps_ns - self._start_ns) // self._step_ns
+        if steps.min() < self._next_step:
+            raise ValueError("Response times have to be added in chronological order")
+        order = numpy.argsort(steps, kind='stable')
+        steps = steps[order]
+        response_times_ms = response_times_ms[order]
+
+        # complete all steps before the last one of this chunk, the last one may continue in the next chunk
+        last_step = int(steps[-1])
+        boundaries = numpy.searchsorted(steps, numpy.arange(self._next_step, last_step + 1))
+        pending = self._pending
+        for i in range(last_step - self._next_step):
+            step_response_times_ms = response_times_ms[boundaries[i]:boundaries[i + 1]]
+            if len(pending) > 0:
+                step_response_times_ms = numpy.concatenate(pending + [step_response_times_ms])
+                pending = []
+            self._push(step_response_times_ms)
+
+        self._pending = pending + [response_times_ms[boundaries[-1]:]]
+
+    def result(self) -> RollingPercentiles:
+        """
+        Completes the last step and returns the percentiles of every step so far.
+        """
+        if len(self._pending) > 0:
+            self._push(numpy.concatenate(self._pending))
+            self._pending = []
+
+        rows = numpy.array(self._rows, dtype=numpy.float64).reshape(-1, 6)
+
+        return RollingPercentiles(*(rows[:, i] for i in range(6)))
+
+
+def rolling_percentiles(
+        time_stamps_ns: numpy.ndarray,
+        response_times_ms: numpy.ndarray,
+        window_s: float = 10,
+        step_s: float = 1
+) -> RollingPercentiles:
+    engine = RollingPercentileEngine(window_s, step_s)
+    engine.add(time_stamps_ns, response_times_ms)
+
+    return engine.result()
@@ -0,0 +1,62 @@
+import hashlib
+import os
+from dataclasses import dataclass
+
+import numpy
+
+# In a distributed load test, every worker process runs the same locustfile. To split a scheduled workload
+# among the workers instead of sending it once per worker, every scheduled request, e.g., an arrival of an
+# open-loop schedule, and every simulated user has a global number and belongs to the worker `number % count`.
+# The random choices of a request or user are seeded with its global number, not with the worker.
+# For scheduled requests, the combined load of all workers is therefore the same for any number of workers.
+# For users, this is best-effort: Locust gives the users that do not divide evenly among the workers to the workers
+# in the order they connected, not by their index, so which global user numbers exist then depends on that order.
+# A worker that is restarted during a load test starts its share of a schedule from the beginning.
+# LocustWorkerFleet sets LOCUST_WORKER_INDEX (0 to count - 1) and LOCUST_WORKER_COUNT of every worker.
+
+
+@dataclass(frozen=True)
+class WorkerShard:
+    index: int = 0
+    count: int = 1
+
+    def __post_init__(self):
+        if not 0 <= self.index < self.count:
+            raise ValueError(f"Worker {self.index} is not one of {self.count} workers")
+
+    @staticmethod
+    def from_environment() -> 'WorkerShard':
+        """
+        The shard of this process; processes that are not started by a LocustWorkerFleet own everything.
+        """
+        return WorkerShard(
+            int(os.environ.get('LOCUST_WORKER_INDEX', 0)),
+            int(os.environ.get('LOCUST_WORKER_COUNT', 1))
+        )
+
+    def owns(self, number: int) -> bool:
+        return number % self.count == self.index
+
+    def numbers_of(self, number_of_requests: int) -> numpy.ndarray:
+        """
+        The global numbers of the requests of this worker, e.g., the indices of its arrivals in a schedule.
+        Taking every count-th request spreads every second of the schedule evenly over the workers.
+        """
+        return numpy.arange(self.index, number_of_requests, self.count)
+
+    def global_number_of(self, local_number: int) -> int:
+        """
+        The global number of the `local_number`-th user of this worker;
+        the global numbers of all users are consecutive only if every worker runs the same number of users.
+        """
+        return local_number * self.count + self.index
+
+
+def seed_of(seed: int, number: int) -> int:
+    """
+    The seed of the random choices of the request or user with the global `number`,
+    which does not depend on the process or the hash seed of Python.
+    """
+    digest = hashlib.blake2b(f"{seed}:{number}".encode(), digest_size=8).digest()
+
+    return int.from_bytes(digest, 'big')
@@ -0,0 +1,214 @@
+import csv
+import logging
+import math
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from common.capacity_search import AVG_TIME_ALLOWED_IN_S, MAX_TIME_ALLOWED_IN_S, complies_with_real_time_requirements
+
+
+class StepDecision(Enum):
+    CONTINUE = "continue"
+    PASS = "pass"
+    FAIL = "fail"
+
+
+class StepController:
+    """
+    Decides while a step of the parameter variation is running whether its outcome is already clear.
+
+    The controller is fed with the cumulative statistics of the step (as Locust reports them)
+    and uses the mean response time of every interval between two observations as one sample
+    (batch means), to estimate a confidence interval for the average response time.
+
+    - FAIL as soon as the max response time exceeds its limit, because the max can only grow.
+    - FAIL once the lower bound of the confidence interval is above the allowed average.
+    - At the nominal duration, the step is decided like a fixed-length step,
+      unless the confidence interval still contains the allowed average.
+      Such borderline steps are extended up to the max duration.
+
+    A step never passes before its nominal duration: in an overloaded system, the response times keep growing
+    while the queues fill up, so a step that looks compliant after a few seconds can still fail at its end.
+    """
+
+    def __init__(
+            self,
+            nominal_duration_s: float = 60,
+            min_duration_s: float = 10,
+            max_duration_s: float = None,
+            avg_limit_s: float = AVG_TIME_ALLOWED_IN_S,
+            max_limit_s: float = MAX_TIME_ALLOWED_IN_S,
+            confidence_z: float = 2.576,
+            min_samples: int = 5
+    ):
+        self._logger = logging.getLogger('StepController')
+
+        self.nominal_duration_s = nominal_duration_s
+        self.min_duration_s = min(min_duration_s, nominal_duration_s)
+        self.max_duration_s = max_duration_s if max_duration_s is not None else 3 * nominal_duration_s
+        self.avg_limit_s = avg_limit_s
+        self.max_limit_s = max_limit_s
+        self.confidence_z = confidence_z
+        self.min_samples = max(min_samples, 2)
+
+        self.num_requests = 0
+        self.total_response_time_ms = 0.0
+        self.max_response_time_ms = 0.0
+        self.elapsed_s = 0.0
+
+        # Welford's online algorithm over the mean response times of the intervals in seconds
+        self._num_samples = 0
+        self._mean_of_samples = 0.0
+        self._m2 = 0.0
+
+        self.decision = StepDecision.CONTINUE
+        self.reason = ""
+
+    @property
+    def average_response_time_s(self) -> float:
+        if self.num_requests == 0:
+            return 0
+        return self.total_response_time_ms / self.num_requests / 1000
+
+    @property
+    def max_response_time_s(self) -> float:
+        return self.max_response_time_ms / 1000
+
+    def confidence_interval_s(self) -> Optional[Tuple[float, float]]:
+        if self._num_samples < self.min_samples:
+            return None
+
+        variance = self._m2 / (self._num_samples - 1)
+        half_width = self.confidence_z * math.sqrt(variance / self._num_samples)
+        average = self.average_response_time_s
+
+        return average - half_width, average + half_width
+
+    def _add_sample(self, sample: float):
+        self._num_samples += 1
+        delta = sample - self._mean_of_samples
+        self._mean_of_samples += delta / self._num_samples
+        self._m2 += delta * (sample - self._mean_of_samples)
+
+    def _decide(self, decision: StepDecision, reason: str) -> StepDecision:
+        self.decision = decision
+        self.reason = reason
+        self._logger.info(f"{decision.value} after {self.elapsed_s:.0f}s: {reason}")
+        return decision
+
+    def observe(
+            self,
+            elapsed_s: float,
+            num_requests: int,
+            total_response_time_ms: float,
+            max_response_time_ms: float
+    ) -> StepDecision:
+        """
+        Takes the cumulative statistics of the step, `elapsed_s` seconds after it started.
+        """
+        if self.decision is not StepDecision.CONTINUE:
+            return self.decision
+
+        new_requests = num_requests - self.num_requests
+        if new_requests > 0:
+            self._add_sample((total_response_time_ms - self.total_response_time_ms) / new_requests / 1000)
+
+        self.elapsed_s = elapsed_s
+        self.num_requests = num_requests
+        self.total_response_time_ms = total_response_time_ms
+        self.max_response_time_ms = max(self.max_response_time_ms, max_response_time_ms)
+
+        if self.max_response_time_s > self.max_limit_s:
+            return self._decide(StepDecision.FAIL, f"max response time {self.max_response_time_s}s")
+
+        if self.num_requests == 0:
+            if elapsed_s > self.max_limit_s:
+                return self._decide(StepDecision.FAIL, f"no response within {elapsed_s:.0f}s")
+            return self.decision
+
+        if elapsed_s < self.min_duration_s:
+            return self.decision
+
+        interval = self.confidence_interval_s()
+        if interval is not None:
+            lower, upper = interval
+            if lower > self.avg_limit_s:
+                return self._decide(StepDecision.FAIL, f"average response time in [{lower:.3f}, {upper:.3f}]s")
+
+        if elapsed_s < self.nominal_duration_s:
+            return self.decision
+
+        is_borderline = interval is not None and interval[0] <= self.avg_limit_s <= interval[1]
+        if is_borderline and elapsed_s < self.max_duration_s:
+            return self.decision
+
+        is_compliant = complies_with_real_time_requirements(self.average_response_time_s, self.max_response_time_s)
+        return self._decide(
+            StepDecision.PASS if is_compliant else StepDecision.FAIL,
+            f"avg: {self.average_response_time_s}s, max: {self.max_response_time_s}s"
+        )
+
+
+class StatsHistoryReader:
+    """
+    Reads the rows Locust appends to <csv prefix>_stats_history.csv while it is running.
+    Locust flushes this file only every 10 seconds, so the rows arrive in batches.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offset = 0
+        self._columns: Optional[List[str]] = None
+
+    def read_new_rows(self) -> List[Dict[str, str]]:
+        try:
+            with open(self.path, 'rb') as history_file:
+                history_file.seek(self._offset)
+                data = history_file.read()
+        except FileNotFoundError:
+            return []
+
+        # the last line might still be written
+        end = data.rfind(b'\n') + 1
+        self._offset += end
+
+        rows = []
+        for row in csv.reader(data[:end].decode().splitlines()):
+            if self._columns is None:
+                self._columns = row
+            else:
+                rows.append(dict(zip(self._columns, row)))
+
+        return rows
+
+
+def stop_when_decided(history_path: str, controller: StepController):
+    """
+    Returns a function for the `should_stop` argument of call_locust_and_distribute_work,
+    that feeds the aggregated rows of the stats history to the controller.
+    """
+    reader = StatsHistoryReader(history_path)
+    first_time_stamp = None
+
+    def should_stop() -> bool:
+        nonlocal first_time_stamp
+
+        for row in reader.read_new_rows():
+            if row.get("Name") != "Aggregated":
+                continue
+
+            time_stamp = int(row["Timestamp"])
+            if first_time_stamp is None:
+                first_time_stamp = time_stamp
+
+            num_requests = int(row["Total Request Count"])
+            controller.observe(
+                time_stamp - first_time_stamp,
+                num_requests,
+                float(row["Total Average Response Time"]) * num_requests,
+                float(row["Total Max Response Time"])
+            )
+
+        return controller.decision is not StepDecision.CONTINUE
+
+    return should_stop
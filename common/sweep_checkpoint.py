@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List
+
+from common.capacity_search import CapacitySearch
+
+# A checkpoint contains the configuration of a sweep and the result of every completed step.
+# The state of the capacity search is restored by reporting the completed steps to a new search again,
+# because the searches decide only based on the reported results.
+
+CHECKPOINT_VERSION = 1
+DEFAULT_CHECKPOINT_FILE = "locust-parameter-variation.state.json"
+
+
+@dataclass
+class CompletedStep:
+    num_clients: int
+    average_response_time_ms: float
+    min_response_time_ms: float
+    max_response_time_ms: float
+    is_compliant: bool
+
+
+class SweepCheckpoint:
+    """
+    Persists the completed steps of a sweep after every step, so that an interrupted sweep can be resumed.
+    """
+
+    def __init__(self, path: str, config: dict):
+        self.path = Path(path)
+        self.config = config
+        self.steps: List[CompletedStep] = []
+        self.is_finished = False
+
+    def load(self):
+        """
+        Loads the completed steps of a previous sweep with the same configuration.
+        """
+        with open(self.path) as state_file:
+            state = json.load(state_file)
+
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"{self.path} has an unsupported version: {state.get('version')}")
+
+        if state["config"] != self.config:
+            raise ValueError(f"{self.path} belongs to a sweep with a different configuration: {state['config']}")
+
+        self.steps = [CompletedStep(**step) for step in state["steps"]]
+        self.is_finished = state["is_finished"]
+
+        logging.getLogger('SweepCheckpoint').info(
+            f"Resuming from {self.path} with {len(self.steps)} completed steps"
+        )
+
+    def restore(self, search: CapacitySearch):
+        for step in self.steps:
+            search.report(step.num_clients, step.is_compliant)
+
+    def _save(self):
+        temporary_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temporary_path, 'w') as state_file:
+            json.dump({
+                "version": CHECKPOINT_VERSION,
+                "config": self.config,
+                "is_finished": self.is_finished,
+                "steps": [asdict(step) for step in self.steps]
+            }, state_file, indent=1)
+            state_file.flush()
+            os.fsync(state_file.fileno())
+
+        # atomic, so that the checkpoint is never half written, even if the host fails
+        os.replace(temporary_path, self.path)
+
+    def start(self):
+        """
+        Starts a new sweep, discarding the checkpoint of a previous one.
+        """
+        self.steps = []
+        self.is_finished = False
+        self._save()
+
+    def complete_step(self, step: CompletedStep):
+        self.steps.append(step)
+        self._save()
+
+    def finish(self):
+        self.is_finished = True
+        self._save()
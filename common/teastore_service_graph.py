@@ -0,0 +1,140 @@
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+# Simulates the service topology that mininet/teastore_topo.py starts as docker containers
+# (webui, auth, persistence, image, recommender and db) inside a single process.
+# Every service has its own concurrency limit, i.e., the size of its thread pool,
+# so that requests queue at the service that becomes the bottleneck first.
+
+
+@dataclass
+class ServiceStage:
+    name: str
+    concurrency_limit: int
+    # share of the predicted processing time of a request that this service consumes
+    service_time_weight: float
+    _semaphore: Optional[asyncio.Semaphore] = field(default=None, init=False, repr=False)
+    in_flight: int = field(default=0, init=False)
+    queued: int = field(default=0, init=False)
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # create lazily, so that the semaphore belongs to the event loop of the server
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency_limit)
+        return self._semaphore
+
+
+# (service, calls to downstream services)
+Call = Tuple[str, list]
+
+# Call trees of the TeaStore WebUI endpoints, i.e., which services the WebUI calls to answer a request.
+ROUTES: Dict[str, Call] = {
+    "loginAction": ("webui", [("auth", [("persistence", [("db", [])])])]),
+    "login": ("webui", [("persistence", [("db", [])]), ("image", [])]),
+    "category": ("webui", [("persistence", [("db", [])]), ("image", [])]),
+    "product": ("webui", [("persistence", [("db", [])]), ("recommender", []), ("image", [])]),
+    "cartAction": ("webui", [("auth", []), ("persistence", [("db", [])])]),
+    "cart": ("webui", [("auth", []), ("persistence", [("db", [])]), ("recommender", []), ("image", [])]),
+    "profile": ("webui", [("auth", []), ("persistence", [("db", [])])]),
+    "index": ("webui", [("persistence", [("db", [])]), ("image", [])]),
+}
+
+DEFAULT_ROUTE: Call = ("webui", [])
+
+DEFAULT_STAGES = {
+    "webui": {"concurrency_limit": 200, "service_time_weight": 3},
+    "auth": {"concurrency_limit": 50, "service_time_weight": 1},
+    "persistence": {"concurrency_limit": 50, "service_time_weight": 2},
+    "image": {"concurrency_limit": 25, "service_time_weight": 2},
+    "recommender": {"concurrency_limit": 25, "service_time_weight": 1},
+    "db": {"concurrency_limit": 100, "service_time_weight": 1},
+}
+
+
+class TeaStoreServiceGraph:
+    def __init__(self, stage_config: dict = None):
+        self._logger = logging.getLogger('TeaStoreServiceGraph')
+
+        config = dict(DEFAULT_STAGES)
+        if stage_config is not None:
+            for name, values in stage_config.items():
+                config[name] = {**config.get(name, {}), **values}
+
+        self.stages: Dict[str, ServiceStage] = {
+            name: ServiceStage(name, int(values["concurrency_limit"]), float(values["service_time_weight"]))
+            for name, values in config.items()
+        }
+
+        # longest names first, so that "cartAction" is found before "cart"
+        self._route_names = sorted(ROUTES.keys(), key=len, reverse=True)
+
+    @staticmethod
+    def from_environment() -> Optional['TeaStoreServiceGraph']:
+        """
+        Returns a service graph if the environment variable TEASTORE_SERVICE_GRAPH is set.
+        The variable TEASTORE_SERVICE_GRAPH_CONFIG may point to a json file that overrides the default stages, e.g.,
+        {"db": {"concurrency_limit": 10}}.
+        """
+        if os.environ.get('TEASTORE_SERVICE_GRAPH', '').lower() not in ('1', 'true', 'yes'):
+            return None
+
+        stage_config = None
+        config_path = os.environ.get('TEASTORE_SERVICE_GRAPH_CONFIG')
+        if config_path:
+            with open(config_path) as config_file:
+                stage_config = json.load(config_file)
+
+        return TeaStoreServiceGraph(stage_config)
+
+    def route_for(self, command: str) -> Call:
+        command = command.lower()
+        for name in self._route_names:
+            if name.lower() in command:
+                return ROUTES[name]
+
+        return DEFAULT_ROUTE
+
+    def _total_weight(self, call: Call) -> float:
+        service, downstream_calls = call
+        return self.stages[service].service_time_weight + sum(self._total_weight(c) for c in downstream_calls)
+
+    async def _execute(self, call: Call, seconds_per_weight: float):
+        service, downstream_calls = call
+        stage = self.stages[service]
+
+        stage.queued += 1
+        async with stage.semaphore:
+            stage.queued -= 1
+            stage.in_flight += 1
+            try:
+                await asyncio.sleep(stage.service_time_weight * seconds_per_weight)
+
+                # an upstream service keeps its thread while it waits for its downstream services
+                for downstream_call in downstream_calls:
+                    await self._execute(downstream_call, seconds_per_weight)
+            finally:
+                stage.in_flight -= 1
+
+    async def process(self, command: str, predicted_processing_time_s: float):
+        """
+        Routes the request through the services of its call tree.
+        The predicted processing time is split among the services according to their weights;
+        waiting for a free slot of a service comes on top of that.
+        """
+        route = self.route_for(command)
+
+        seconds_per_weight = max(0.0, predicted_processing_time_s) / self._total_weight(route)
+        self._logger.debug(f"{command}: {route}, {seconds_per_weight}s per weight")
+
+        await self._execute(route, seconds_per_weight)
+
+    def status(self) -> dict:
+        return {
+            name: {"in_flight": stage.in_flight, "queued": stage.queued, "concurrency_limit": stage.concurrency_limit}
+            for name, stage in self.stages.items()
+        }
@@ -0,0 +1,330 @@
+import argparse
+import fcntl
+import json
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from glob import glob
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy
+
+# The GS production workload is recorded in one log file per day with lines like
+#   2020-12-28 00:00:01	RPS: 5/s
+#   2020-12-28 00:00:00	RPH: 21907/h
+# Parsing them takes seconds, in every Locust process. Therefore, the logs of a trace are compiled once into
+#   <trace>.rps.npy  requests per second, int32, SECONDS_PER_DAY entries per day, 0 for seconds without requests
+#   <trace>.rph.npy  requests per hour, int32, 24 entries per day
+#   <trace>.json     days, maxima and the size and modification time of the logs the arrays were compiled from
+# which are memory-mapped when a shape is created.
+# Every Locust process may find a trace missing or outdated at the same time, so the processes compile it
+# one after the other while holding the lock file compiled/.lock, and only the first one compiles it.
+
+WORKLOAD_DIRECTORY = "GS Production Workload"
+COMPILED_DIRECTORY = "compiled"
+
+ALL_REQUESTS = "All_requests_per_time_unit"
+REQUESTS_WITHOUT_ALARMS = "Requests_without_alarms"
+
+TRACE_VERSION = 1
+SECONDS_PER_DAY = 24 * 3600
+
+
+@dataclass
+class WorkloadTrace:
+    days: List[str]
+    requests_per_second: numpy.ndarray
+    requests_per_hour: numpy.ndarray
+    max_requests_per_second: int
+    max_requests_per_hour: int
+
+    @property
+    def number_of_days(self) -> int:
+        return len(self.days)
+
+    def day_index(self, day: str) -> int:
+        return self.days.index(day)
+
+
+def _logfiles_of(trace_name: str, directory: str) -> List[str]:
+    return sorted(glob(os.path.join(directory, f"{trace_name}_*.log")))
+
+
+def _sources_of(logfiles: List[str]) -> List[dict]:
+    sources = []
+    for path in logfiles:
+        stat = os.stat(path)
+        sources.append({"path": os.path.basename(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+
+    return sources
+
+
+def _paths_of(trace_name: str, directory: str):
+    compiled_directory = Path(directory) / COMPILED_DIRECTORY
+    return (
+        compiled_directory / f"{trace_name}.rps.npy",
+        compiled_directory / f"{trace_name}.rph.npy",
+        compiled_directory / f"{trace_name}.json"
+    )
+
+
+def _parse_logfile(path: str, requests_per_second: numpy.ndarray, requests_per_hour: numpy.ndarray):
+    """
+    Fills the arrays of one day; the time stamps are sliced from the fixed format instead of parsed.
+    """
+    with open(path) as logfile:
+        for line in logfile:
+            rps = line.find("RPS: ")
+            if rps >= 0:
+                second = int(line[11:13]) * 3600 + int(line[14:16]) * 60 + int(line[17:19])
+                requests_per_second[second] = int(line[rps + 5:line.index("/", rps)])
+                continue
+
+            rph = line.find("RPH: ")
+            if rph >= 0:
+                requests_per_hour[int(line[11:13])] = int(line[rph + 5:line.index("/", rph)])
+
+
+def _save_atomically(path: Path, write: Callable, mode: str = 'wb'):
+    """
+    Writes `path` with `write(file)` to a temporary file of its own and replaces `path` with it.
+    """
+    fd, temporary_path = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as temporary_file:
+            write(temporary_file)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+@contextmanager
+def _compilation_lock(directory: str):
+    compiled_directory = Path(directory) / COMPILED_DIRECTORY
+    compiled_directory.mkdir(exist_ok=True)
+
+    with open(compiled_directory / ".lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def compile_workload_trace(trace_name: str, directory: str = WORKLOAD_DIRECTORY) -> Path:
+    """
+    Compiles the logs `<directory>/<trace_name>_<day>.log` and returns the path of the metadata.
+    """
+    with _compilation_lock(directory):
+        return _compile(trace_name, directory)
+
+
+def _compile(trace_name: str, directory: str) -> Path:
+    logger = logging.getLogger('compile_workload_trace')
+
+    logfiles = _logfiles_of(trace_name, directory)
+    if len(logfiles) == 0:
+        raise FileNotFoundError(f"No logs of the trace {trace_name} in {directory}")
+
+    requests_per_second = numpy.zeros(len(logfiles) * SECONDS_PER_DAY, dtype=numpy.int32)
+    requests_per_hour = numpy.zeros(len(logfiles) * 24, dtype=numpy.int32)
+    for day, path in enumerate(logfiles):
+        logger.info(f"Compiling {path}")
+        _parse_logfile(
+            path,
+            requests_per_second[day * SECONDS_PER_DAY:(day + 1) * SECONDS_PER_DAY],
+            requests_per_hour[day * 24:(day + 1) * 24]
+        )
+
+    rps_path, rph_path, metadata_path = _paths_of(trace_name, directory)
+    _save_atomically(rps_path, lambda npy_file: numpy.save(npy_file, requests_per_second))
+    _save_atomically(rph_path, lambda npy_file: numpy.save(npy_file, requests_per_hour))
+
+    # written last, so that a trace is only considered compiled once both arrays are complete
+    metadata = {
+        "version": TRACE_VERSION,
+        "days": [Path(path).stem[len(trace_name) + 1:] for path in logfiles],
+        "seconds_per_day": SECONDS_PER_DAY,
+        "max_requests_per_second": int(requests_per_second.max()),
+        "max_requests_per_hour": int(requests_per_hour.max()),
+        "sources": _sources_of(logfiles)
+    }
+    _save_atomically(metadata_path, lambda metadata_file: json.dump(metadata, metadata_file, indent=1), mode='w')
+
+    return metadata_path
+
+
+def _read_metadata(metadata_path: Path) -> Optional[dict]:
+    try:
+        with open(metadata_path) as metadata_file:
+            return json.load(metadata_file)
+    except (OSError, ValueError):
+        return None
+
+
+def load_workload_trace(trace_name: str, directory: str = WORKLOAD_DIRECTORY) -> WorkloadTrace:
+    """
+    Memory-maps the compiled trace, compiling it first if it is missing or older than its logs.
+    """
+    rps_path, rph_path, metadata_path = _paths_of(trace_name, directory)
+
+    def is_up_to_date(metadata: Optional[dict]) -> bool:
+        return metadata is not None \
+            and metadata.get("version") == TRACE_VERSION \
+            and metadata["sources"] == _sources_of(_logfiles_of(trace_name, directory))
+
+    metadata = _read_metadata(metadata_path)
+    if not is_up_to_date(metadata):
+        with _compilation_lock(directory):
+            # another process may have compiled the trace while this one waited for the lock
+            metadata = _read_metadata(metadata_path)
+            if not is_up_to_date(metadata):
+                _compile(trace_name, directory)
+                metadata = _read_metadata(metadata_path)
+
+        if metadata is None:
+            raise RuntimeError(f"Compiled the trace {trace_name}, but cannot read its metadata {metadata_path}")
+
+    return WorkloadTrace(
+        days=metadata["days"],
+        requests_per_second=numpy.load(rps_path, mmap_mode='r'),
+        requests_per_hour=numpy.load(rph_path, mmap_mode='r'),
+        max_requests_per_second=metadata["max_requests_per_second"],
+        max_requests_per_hour=metadata["max_requests_per_hour"]
+    )
+
+
+def _seconds_of(time_of_day: str) -> int:
+    """
+    Converts "HH:MM" or "HH:MM:SS", up to "24:00", to seconds since midnight.
+    """
+    parts = [int(part) for part in time_of_day.split(":")]
+    seconds = parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) > 2 else 0)
+    if not 0 <= seconds <= SECONDS_PER_DAY:
+        raise ValueError(f"{time_of_day} is not a time of day")
+
+    return seconds
+
+
+class TraceReplay:
+    """
+    Replays the requests per second of a trace between `from_s` and `to_s`, seconds since the start of the trace.
+    With a `speedup` of, e.g., 24, a day is replayed in an hour and every second sends the requests of 24 seconds.
+    With a `speedup` below 1, e.g., 0.5, the requests of a second of the trace are spread over 2 seconds.
+    """
+
+    def __init__(self, trace: WorkloadTrace, from_s: int, to_s: int, speedup: float = 1):
+        if not 0 <= from_s < to_s <= len(trace.requests_per_second):
+            raise ValueError(f"Cannot replay the seconds {from_s} to {to_s} of a trace with {trace.number_of_days} days")
+        if speedup <= 0:
+            raise ValueError(f"Speedup has to be positive: {speedup}")
+
+        self.from_s = from_s
+        self.speedup = speedup
+        self.duration_s = (to_s - from_s) / speedup
+
+        window = trace.requests_per_second[from_s:to_s]
+        self._requests_per_second = numpy.asarray(window)
+        # requests sent before a second of the trace, so that the requests of any range of seconds take O(1)
+        self._requests_before = numpy.concatenate(([0], numpy.cumsum(window, dtype=numpy.int64)))
+
+    @staticmethod
+    def from_environment(trace: WorkloadTrace, force: bool = False) -> Optional['TraceReplay']:
+        """
+        Returns a replay if WORKLOAD_REPLAY is set.
+        WORKLOAD_REPLAY_DAY selects the day, e.g., 2020-12-28, or "all" (default: the first day),
+        WORKLOAD_REPLAY_FROM and WORKLOAD_REPLAY_TO the time window within the day (default: 00:00 to 24:00)
+        and WORKLOAD_REPLAY_SPEEDUP the time-compression factor (default: 1).
+        With "all" days, the window starts on the first day and ends on the last day.
+        With `force`, the replay is created even if WORKLOAD_REPLAY is not set.
+        """
+        if not force and os.environ.get('WORKLOAD_REPLAY', '').lower() not in ('1', 'true', 'yes'):
+            return None
+
+        day = os.environ.get('WORKLOAD_REPLAY_DAY', trace.days[0])
+        from_s = _seconds_of(os.environ.get('WORKLOAD_REPLAY_FROM', '00:00'))
+        to_s = _seconds_of(os.environ.get('WORKLOAD_REPLAY_TO', '24:00'))
+        speedup = float(os.environ.get('WORKLOAD_REPLAY_SPEEDUP', 1))
+
+        if day == "all":
+            first_day, last_day = 0, trace.number_of_days - 1
+        else:
+            first_day = last_day = trace.day_index(day)
+
+        replay = TraceReplay(trace, first_day * SECONDS_PER_DAY + from_s, last_day * SECONDS_PER_DAY + to_s, speedup)
+        logging.getLogger('TraceReplay').info(
+            f"Replaying {day} from {from_s} s to {to_s} s at {speedup}x speed in {replay.duration_s:.0f} s"
+        )
+
+        return replay
+
+    def requests_per_second_at(self, run_time_s: float) -> Optional[int]:
+        """
+        Returns the requests to send in the second of the replay that contains `run_time_s`,
+        or None after the end of the replay.
+        """
+        second = int(run_time_s)
+        if second >= self.duration_s:
+            return None
+
+        requests_until = self._requests_until(numpy.array([second, second + 1]))
+
+        return int(requests_until[1] - requests_until[0])
+
+    def _requests_until(self, run_times_s: numpy.ndarray) -> numpy.ndarray:
+        """
+        The requests of the trace before the run times, spreading the requests of a second of the trace evenly
+        over the second and rounding down, so that the requests of consecutive seconds carry the remainder over.
+        """
+        trace_seconds = numpy.minimum(run_times_s * self.speedup, len(self._requests_per_second))
+        whole_seconds = trace_seconds.astype(numpy.int64)
+        within_trace = whole_seconds < len(self._requests_per_second)
+
+        requests = self._requests_before[whole_seconds].astype(numpy.float64)
+        requests[within_trace] += (trace_seconds - whole_seconds)[within_trace] \
+            * self._requests_per_second[whole_seconds[within_trace]]
+
+        return numpy.floor(requests).astype(numpy.int64)
+
+    def hour_of_day_at(self, run_time_s: float) -> int:
+        """
+        Returns the hour of the recorded day that is replayed at `run_time_s`.
+        """
+        trace_second = self.from_s + int(run_time_s * self.speedup)
+
+        return (trace_second % SECONDS_PER_DAY) // 3600
+
+    def requests_per_second_series(self) -> numpy.ndarray:
+        """
+        The requests to send in every second of the replay.
+        """
+        requests_until = self._requests_until(numpy.arange(int(numpy.ceil(self.duration_s)) + 1))
+
+        return numpy.diff(requests_until)
+
+    def tick(self, run_time_s: float):
+        """
+        The result of LoadTestShape.tick: every user sends one request per second,
+        so there are as many users as requests per second.
+        """
+        requests_per_second = self.requests_per_second_at(run_time_s)
+        if requests_per_second is None:
+            return None
+
+        return requests_per_second, max(requests_per_second, 1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Compiles the GS production workload logs for RealWorkloadShape.")
+    parser.add_argument("--directory", default=WORKLOAD_DIRECTORY)
+    parser.add_argument("traces", nargs="*", default=[ALL_REQUESTS, REQUESTS_WITHOUT_ALARMS])
+    args = parser.parse_args()
+
+    for trace in args.traces:
+        print(compile_workload_trace(trace, args.directory))
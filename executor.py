@@ -5,9 +5,13 @@ import os
 from dataclasses import dataclass
 
 import typer
-from pandas.core.frame import DataFrame
 
-from common.Common import call_locust_with, read_response_times_from_locust_logfile
+from common.Common import call_locust_with
+from common.log_cache import iter_response_time_chunks_cached
+from common.pipe_protocol import EXECUTOR_PIPE, CONTROL_PIPE, PROFILE, STATS, FIN, STOP, FrameReader, open_pipe, \
+    write_frame
+from common.response_time_histogram import aggregate_response_times, summarize, write_summary_as_json, \
+    write_summary_as_csv
 
 response_time_statistics = {}
 
@@ -60,50 +64,45 @@ def read_measurements_from_locust_csv_and_append_to_dictonaries(path):
             logger.info(f"Request: {r}")
 
 
-def analyse_teastore_response_times():
-    response_times = read_response_times_from_locust_logfile("locust_log.log")
-    df = DataFrame.from_records(response_times)
-    df_grouped_by_request_type = df.groupby(['request_type'])
-    df_mean_response_times = df_grouped_by_request_type.mean()
-    df_min_response_times = df_grouped_by_request_type.min()
-    df_max_response_times = df_grouped_by_request_type.max()
-    get_login = RequestStatistics(
-        df_mean_response_times.loc['GET login', 'response_time_ms'],
-        df_min_response_times.loc['GET login', 'response_time_ms'],
-        df_max_response_times.loc['GET login', 'response_time_ms']
-    )
-    post_login_action = RequestStatistics(
-        df_mean_response_times.loc['POST loginAction', 'response_time_ms'],
-        df_min_response_times.loc['POST loginAction', 'response_time_ms'],
-        df_max_response_times.loc['POST loginAction', 'response_time_ms']
-    )
-    get_category = RequestStatistics(
-        df_mean_response_times.loc['GET category', 'response_time_ms'],
-        df_min_response_times.loc['GET category', 'response_time_ms'],
-        df_max_response_times.loc['GET category', 'response_time_ms']
-    )
-    get_product = RequestStatistics(
-        df_mean_response_times.loc['GET product', 'response_time_ms'],
-        df_min_response_times.loc['GET product', 'response_time_ms'],
-        df_max_response_times.loc['GET product', 'response_time_ms']
-    )
-    post_cart_action = RequestStatistics(
-        df_mean_response_times.loc['POST cartAction', 'response_time_ms'],
-        df_min_response_times.loc['POST cartAction', 'response_time_ms'],
-        df_max_response_times.loc['POST cartAction', 'response_time_ms']
-    )
-    get_profile = RequestStatistics(
-        df_mean_response_times.loc['GET profile', 'response_time_ms'],
-        df_min_response_times.loc['GET profile', 'response_time_ms'],
-        df_max_response_times.loc['GET profile', 'response_time_ms']
-    )
+def analyse_teastore_response_times(logfile: str = "locust_log.log"):
+    """
+    Aggregates the response times of every request type in the log in one pass with constant memory
+    and writes the statistics to response_time_statistics.json and .csv.
+    An up-to-date cache of the log, see common/log_cache.py, is read instead of parsing the log again.
+    """
+    histograms = aggregate_response_times(iter_response_time_chunks_cached(logfile))
+    summary = summarize(histograms)
+
     logging.info("Measurements from Locust .log file")
-    logging.info(f"GET login: {get_login}")
-    logging.info(f"GET category: {get_category}")
-    logging.info(f"GET product: {get_product}")
-    logging.info(f"GET profile: {get_profile}")
-    logging.info(f"POST loginAction: {post_login_action}")
-    logging.info(f"POST cartAction: {post_cart_action}")
+    for request_type, statistics in summary.items():
+        logging.info(f"{request_type}: {RequestStatistics(statistics['mean'], statistics['min'], statistics['max'])}, "
+                     f"count: {statistics['count']}, "
+                     f"p50: {statistics['p50']}, p90: {statistics['p90']}, p95: {statistics['p95']}, "
+                     f"p99: {statistics['p99']}, p99.9: {statistics['p99.9']}")
+
+    write_summary_as_json(summary, "response_time_statistics.json")
+    write_summary_as_csv(summary, "response_time_statistics.csv")
+
+
+def append_in_process_result_to_dictonaries(result):
+    for request, r in result.requests_by_type().items():
+        response_time_statistics[request] = RequestStatistics(
+            r.avg_response_time_ms, r.min_response_time_ms, r.max_response_time_ms
+        )
+
+
+def log_in_process_result(result):
+    logger = logging.getLogger('log_in_process_result')
+
+    logger.info("Measurements from Locust runner statistics")
+
+    for request in sorted(result.requests_by_type().keys()):
+        logger.info(f"Request: {(request, response_time_statistics[request])}")
+
+    total = result.total
+    logger.info(f"Total: {total.num_requests} requests, {total.num_failures} failures, "
+                f"avg: {total.avg_response_time_ms} ms, max: {total.max_response_time_ms} ms, "
+                f"percentiles: {total.percentiles_ms}")
 
 
 def main(
@@ -129,7 +128,13 @@ def main(
         silent: bool = typer.Option(
             False,
             "--silent", "-s",
-            help="Omit .csv and log files"
+            help="Omit the .csv files, executor.log and the analysis of the results"
+        ),
+        in_process: bool = typer.Option(
+            False,
+            "--in-process",
+            help="Run Locust within this process and take the statistics from the runner "
+                 "instead of the .csv and log files"
         )
 ):
     if silent is False:
@@ -141,34 +146,69 @@ def main(
                             handlers=[fh])
 
     pipe_fd = 0
+    control_fd = 0
     open_fifo_pipe_env = os.environ.get('OPEN_FIFO_PIPE')
     if open_fifo_pipe_env is not None and open_fifo_pipe_env:
-        pipe_name = "/tmp/locust_executor_pipe"
-        if not os.path.exists(pipe_name):
-            os.mkfifo(pipe_name)
+        # open the control pipe first, without blocking, so that the orchestrator can send STOP at any time
+        control_fd = open_pipe(CONTROL_PIPE, os.O_RDONLY | os.O_NONBLOCK)
 
         logging.info("Opening locust_executor_pipe")
-        pipe_fd = os.open(pipe_name, os.O_WRONLY)
+        pipe_fd = open_pipe(EXECUTOR_PIPE, os.O_WRONLY)
         logging.info("Pipe opened")
     try:
         load_intensity_profile_env = os.environ.get('LOAD_INTENSITY_PROFILE')
         if load_intensity_profile_env is not None:
             if pipe_fd != 0:
-                os.write(pipe_fd, str(load_intensity_profile_env).encode())
+                write_frame(pipe_fd, PROFILE, name=str(load_intensity_profile_env))
+
+        if in_process:
+            # imported here, because importing locust monkey patches the standard library
+            from common.inprocess_runner import run_locust_in_process
+
+            on_statistics = None
+            should_stop = None
+            if pipe_fd != 0:
+                control = FrameReader(control_fd)
+
+                def on_statistics(statistics: dict):
+                    write_frame(pipe_fd, STATS, **statistics)
+
+                def should_stop() -> bool:
+                    for frame in control.read_available_frames():
+                        if frame["type"] == STOP:
+                            logging.info(f"Stopped by the orchestrator: {frame.get('reason')}")
+                            return True
+                    return False
+
+            result = run_locust_in_process(
+                locust_script, url, num_clients, runtime,
+                logfile="locust_log.log",
+                on_statistics=on_statistics,
+                should_stop=should_stop
+            )
+
+            append_in_process_result_to_dictonaries(result)
+            if silent is False:
+                log_in_process_result(result)
 
-        call_locust_with(locust_script, url, num_clients, runtime, silent)
+                if "teastore" in locust_script:
+                    analyse_teastore_response_times()
+        else:
+            call_locust_with(locust_script, url, num_clients, runtime, silent)
 
-        if silent is False:
-            read_measurements_from_locust_csv_and_append_to_dictonaries(f"loadtest_{num_clients}_clients_stats.csv")
+            if silent is False:
+                read_measurements_from_locust_csv_and_append_to_dictonaries(f"loadtest_{num_clients}_clients_stats.csv")
 
-            if "teastore" in locust_script:
-                analyse_teastore_response_times()
+                if "teastore" in locust_script:
+                    analyse_teastore_response_times()
 
         if pipe_fd != 0:
-            os.write(pipe_fd, "FIN".encode())
+            write_frame(pipe_fd, FIN)
     finally:
         if pipe_fd != 0:
             os.close(pipe_fd)
+        if control_fd != 0:
+            os.close(control_fd)
 
 
 if __name__ == "__main__":
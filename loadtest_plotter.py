@@ -1,16 +1,24 @@
 import csv
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-import re
-from typing import Optional
+from typing import Optional, Tuple
 
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
+import numpy
+from matplotlib.colors import LogNorm
 import typer
 from typing_extensions import Annotated
 
 from rast_common.main.FileUtils import readResponseTimesFromLogFile
 
+from common.Common import ResponseTimes, datetime_to_ns, ns_to_datetime
+from common.fault_windows import DEFAULT_RECOVERY_TAIL_S, FaultWindowIndex, summarize_by_category
+from common.log_cache import load_response_times_cached
+from common.log_ingestion import find_logfiles_of_run_of, read_logfiles_of_run
+from common.plot_downsampling import OUTLIER_THRESHOLD_S, log_bins, min_max_downsample, split_outliers
+from common.rolling_percentiles import rolling_percentiles
+
 num_clients = []
 avg_time_allowed = []
 max_time_allowed = []
@@ -57,78 +65,152 @@ def readMeasurementsFromLogFileAndAppendToList(path):
 
             print(clients, avg, max)
 
-def read_lines_with_ARS_faults(file_path: Path) -> list[str]:
-    lines = []
-    print("read_lines_with_ARS_faults")
-    with file_path.open("r", encoding="utf-8") as f:
-        for line in f:
-            if "faulted" in line or "recovered" in line:
-                lines.append(line.rstrip('\n'))
-    return lines
-
-
-def extract_datetimes(lines: list[str]) -> tuple[list[tuple[str, datetime]], list[tuple[str, datetime]]]:
-    print("extract_datetimes")
-    # stop_pattern = re.compile(r"(?<=faulted @)[^;]*")
-    stop_pattern = re.compile(r"\*(.*)\*.*((?<=faulted @)[^;]*)")
-    # start_pattern = re.compile(r"(?<=recovered @).*")
-    start_pattern = re.compile(r"\*(.*)\*.*((?<=recovered @).*)")
-
-    stops: list[tuple[str, datetime]] = []
-    starts: list[tuple[str, datetime]] = []
-
-    def get_timestamp_from(string):
-        format_string = '%Y-%m-%d %H:%M:%S.%f'
-
-        return datetime.strptime(
-            string,
-            format_string
-        )
-
-
-    for line in lines:
-        stop_match = stop_pattern.search(line)
-        if stop_match:
-            print(f"stop: {stop_match.group(1)}, {stop_match.group(2)}")
-            dt = get_timestamp_from(stop_match.group(2))
-            stops.append((stop_match.group(1), dt))
-            continue  # avoid trying to match both in one line because this is not possible anyway
-
-        start_match = start_pattern.search(line)
-        if start_match:
-            print(f"start: {start_match.group(1)}, {start_match.group(2)}")
-            dt = get_timestamp_from(start_match.group(2))
-            starts.append((start_match.group(1), dt))
+def read_response_times_of_other_logfile(path: str) -> ResponseTimes:
+    """
+    Reads the response times of log files that are not Locust logs, e.g., ARS_simulation_*.log.
+    """
+    response_times_by_date = readResponseTimesFromLogFile(path)
+    dates = list(response_times_by_date.keys())
+
+    return ResponseTimes(
+        numpy.array([datetime_to_ns(date) for date in dates], dtype=numpy.int64),
+        numpy.full(len(dates), -1, dtype=numpy.int32),
+        numpy.array(list(response_times_by_date.values()), dtype=numpy.float64) * 1000,
+        []
+    )
+
+
+def load_response_times(logfile: Path) -> ResponseTimes:
+    """
+    Log files are parsed once and then read from the cache next to them, see common/log_cache.py.
+    """
+    return load_response_times_cached(str(logfile), fallback=read_response_times_of_other_logfile)
+
+
+def read_response_times(logfile: Path) -> Tuple[datetime, numpy.ndarray, numpy.ndarray]:
+    """
+    Returns the start of the experiment, the time of every response in s relative to the start and its response time in s.
+    For the master log of a distributed run, locust_log_{clients}.log, the responses logged by its workers are read.
+    """
+    logfiles_of_run = find_logfiles_of_run_of(logfile)
+    if len(logfiles_of_run) > 1:
+        response_times = read_logfiles_of_run(logfiles_of_run)
+    else:
+        response_times = load_response_times(logfile)
+    if len(response_times) == 0:
+        return datetime.min, numpy.empty(0), numpy.empty(0)
+
+    start_time_ns = int(response_times.time_stamps_ns.min())
+    relative_times = (response_times.time_stamps_ns - start_time_ns) / 1e9
+
+    return ns_to_datetime(start_time_ns), relative_times, response_times.response_times_ms / 1000
+
+
+def plot_response_time_points(relative_times: numpy.ndarray, times: numpy.ndarray, plot_mode: str, num_buckets: int):
+    """
+    "full" plots every response, "minmax" the smallest and largest response time of each of `num_buckets` time buckets
+    and "density" a raster of the number of responses; the last two plot the response times above
+    OUTLIER_THRESHOLD_S exactly, and their time and size are independent of the length of the run.
+    """
+    if plot_mode == "full":
+        plt.plot(relative_times, times, 'o', color='black', label='Response time')
+        return
+
+    (regular_times, regular), (outlier_times, outliers) = split_outliers(relative_times, times)
+
+    if plot_mode == "minmax":
+        indices = min_max_downsample(regular_times, regular, num_buckets)
+        plt.plot(regular_times[indices], regular[indices], 'o', color='black', markersize=2,
+                 label='Response time (min/max per bucket)', rasterized=True)
+    elif plot_mode == "density":
+        if len(regular) > 0:
+            plt.hist2d(
+                regular_times,
+                numpy.maximum(regular, 0.001),
+                bins=[num_buckets, log_bins(0.001, OUTLIER_THRESHOLD_S, 200)],
+                cmap='Greys',
+                norm=LogNorm(),
+                rasterized=True
+            )
+    else:
+        raise ValueError(f"Unknown plot mode {plot_mode}")
+
+    plt.plot(outlier_times, outliers, 'o', color='black', markersize=3,
+             label=f'Response time $>$ {OUTLIER_THRESHOLD_S} s')
+
+
+def print_response_times_by_fault_window(
+        start_time: datetime,
+        relative_times: numpy.ndarray,
+        times: numpy.ndarray,
+        fault_window_index: FaultWindowIndex,
+        recovery_tail_s: float
+):
+    time_stamps_ns = datetime_to_ns(start_time) + numpy.round(relative_times * 1e9).astype(numpy.int64)
+    categories = fault_window_index.classify(time_stamps_ns, recovery_tail_s)
+
+    print(f"-- Response times by fault window (recovery tail: {recovery_tail_s} s) --")
+    for category, summary in summarize_by_category(times, categories).items():
+        print("{}: {}".format(category, ", ".join(f"{key}: {value:g}" for key, value in summary.items())))
+    print("--")
 
-    return stops, starts
 
+def plot_rolling_percentiles(relative_times: numpy.ndarray, times: numpy.ndarray, window_s: float, step_s: float):
+    rolling = rolling_percentiles(
+        numpy.round(relative_times * 1e9).astype(numpy.int64), times * 1000, window_s, step_s
+    )
 
-def plot_response_times(response_times, fault_injector_logfiles: list[Path] = []):
-    dates = list(response_times.keys())
-    times = list(response_times.values())
-    
-    # Calculate relative time from experiment start
-    start_time = min(dates)
-    relative_times = [(date - start_time).total_seconds() for date in dates]
+    print(f"-- Rolling percentiles ({window_s} s window, {step_s} s step) --")
+    print("Max throughput: {:.1f} requests/s at {:g} s".format(
+        rolling.throughput_rps.max(), rolling.time_s[rolling.throughput_rps.argmax()]
+    ))
+    for threshold_s in (10, 30):
+        above = numpy.flatnonzero(rolling.p99_ms > threshold_s * 1000)
+        if len(above) > 0:
+            print("p99 above {} s first at {:g} s, in {} windows".format(threshold_s, rolling.time_s[above[0]], len(above)))
+    print("--")
 
-    plt.plot(relative_times, times, 'o', color='black', label='Response time')
+    for percentile_ms, linestyle, name in (
+            (rolling.p50_ms, '-', 'p50'),
+            (rolling.p95_ms, '--', 'p95'),
+            (rolling.p99_ms, ':', 'p99')
+    ):
+        has_responses = percentile_ms > 0
+        plt.plot(rolling.time_s[has_responses], percentile_ms[has_responses] / 1000, linestyle, color='tab:blue',
+                 label=f'{name} ({window_s:g} s window)')
+
+
+def plot_response_times(
+        start_time: datetime,
+        relative_times: numpy.ndarray,
+        times: numpy.ndarray,
+        fault_injector_logfiles: list[Path] = [],
+        plot_mode: str = "full",
+        num_buckets: int = 2000,
+        recovery_tail_s: float = DEFAULT_RECOVERY_TAIL_S,
+        rolling_window_s: float = 0,
+        rolling_step_s: float = 1
+):
+    plot_response_time_points(relative_times, times, plot_mode, num_buckets)
+
+    if rolling_window_s > 0:
+        plot_rolling_percentiles(relative_times, times, rolling_window_s, rolling_step_s)
 
     print("-- Response times as measured by Locust sorted by value and then time --")
-    max_response_times = sorted(response_times, key=response_times.get, reverse=True)[:8]
-    for i in sorted(max_response_times):
-        print("{} {}".format(i.strftime("%H:%M:%S"), response_times[i]))
+    max_response_times = numpy.argsort(times, kind='stable')[::-1][:8]
+    for i in sorted(max_response_times, key=lambda i: relative_times[i]):
+        date = start_time + timedelta(seconds=float(relative_times[i]))
+        print("{} {}".format(date.strftime("%H:%M:%S"), times[i]))
     print("--")
 
     en50136_max_response_time = 30
 
     print("-- Response times statistics --")
     print("Number of responses: {}".format(len(times)))
-    times_above_ten_seconds = list(filter(lambda t: t > 10, times))
-    print("Number of faults: {}".format(len(times_above_ten_seconds)))
-    times_above_max_response_time = list(filter(lambda t: t > en50136_max_response_time, times))
-    print("Response times above requirements: {}".format(len(times_above_max_response_time)))
+    print("Number of faults: {}".format(numpy.count_nonzero(times > 10)))
+    print("Response times above requirements: {}".format(numpy.count_nonzero(times > en50136_max_response_time)))
 
-    print("Min response time: {}".format(min(times)))
+    print("Min response time: {}".format(times.min()))
     print("---")
 
     # min_times = min(times)
@@ -146,18 +228,15 @@ def plot_response_times(response_times, fault_injector_logfiles: list[Path] = []
 
     if len(fault_injector_logfiles) > 0:
         for fault_injector_logfile in fault_injector_logfiles:
-            relevant_lines = read_lines_with_ARS_faults(fault_injector_logfile)
-            stops, starts = extract_datetimes(relevant_lines)
-    
-            print("-- Stop-Start --")
-            for i in range(len(stops)):
-                if i >= len(starts):
-                    continue
-                
-                stop_datetime = stops[i][1]
-                start_datetime = starts[i][1]
-                diff = abs(stop_datetime - start_datetime)
-                print("{} - {} = {}".format(stop_datetime.time(), start_datetime.time(), diff.total_seconds()))
+            windows = FaultWindowIndex.from_logfiles([fault_injector_logfile]).windows
+
+            print("-- Fault durations --")
+            for service, service_windows in windows.items():
+                durations_s = service_windows.durations_s
+                if len(durations_s) > 0:
+                    print("{}: {} faults, {:.1f} s - {:.1f} s".format(
+                        service, len(durations_s), durations_s.min(), durations_s.max()
+                    ))
             print("--")
 
             if "proxy" in fault_injector_logfile.name:
@@ -165,25 +244,24 @@ def plot_response_times(response_times, fault_injector_logfiles: list[Path] = []
             else:
                 linestyle = '--'
 
-            for d in stops:
-                service_name = d[0]
-                date_time = d[1]
-                relative_time = (date_time - start_time).total_seconds()
-                plt.axvline(relative_time, color='orange', linestyle=linestyle)
-                label_ypos = plt.ylim()[1]
-                plt.text(relative_time, label_ypos, service_name,
-                         rotation=90, verticalalignment='top',
-                         horizontalalignment='right', color='orange')
-            for d in starts:
-                service_name = d[0]
-                date_time = d[1]
-                relative_time = (date_time - start_time).total_seconds()
-                plt.axvline(relative_time, color='green', linestyle=linestyle)
-                label_ypos = plt.ylim()[1]
-                plt.text(relative_time, label_ypos, service_name,
-                         rotation=90, verticalalignment='top',
-                         horizontalalignment='right', color='green')
-    
+            start_time_ns = datetime_to_ns(start_time)
+            for service, service_windows in windows.items():
+                for time_stamps_ns, color in (
+                        (service_windows.starts_ns, 'orange'),
+                        (service_windows.recovered_ends_ns, 'green')
+                ):
+                    for time_stamp_ns in time_stamps_ns.tolist():
+                        relative_time = (time_stamp_ns - start_time_ns) / 1e9
+                        plt.axvline(relative_time, color=color, linestyle=linestyle)
+                        label_ypos = plt.ylim()[1]
+                        plt.text(relative_time, label_ypos, service,
+                                 rotation=90, verticalalignment='top',
+                                 horizontalalignment='right', color=color)
+
+        print_response_times_by_fault_window(
+            start_time, relative_times, times, FaultWindowIndex.from_logfiles(fault_injector_logfiles), recovery_tail_s
+        )
+
     plt.gca().xaxis.set_major_locator(plt.MultipleLocator(50))
     
     plt.xlabel('Time (s)')
@@ -195,6 +273,151 @@ def plot_response_times(response_times, fault_injector_logfiles: list[Path] = []
     plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.15), ncol=3)
 
 
+def render_figure(
+        logfile: Path,
+        additional_logfiles: list[Path] = [],
+        fault_injector_logfiles: list[Path] = [],
+        target_filename_figure: Optional[Path] = None,
+        plot_mode: str = "full",
+        num_buckets: int = 2000,
+        recovery_tail_s: float = DEFAULT_RECOVERY_TAIL_S,
+        rolling_window_s: float = 0,
+        rolling_step_s: float = 1
+):
+    """
+    Plots one figure and saves it to `target_filename_figure`, or shows it if no file is given.
+    Can be called repeatedly within one process, see render_figures.py.
+    """
+    for values in (num_clients, avg_time_allowed, max_time_allowed,
+                   average_response_time, min_response_time, max_response_time):
+        values.clear()
+
+    # Configure matplotlib for publication-quality output
+    plt.rcParams.update({
+        'font.size': 14,
+        'axes.titlesize': 16,
+        'axes.labelsize': 18,
+        'xtick.labelsize': 16,
+        'ytick.labelsize': 16,
+        'legend.fontsize': 14,
+        'font.family': 'serif',
+        'font.serif': ['Times', 'Times New Roman', 'DejaVu Serif'],
+        'mathtext.fontset': 'dejavuserif',
+        # LaTeX text rendering for crisp output
+        'text.usetex': True,
+        'text.latex.preamble': r'\usepackage{times}',
+        'pdf.fonttype': 42,     # TrueType fonts (not bitmap)
+        'ps.fonttype': 42,      # TrueType fonts (not bitmap)
+        'svg.fonttype': 'none', # Keep text as text in SVG
+        'axes.unicode_minus': False,  # Use LaTeX minus sign
+    })
+
+    plt.figure()
+
+    start_time, relative_times, times = read_response_times(logfile)
+    
+    # Filter out non-existent files
+    existing_fault_injector_logfiles = []
+    for logfile_path in fault_injector_logfiles:
+        if logfile_path.exists():
+            existing_fault_injector_logfiles.append(logfile_path)
+        else:
+            print(f"Warning: Fault injector logfile does not exist: {logfile_path}")
+    
+    if len(times) > 0:
+        plot_response_times(start_time, relative_times, times, existing_fault_injector_logfiles,
+                            plot_mode, num_buckets, recovery_tail_s, rolling_window_s, rolling_step_s)
+    else:
+        # Check if additional logfiles were provided
+        if len(additional_logfiles) > 0:
+            # Read measurements from the first file
+            readMeasurementsFromLogFileAndAppendToList(logfile)
+            
+            # Plot time allowed lines only once
+            # plt.plot(num_clients, avg_time_allowed, 'y--', label='Average time allowed')
+            # plt.plot(num_clients, max_time_allowed, 'r--', label='Maximum time allowed')
+            
+            # Plot first file data
+            plt.plot(num_clients, average_response_time, 'b-', label=f'avg ({logfile.stem})')
+            plt.plot(num_clients, max_response_time, 'b--', label=f'max ({logfile.stem})')
+            
+            # Process additional logfiles
+            for additional_logfile in additional_logfiles:
+                # Reset lists for each additional file
+                additional_num_clients = []
+                additional_avg_time_allowed = []
+                additional_max_time_allowed = []
+                additional_average_response_time = []
+                additional_min_response_time = []
+                additional_max_response_time = []
+                
+                # Read measurements from additional file
+                with open(additional_logfile) as logfile_handle:
+                    for line in logfile_handle:
+                        if 'Clients' not in line:
+                            continue
+
+                        lineAfterClients = line.split('Clients')[1]
+
+                        cleanedLine = lineAfterClients.replace('s', '')
+                        cleanedLine = cleanedLine.replace(',', '')
+                        cleanedLine = cleanedLine.replace('avg', '')
+                        cleanedLine = cleanedLine.replace('max', '')
+
+                        splittedLine = cleanedLine.split(':')
+
+                        clients = float(splittedLine[1])
+                        avg = float(splittedLine[3])
+                        max_val = float(splittedLine[4])
+
+                        additional_num_clients.append(clients)
+                        additional_average_response_time.append(avg)
+                        additional_max_response_time.append(max_val)
+
+                        print(clients, avg, max_val)
+                
+                # Plot additional file data
+                plt.plot(additional_num_clients, additional_average_response_time, 'g:',label=f'avg ({additional_logfile.stem})')
+                plt.plot(additional_num_clients, additional_max_response_time, 'g-.', label=f'max ({additional_logfile.stem})')
+            
+            plt.xlabel('Number of alarm devices')
+            plt.ylabel('Response time in s')
+            plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.25), ncol=2)
+            plt.yscale('log')
+            plt.gca().xaxis.set_major_locator(plt.MultipleLocator(1000))
+            plt.ylim(0.01, 100)
+        else:
+            # Original behavior when no additional logfiles
+            readMeasurementsFromLogFileAndAppendToList(logfile)
+            plt.plot(num_clients, avg_time_allowed, 'y--', label='Average time allowed')
+            plt.plot(num_clients, max_time_allowed, 'r--', label='Maximum time allowed')
+            # plt.plot(num_clients, min_response_time, label='min')
+            plt.plot(num_clients, average_response_time, label='avg')
+            plt.plot(num_clients, max_response_time, label='max')
+
+            plt.xlabel('Number of alarm devices')
+            plt.ylabel('Response time in s')
+            plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.20), ncol=2)
+            plt.yscale('log')
+            plt.gca().xaxis.set_major_locator(plt.MultipleLocator(1000))
+            plt.ylim(0.001, 1000)
+            # plt.savefig('Response_times.pdf')
+            # plt.grid()
+  
+    if target_filename_figure is not None:
+        plt.savefig(target_filename_figure, format='pdf', 
+                   bbox_inches='tight',    # Remove extra whitespace
+                   dpi=600,               # Higher DPI for small figures (better text clarity)
+                   facecolor='white',     # Clean background
+                   edgecolor='none',      # No border
+                   pad_inches=0.02,       # Minimal padding for compact layout
+                   transparent=False)     # Solid background for print
+    else:
+        plt.show()
+
+    plt.close()
+
+
 def main(
     logfile: Annotated[
         Path,
@@ -225,131 +448,58 @@ def main(
             resolve_path=True,
             help="Optional path to output file (will be created or overwritten)"
         )
-    ] = None
+    ] = None,
+    plot_mode: Annotated[
+        str,
+        typer.Option(
+            "--plot-mode",
+            help="How to plot the response times of a run: full (every response), "
+                 "minmax (min and max per time bucket) or density (raster); "
+                 "minmax and density plot response times above 10 s exactly"
+        )
+    ] = "full",
+    num_buckets: Annotated[
+        int,
+        typer.Option(
+            "--buckets",
+            help="Number of time buckets of the minmax and density plot modes, about the width of the figure in pixels"
+        )
+    ] = 2000,
+    recovery_tail_s: Annotated[
+        float,
+        typer.Option(
+            "--recovery-tail",
+            help="Responses within this many seconds after a fault recovered count as recovery, not as normal"
+        )
+    ] = DEFAULT_RECOVERY_TAIL_S,
+    rolling_window_s: Annotated[
+        float,
+        typer.Option(
+            "--rolling-window",
+            help="Overlay the p50, p95 and p99 of a window of this many seconds that slides over the run (0: off)"
+        )
+    ] = 0,
+    rolling_step_s: Annotated[
+        float,
+        typer.Option(
+            "--rolling-step",
+            help="Seconds the rolling window moves per step"
+        )
+    ] = 1
 ) -> None:
     """Load test plotter - analyze and plot response times from log files."""
-    
-    # Configure matplotlib for publication-quality output
-    plt.rcParams.update({
-        'font.size': 14,
-        'axes.titlesize': 16,
-        'axes.labelsize': 18,
-        'xtick.labelsize': 16,
-        'ytick.labelsize': 16,
-        'legend.fontsize': 14,
-        'font.family': 'serif',
-        'font.serif': ['Times', 'Times New Roman', 'DejaVu Serif'],
-        'mathtext.fontset': 'dejavuserif',
-        # LaTeX text rendering for crisp output
-        'text.usetex': True,
-        'text.latex.preamble': r'\usepackage{times}',
-        'pdf.fonttype': 42,     # TrueType fonts (not bitmap)
-        'ps.fonttype': 42,      # TrueType fonts (not bitmap)
-        'svg.fonttype': 'none', # Keep text as text in SVG
-        'axes.unicode_minus': False,  # Use LaTeX minus sign
-    })
-
     try:
-        response_times = readResponseTimesFromLogFile(str(logfile))
-        
-        # Filter out non-existent files
-        existing_fault_injector_logfiles = []
-        for logfile_path in fault_injector_logfiles:
-            if logfile_path.exists():
-                existing_fault_injector_logfiles.append(logfile_path)
-            else:
-                print(f"Warning: Fault injector logfile does not exist: {logfile_path}")
-        
-        if len(response_times) > 0:
-            plot_response_times(response_times, existing_fault_injector_logfiles)
-        else:
-            # Check if additional logfiles were provided
-            if len(additional_logfiles) > 0:
-                # Read measurements from the first file
-                readMeasurementsFromLogFileAndAppendToList(logfile)
-                
-                # Plot time allowed lines only once
-                # plt.plot(num_clients, avg_time_allowed, 'y--', label='Average time allowed')
-                # plt.plot(num_clients, max_time_allowed, 'r--', label='Maximum time allowed')
-                
-                # Plot first file data
-                plt.plot(num_clients, average_response_time, 'b-', label=f'avg ({logfile.stem})')
-                plt.plot(num_clients, max_response_time, 'b--', label=f'max ({logfile.stem})')
-                
-                # Process additional logfiles
-                for additional_logfile in additional_logfiles:
-                    # Reset lists for each additional file
-                    additional_num_clients = []
-                    additional_avg_time_allowed = []
-                    additional_max_time_allowed = []
-                    additional_average_response_time = []
-                    additional_min_response_time = []
-                    additional_max_response_time = []
-                    
-                    # Read measurements from additional file
-                    with open(additional_logfile) as logfile_handle:
-                        for line in logfile_handle:
-                            if 'Clients' not in line:
-                                continue
-
-                            lineAfterClients = line.split('Clients')[1]
-
-                            cleanedLine = lineAfterClients.replace('s', '')
-                            cleanedLine = cleanedLine.replace(',', '')
-                            cleanedLine = cleanedLine.replace('avg', '')
-                            cleanedLine = cleanedLine.replace('max', '')
-
-                            splittedLine = cleanedLine.split(':')
-
-                            clients = float(splittedLine[1])
-                            avg = float(splittedLine[3])
-                            max_val = float(splittedLine[4])
-
-                            additional_num_clients.append(clients)
-                            additional_average_response_time.append(avg)
-                            additional_max_response_time.append(max_val)
-
-                            print(clients, avg, max_val)
-                    
-                    # Plot additional file data
-                    plt.plot(additional_num_clients, additional_average_response_time, 'g:',label=f'avg ({additional_logfile.stem})')
-                    plt.plot(additional_num_clients, additional_max_response_time, 'g-.', label=f'max ({additional_logfile.stem})')
-                
-                plt.xlabel('Number of alarm devices')
-                plt.ylabel('Response time in s')
-                plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.25), ncol=2)
-                plt.yscale('log')
-                plt.gca().xaxis.set_major_locator(plt.MultipleLocator(1000))
-                plt.ylim(0.01, 100)
-            else:
-                # Original behavior when no additional logfiles
-                readMeasurementsFromLogFileAndAppendToList(logfile)
-                plt.plot(num_clients, avg_time_allowed, 'y--', label='Average time allowed')
-                plt.plot(num_clients, max_time_allowed, 'r--', label='Maximum time allowed')
-                # plt.plot(num_clients, min_response_time, label='min')
-                plt.plot(num_clients, average_response_time, label='avg')
-                plt.plot(num_clients, max_response_time, label='max')
-
-                plt.xlabel('Number of alarm devices')
-                plt.ylabel('Response time in s')
-                plt.legend(loc='upper center', bbox_to_anchor=(0.5, 1.20), ncol=2)
-                plt.yscale('log')
-                plt.gca().xaxis.set_major_locator(plt.MultipleLocator(1000))
-                plt.ylim(0.001, 1000)
-                # plt.savefig('Response_times.pdf')
-                # plt.grid()
-      
-        if target_filename_figure is not None:
-            plt.savefig(target_filename_figure, format='pdf', 
-                       bbox_inches='tight',    # Remove extra whitespace
-                       dpi=600,               # Higher DPI for small figures (better text clarity)
-                       facecolor='white',     # Clean background
-                       edgecolor='none',      # No border
-                       pad_inches=0.02,       # Minimal padding for compact layout
-                       transparent=False)     # Solid background for print
-        else:
-            plt.show()
-
+        render_figure(
+            logfile,
+            additional_logfiles,
+            fault_injector_logfiles,
+            target_filename_figure,
+            plot_mode,
+            num_buckets,
+            recovery_tail_s,
+            rolling_window_s,
+            rolling_step_s
+        )
     except Exception as e:
         typer.echo(f"Error processing log file: {e}", err=True)
         raise typer.Exit(1)
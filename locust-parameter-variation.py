@@ -2,12 +2,22 @@
 import argparse
 import csv
 import glob
+import json
+import math
 
 import os
 import logging
-import time
+from pathlib import Path
 
 from common.Common import call_locust_with, call_locust_and_distribute_work
+from common.capacity_search import AVG_TIME_ALLOWED_IN_S, MAX_TIME_ALLOWED_IN_S, CAPACITY_SEARCH_RESULTS_FILE, \
+    CapacitySearch, LinearCapacitySearch, create_capacity_search
+from common.coordinated_omission import is_coordinated_omission_corrected, rows_to_evaluate
+from common.cooldown import fetch_status_over_http, wait_until_system_is_idle
+from common.parallel_sweep import SweepStep, DEFAULT_MODEL, create_instances, mapping_for_model, run_sweep, \
+    write_results_log
+from common.sweep_checkpoint import SweepCheckpoint, CompletedStep, DEFAULT_CHECKPOINT_FILE
+from common.step_controller import StepController, StepDecision, stop_when_decided
 
 input_args = argparse.Namespace()
 
@@ -21,8 +31,8 @@ logging.basicConfig(format="%(asctime)s %(message)s",
                     level=os.environ.get("LOGLEVEL", "INFO"),
                     handlers=[fh])
 
-avg_time_allowed_in_s = 10
-max_time_allowed_in_s = 30
+avg_time_allowed_in_s = AVG_TIME_ALLOWED_IN_S
+max_time_allowed_in_s = MAX_TIME_ALLOWED_IN_S
 average_response_time = {}
 min_response_time = {}
 max_response_time = {}
@@ -37,7 +47,7 @@ def read_measurements_from_locust_csv_and_append_to_dictonaries(path, num_client
         avg = 0
         min = 0
         max = 0
-        for row in reader:
+        for row in rows_to_evaluate(list(reader)):
             v = float(row['Average Response Time'])
             avg = v if avg < v else avg
 
@@ -90,6 +100,18 @@ def get_next_number_of_clients_for_load_test(previous_number_of_clients: int, mu
     return int(num_clients)
 
 
+def wait_until_system_under_test_is_idle():
+    """
+    Waits until the simulator has processed the remaining requests of the previous step,
+    or for 1 min if the system under test does not provide its status.
+    """
+    wait_until_system_is_idle(
+        lambda: fetch_status_over_http(url),
+        settle_time_s=getattr(input_args, 'settle_time', 10),
+        fallback_sleep_s=60
+    )
+
+
 def parameter_variation_loop(multiplier: int = 5000):
     logger = logging.getLogger('parameter_variation_loop')
 
@@ -102,8 +124,7 @@ def parameter_variation_loop(multiplier: int = 5000):
     is_first_run = True
     while True:
         if not is_first_run:
-            logger.info("Sleeping for 1 min ...")
-            time.sleep(60)
+            wait_until_system_under_test_is_idle()
         is_first_run = False
 
         # start with multiplier clients, then increase linearly (2*multiplier, ... x*multiplier)
@@ -127,38 +148,196 @@ def parameter_variation_loop(multiplier: int = 5000):
 
 
 def parameter_variation_loop_with_limit(multiplier: int = 5000, limit: int = 20000):
-    logger = logging.getLogger('parameter_variation_loop_with_limit')
+    parameter_variation_loop_with_search(LinearCapacitySearch(multiplier, limit))
+
+
+def parameter_variation_loop_with_search(
+        search: CapacitySearch,
+        early_stopping: bool = False,
+        checkpoint: SweepCheckpoint = None
+):
+    """
+    Runs one load test per number of clients the given search asks for.
+    With `early_stopping`, a StepController stops every load test as soon as it clearly fails,
+    and extends borderline ones.
+    With a loaded `checkpoint`, the sweep continues after the last completed step of the checkpoint,
+    and every completed step is added to it.
+    """
+    logger = logging.getLogger('parameter_variation_loop_with_search')
 
-    num_clients = 1
-    x = 1
+    is_first_run = True
+    if checkpoint is not None and len(checkpoint.steps) > 0:
+        for step in checkpoint.steps:
+            average_response_time[step.num_clients] = step.average_response_time_ms
+            min_response_time[step.num_clients] = step.min_response_time_ms
+            max_response_time[step.num_clients] = step.max_response_time_ms
+        checkpoint.restore(search)
+
+        logger.info(f"Resuming performance test after {checkpoint.steps[-1].num_clients} clients.")
+        # the system under test might still process the requests of the interrupted step
+        is_first_run = False
+    else:
+        logger.info(f"Starting performance test.")
 
-    logger.info(f"Starting performance test.")
+    while True:
+        num_clients = search.next_number_of_clients()
+        if num_clients is None:
+            break
 
-    has_reached_limit = False
-    is_first_run = True
-    while config_complies_with_real_time_requirements(num_clients):
         if not is_first_run:
-            logger.info("Sleeping for 1 min ...")
-            time.sleep(60)
+            wait_until_system_under_test_is_idle()
         is_first_run = False
 
-        new_num_clients = max(x * multiplier, 1)
-        x += 1
+        if not early_stopping:
+            call_locust_and_distribute_work(locust_script, url, num_clients, runtime_in_min=1, use_load_test_shape=False, use_manual_runtime_management=True)
 
-        if new_num_clients >= limit:
-            has_reached_limit = True
-            break
-
-        num_clients = new_num_clients
+            read_measurements_from_locust_csv_and_append_to_dictonaries(f"loadtest_{num_clients}_clients_stats.csv", num_clients)
 
-        call_locust_and_distribute_work(locust_script, url, num_clients, runtime_in_min=1, use_load_test_shape=False, num_workers=1, use_manual_runtime_management=True)
+            is_compliant = config_complies_with_real_time_requirements(num_clients)
+        else:
+            controller = StepController(nominal_duration_s=60)
+
+            history_path = f"loadtest_{num_clients}_clients_stats_history.csv"
+            if os.path.exists(history_path):
+                os.remove(history_path)
+
+            call_locust_and_distribute_work(
+                locust_script, url, num_clients,
+                runtime_in_min=math.ceil(controller.max_duration_s / 60),
+                use_load_test_shape=False,
+                use_manual_runtime_management=True,
+                should_stop=stop_when_decided(history_path, controller)
+            )
+
+            read_measurements_from_locust_csv_and_append_to_dictonaries(f"loadtest_{num_clients}_clients_stats.csv", num_clients)
+
+            if controller.decision is StepDecision.CONTINUE:
+                # Locust finished before the controller decided, e.g., because the locustfile stopped the users
+                is_compliant = config_complies_with_real_time_requirements(num_clients)
+            else:
+                is_compliant = controller.decision is StepDecision.PASS
+                if is_compliant and is_coordinated_omission_corrected():
+                    # the controller only sees the raw response times of the stats history
+                    is_compliant = config_complies_with_real_time_requirements(num_clients)
+
+        search.report(num_clients, is_compliant)
+
+        if checkpoint is not None:
+            checkpoint.complete_step(CompletedStep(
+                num_clients,
+                average_response_time[num_clients],
+                min_response_time[num_clients],
+                max_response_time[num_clients],
+                is_compliant
+            ))
+
+    if checkpoint is not None:
+        checkpoint.finish()
+
+    logger.info(f"Finished performance test. {search.summary()}")
+
+
+def parameter_variation_in_single_run(
+        multiplier: int = 5000,
+        limit: int = 20000,
+        step_duration_in_s: int = 60,
+        strategy: str = "linear",
+        resolution: int = 100,
+        repeats: int = 3,
+        early_stopping: bool = False
+):
+    """
+    Like parameter_variation_loop_with_limit, but steps the number of clients within one Locust session
+    using the CapacitySearchShape, so that Locust is started only once and no pauses between steps are required.
+    """
+    logger = logging.getLogger('parameter_variation_in_single_run')
+
+    if os.path.exists(CAPACITY_SEARCH_RESULTS_FILE):
+        os.remove(CAPACITY_SEARCH_RESULTS_FILE)
+
+    os.environ['CAPACITY_SEARCH'] = 'True'
+    os.environ['CAPACITY_SEARCH_MULTIPLIER'] = str(multiplier)
+    os.environ['CAPACITY_SEARCH_LIMIT'] = str(limit)
+    os.environ['CAPACITY_SEARCH_STEP_DURATION'] = str(step_duration_in_s)
+    os.environ['CAPACITY_SEARCH_RESULTS'] = CAPACITY_SEARCH_RESULTS_FILE
+    os.environ['CAPACITY_SEARCH_STRATEGY'] = strategy
+    os.environ['CAPACITY_SEARCH_RESOLUTION'] = str(resolution)
+    os.environ['CAPACITY_SEARCH_REPEATS'] = str(repeats)
+    os.environ['CAPACITY_SEARCH_EARLY_STOPPING'] = str(early_stopping)
+
+    # upper bound, the shape stops Locust as soon as the search is finished
+    max_number_of_steps = math.ceil(limit / multiplier)
+    if strategy == "adaptive":
+        max_number_of_steps = math.ceil(math.log2(max(limit / multiplier, 1))) + 1 \
+                              + repeats * math.ceil(math.log2(max(limit / resolution, 1)))
+    if early_stopping:
+        # borderline steps are extended up to three times the step duration
+        max_number_of_steps *= 3
+    runtime_in_min = math.ceil(max_number_of_steps * step_duration_in_s / 60) + 1
 
-        read_measurements_from_locust_csv_and_append_to_dictonaries(f"loadtest_{num_clients}_clients_stats.csv", num_clients)
+    logger.info(f"Starting performance test.")
 
-    if has_reached_limit:
-        logger.info(f"Finished performance test. System reached limit at {limit}. Last execution was with: {num_clients}")
-    else:
-        logger.info(f"Finished performance test. System failed at {num_clients}")
+    call_locust_and_distribute_work(locust_script, url, multiplier, runtime_in_min=runtime_in_min, use_load_test_shape=True, use_manual_runtime_management=True)
+
+    # replay the decisions of the shape, so that the summary is the same as the one of the shape
+    search = create_capacity_search(strategy, multiplier, limit, resolution, repeats)
+    with open(CAPACITY_SEARCH_RESULTS_FILE) as results_file:
+        for line in results_file:
+            result = json.loads(line)
+            num_clients = result['num_clients']
+            average_response_time[num_clients] = float(result['avg'])
+            min_response_time[num_clients] = float(result['min'])
+            max_response_time[num_clients] = float(result['max'])
+
+            search.report(num_clients, bool(result['is_compliant']))
+
+    # the search only knows that it reached the limit after asking for the next number of clients
+    search.next_number_of_clients()
+
+    logger.info(f"Finished performance test. {search.summary()}")
+
+
+def parameter_variation_in_parallel(
+        multiplier: int = 5000,
+        limit: int = 20000,
+        num_instances: int = 2,
+        models: list = None,
+        output_directory: str = "parallel_sweep"
+):
+    """
+    Like parameter_variation_loop_with_limit, but runs `num_instances` steps at the same time,
+    every step against its own ARS simulator instance, optionally for several predictive models.
+    The results of every model are written to <output_directory>/<model>/locust-parameter-variation.log.
+    """
+    logger = logging.getLogger('parameter_variation_in_parallel')
+
+    models = models or [DEFAULT_MODEL]
+    steps = [
+        SweepStep(num_clients, model, mapping_for_model(model))
+        for model in models
+        for num_clients in range(max(multiplier, 1), limit, max(multiplier, 1))
+    ]
+
+    instances = create_instances(num_instances, output_directory)
+
+    logger.info(f"Starting performance test with {len(instances)} instances.")
+
+    results = run_sweep(locust_script, steps, instances)
+
+    for model in models:
+        results_of_model = [result for result in results if result.step.model == model]
+        write_results_log(
+            results_of_model,
+            Path(output_directory) / Path(model).stem / "locust-parameter-variation.log"
+        )
+
+        failed = [result.step.num_clients for result in results_of_model if not result.is_compliant]
+        if len(failed) > 0:
+            logger.info(f"Finished performance test of {model}. System failed at {min(failed)}")
+        else:
+            last = max((result.step.num_clients for result in results_of_model), default=None)
+            logger.info(f"Finished performance test of {model}. "
+                        f"System reached limit at {limit}. Last execution was with: {last}")
 
 
 def parameter_variation_loop_old(multiplier: int = 5000):
@@ -174,8 +353,7 @@ def parameter_variation_loop_old(multiplier: int = 5000):
     is_first_run = True
     while config_complies_with_real_time_requirements(num_clients):
         if not is_first_run:
-            logger.info("Sleeping for 1 min ...")
-            time.sleep(60)
+            wait_until_system_under_test_is_idle()
         is_first_run = False
 
         # start with multiplier clients, then increase linearly (2*multiplier, ... x*multiplier)
@@ -189,7 +367,7 @@ def parameter_variation_loop_old(multiplier: int = 5000):
         else:
             x += 1
 
-        call_locust_and_distribute_work(locust_script, url, num_clients, runtime_in_min=1, use_load_test_shape=False, num_workers=1)
+        call_locust_and_distribute_work(locust_script, url, num_clients, runtime_in_min=1, use_load_test_shape=False)
         # call_locust_with(locust_script, url, num_clients, runtime_in_min=10, omit_csv_files=True)
 
         read_measurements_from_locust_csv_and_append_to_dictonaries(f"loadtest_{num_clients}_clients_stats.csv", num_clients)
@@ -206,12 +384,56 @@ def read_cli_args():
                         help='start and linearly increase number of clients by the given multiplier',
                         default=200)
     parser.add_argument('-u', '--url', help='URL of the System under Test')
+    parser.add_argument('-l', '--limit', type=int, default=20000,
+                        help='stop the parameter variation at this number of clients')
+    parser.add_argument('-s', '--single-run', action='store_true',
+                        help='run the parameter variation within one Locust session')
+    parser.add_argument('-e', '--early-stopping', action='store_true',
+                        help='stop a failing step as soon as its failure is statistically clear and extend borderline steps')
+    parser.add_argument('--settle-time', type=float, default=10,
+                        help='seconds the system under test has to be idle before the next step starts')
+    parser.add_argument('--parallel', type=int, default=0, metavar='N',
+                        help='run N steps at the same time, each against its own ARS simulator instance '
+                             'pinned to its own CPUs')
+    parser.add_argument('--models', nargs='+',
+                        help='parallel sweep: predictive models to sweep, e.g., Models/gs_model_Ridge_18-03-2023.joblib')
+    parser.add_argument('-r', '--resume', action='store_true',
+                        help='continue the parameter variation after the last completed step of the state file; '
+                             'not supported with --single-run and --parallel')
+    parser.add_argument('--state-file',
+                        help=f'file the completed steps are saved to after every step (default: {DEFAULT_CHECKPOINT_FILE}); '
+                             'not supported with --single-run and --parallel')
+    parser.add_argument('--strategy', choices=['linear', 'adaptive'], default='linear',
+                        help='linear: increase the number of clients by the multiplier until the system fails; '
+                             'adaptive: double the number of clients until the system fails, then bisect')
+    parser.add_argument('--resolution', type=int, default=100,
+                        help='adaptive strategy: stop bisecting once the bracket is at most this wide')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='adaptive strategy: repeat every bisection step up to this many times '
+                             'and decide by majority')
+    parser.add_argument('--correct-coordinated-omission', action='store_true',
+                        help='measure the response times from the intended send time of every request '
+                             'and decide on the corrected instead of the raw response times')
 
     global input_args
 
     input_args = parser.parse_args()
+
+    # only the step by step parameter variation saves its completed steps
+    if input_args.resume or input_args.state_file is not None:
+        if not input_args.parametervariation:
+            parser.error("--resume and --state-file require --parametervariation")
+        if input_args.single_run or input_args.parallel > 0:
+            parser.error("--resume and --state-file are not supported with --single-run and --parallel")
+    if input_args.state_file is None:
+        input_args.state_file = DEFAULT_CHECKPOINT_FILE
+
     print("Args: " + str(input_args))
 
+    if input_args.correct_coordinated_omission:
+        # inherited by the Locust processes
+        os.environ['CORRECT_COORDINATED_OMISSION'] = 'True'
+
 
 if __name__ == "__main__":
     read_cli_args()
@@ -221,7 +443,46 @@ if __name__ == "__main__":
         url = input_args.url
 
     if input_args.parametervariation:
-        parameter_variation_loop_with_limit(input_args.multiplier)
+        if input_args.parallel > 0:
+            parameter_variation_in_parallel(
+                input_args.multiplier,
+                input_args.limit,
+                input_args.parallel,
+                input_args.models
+            )
+        elif input_args.single_run:
+            parameter_variation_in_single_run(
+                input_args.multiplier,
+                input_args.limit,
+                strategy=input_args.strategy,
+                resolution=input_args.resolution,
+                repeats=input_args.repeats,
+                early_stopping=input_args.early_stopping
+            )
+        else:
+            checkpoint = SweepCheckpoint(input_args.state_file, {
+                "locust_script": locust_script,
+                "url": url,
+                "strategy": input_args.strategy,
+                "multiplier": input_args.multiplier,
+                "limit": input_args.limit,
+                "resolution": input_args.resolution,
+                "repeats": input_args.repeats,
+                "early_stopping": input_args.early_stopping,
+                "correct_coordinated_omission": input_args.correct_coordinated_omission
+            })
+            if input_args.resume and os.path.exists(input_args.state_file):
+                checkpoint.load()
+            else:
+                checkpoint.start()
+
+            parameter_variation_loop_with_search(create_capacity_search(
+                input_args.strategy,
+                input_args.multiplier,
+                input_args.limit,
+                input_args.resolution,
+                input_args.repeats
+            ), input_args.early_stopping, checkpoint)
     else:
         call_locust_with(locust_script, url, clients=input_args.multiplier, locust_logfile=f"locust_log_{input_args.multiplier}.log")
 
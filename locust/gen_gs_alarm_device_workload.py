@@ -1,11 +1,16 @@
 #!/usr/bin/env python
 import json
+import os
 import random
 
 from locust import task, between, User, constant
 
 from common.common_locust import RepeatingHttpClient, RepeatingHttpxClient
 
+if os.environ.get('CAPACITY_SEARCH', '').lower() in ('1', 'true', 'yes'):
+    # step the number of alarm devices within this Locust session, see locust-parameter-variation.py --single-run
+    from common.capacity_search_shape import CapacitySearchShape
+
 
 class RepeatingHttpLocust(User):
     abstract = True
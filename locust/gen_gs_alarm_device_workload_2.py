@@ -9,6 +9,10 @@ from locust.env import Environment
 
 from common.common_locust import RepeatingHttpxClient
 
+if os.environ.get('CAPACITY_SEARCH', '').lower() in ('1', 'true', 'yes'):
+    # step the number of alarm devices within this Locust session, see locust-parameter-variation.py --single-run
+    from common.capacity_search_shape import CapacitySearchShape
+
 import random
 from datetime import datetime, timedelta, timezone
 
@@ -1,88 +1,60 @@
 #!/usr/bin/env python
+import heapq
+import logging
+import os
 import random
-import re
-from datetime import datetime
-from glob import glob
-from re import search
+import time
+from typing import Optional
 
+import gevent
 from locust import task, constant, LoadTestShape
-from locust.contrib.fasthttp import FastHttpUser
+from locust.contrib.fasthttp import FastHttpUser, FastHttpSession
+from locust.exception import StopUser
+from locust.runners import WorkerRunner
 
+from common.arrival_schedule import OpenLoopDriver, schedule_from_environment
+from common.coordinated_omission import is_coordinated_omission_corrected, record_periodic_request, \
+    record_scheduled_request
+from common.request_mix import RequestMix
+from common.sharding import WorkerShard, seed_of
+from common.workload_trace import REQUESTS_WITHOUT_ALARMS, TraceReplay, load_workload_trace
 
-def contains_timestamp_with_ms(line: str):
-    return search(r"\s*\d*-\d*-\d*\s\d*:\d*:\d*\.\d*", line) is not None
+# With OPEN_LOOP, one OpenLoopLoadGenerator per worker sends the requests on an arrival schedule,
+# see common/arrival_schedule.py, instead of LoadGenerator users that send a request once per second
+# after the previous one was answered.
+use_open_loop = os.environ.get('OPEN_LOOP', '').lower() in ('1', 'true', 'yes')
 
-
-def get_timestamp_from_string(line: str):
-    return search(r"\s*\d*-\d*-\d*\s\d*:\d*:\d*\.?\d*", line).group().strip()
-
-
-def get_timestamp_from_line(line: str) -> datetime:
-    if contains_timestamp_with_ms(line):
-        format_string = '%Y-%m-%d %H:%M:%S.%f'
-    else:
-        format_string = '%Y-%m-%d %H:%M:%S'
-
-    return datetime.strptime(
-        get_timestamp_from_string(line),
-        format_string
-    )
+# the share of the workload of this worker in a distributed load test, see common/sharding.py
+shard = WorkerShard.from_environment()
 
 
 class RealWorkloadShape(LoadTestShape):
     def __init__(self):
         super().__init__()
 
-        self._max_requests_per_hour_within_the_workload = 0
-        self._max_requests_per_second_within_the_workload = 0
-
-        self._workload_pattern = dict()
-
-        self._number_of_days_recorded = 0
-        for file_path in sorted(glob("GS Production Workload/Requests_without_alarms_*.log")):
-            print(file_path)
-            with open(file_path) as logfile:
-                for line in logfile:
-                    requests_per_second = re.search('(?<=RPS:\\s)\\d*', line)
-                    if requests_per_second is not None:
-                        requests_per_second = int(requests_per_second.group())
-                        self._max_requests_per_second_within_the_workload = max(
-                            self._max_requests_per_second_within_the_workload,
-                            requests_per_second
-                        )
-
-                    requests_per_hour = re.search('(?<=RPH:\\s)\\d*', line)
-                    if requests_per_hour is None:
-                        continue
-
-                    time_stamp = get_timestamp_from_line(line)
-
-                    requests_per_hour = int(requests_per_hour.group())
+        # compiled once from the logs, see common/workload_trace.py
+        self._workload_trace = load_workload_trace(REQUESTS_WITHOUT_ALARMS)
 
-                    self._workload_pattern[self._number_of_days_recorded * 24 + time_stamp.hour] = requests_per_hour
-            self._number_of_days_recorded += 1
-
-        self._max_requests_per_hour_within_the_workload = max(self._workload_pattern.values())
+        self._number_of_days_recorded = self._workload_trace.number_of_days
+        self._max_requests_per_hour_within_the_workload = self._workload_trace.max_requests_per_hour
+        self._max_requests_per_second_within_the_workload = self._workload_trace.max_requests_per_second
         print(f"Requests per hour to send: {self._max_requests_per_hour_within_the_workload}")
         print(f"Requests per sec to send: {self._max_requests_per_second_within_the_workload}")
 
+        # with WORKLOAD_REPLAY, the recorded requests per second are replayed instead of the maximum
+        self._replay = TraceReplay.from_environment(self._workload_trace)
+
     def tick(self):
+        if use_open_loop:
+            # one open-loop generator per worker, which follows its own share of the schedule
+            return shard.count, shard.count
+
+        if self._replay is not None:
+            return self._replay.tick(self.get_run_time())
+
         avg_requests_per_second = int(self._max_requests_per_second_within_the_workload)
         return avg_requests_per_second, avg_requests_per_second
 
-        # run_time = self.get_run_time()
-        #
-        # run_time_in_hours = int(run_time / 3600)
-        # run_time_in_days = int(run_time_in_hours / 24)
-        #
-        # if run_time_in_days >= self._number_of_days_recorded:
-        #     return None
-        #
-        # avg_requests_per_second = int(self._workload_pattern[run_time_in_hours] / 3600)
-        #
-        # # Because every user sends one request per second, we need avg_requests_per_second users
-        # return avg_requests_per_second, avg_requests_per_second
-
 
 # class RepeatingHttpLocust(User):
 #     abstract = True
@@ -101,7 +73,44 @@ with open("GS Production Workload/All_Request_Names.log") as logfile:
 
         requests.add(line.rstrip())
 
-requests = tuple(requests)
+# sorted, because the order of a set depends on the hash seed of the process
+requests = tuple(sorted(requests))
+
+# with REQUEST_MIX_FILE, the requests are drawn according to their weights instead of uniformly,
+# see common/request_mix.py; hourly mixes follow the replayed hour of WORKLOAD_REPLAY
+# or of the open-loop schedule, which always replays the trace
+request_mix = RequestMix.from_environment(requests)
+request_mix_replay = None
+if request_mix is not None and request_mix.is_hourly:
+    request_mix_replay = TraceReplay.from_environment(load_workload_trace(REQUESTS_WITHOUT_ALARMS), force=use_open_loop)
+    if request_mix_replay is None:
+        logging.getLogger('RequestMix').warning(
+            "The hourly mixes are only used when replaying the trace (WORKLOAD_REPLAY or OPEN_LOOP), "
+            "drawing from the default mix"
+        )
+# the workers do not run the shape, so the replayed hour is measured from the first request of this process
+workload_start = None
+
+
+def choose_request(random_source: random.Random, run_time_s: Optional[float] = None) -> str:
+    """
+    `run_time_s` selects the hour of an hourly mix, e.g., the arrival time of the request in the schedule,
+    and defaults to the time since the first request of this process.
+    """
+    global workload_start
+
+    if request_mix is None:
+        return random_source.choice(requests)
+
+    hour = None
+    if request_mix_replay is not None:
+        if run_time_s is None:
+            if workload_start is None:
+                workload_start = time.monotonic()
+            run_time_s = time.monotonic() - workload_start
+        hour = request_mix_replay.hour_of_day_at(run_time_s)
+
+    return request_mix.choose(random_source, hour)
 
 
 class LoadGenerator(FastHttpUser):
@@ -109,19 +118,96 @@ class LoadGenerator(FastHttpUser):
     Generates the workload that occurs independently of alarm devices.
     This workload consists of requests that are executed by other components of the legacy system.
     """
+    abstract = use_open_loop
     wait_time = constant(1)
 
+    number_of_users = 0
+    # numbers of stopped users, which are reused first, so that the shape can stop and start users
+    # without changing the set of numbers of the running users
+    free_user_numbers = []
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # initialize the random seed value to get reproducible random sequences
-        random.seed(42)
+        if len(LoadGenerator.free_user_numbers) > 0:
+            self._user_number = heapq.heappop(LoadGenerator.free_user_numbers)
+        else:
+            self._user_number = LoadGenerator.number_of_users
+            LoadGenerator.number_of_users += 1
+
+        # every user draws its own reproducible random sequence, independent of the worker it runs on (best-effort,
+        # see common/sharding.py)
+        self._random = random.Random(seed_of(42, shard.global_number_of(self._user_number)))
+
+    def on_stop(self):
+        heapq.heappush(LoadGenerator.free_user_numbers, self._user_number)
 
     def do_request(self):
-        cmd_to_use = random.choice(requests)
+        cmd_to_use = choose_request(self._random)
 
+        start = time.monotonic()
         self.client.post(f"/{cmd_to_use}")
+        if is_coordinated_omission_corrected():
+            response_time_ms = (time.monotonic() - start) * 1000
+            record_periodic_request(self.environment, f"/{cmd_to_use}", response_time_ms, self.wait_time())
 
     @task(1)
     def execute_request(self):
         self.do_request()
+
+
+class OpenLoopLoadGenerator(FastHttpUser):
+    """
+    Generates the same workload as LoadGenerator, but sends the requests on an arrival schedule,
+    independent of how fast the ARS answers. Run one of these users per worker, every one sends its share of the
+    schedule; OPEN_LOOP_MAX_IN_FLIGHT (default: 1000) limits the number of requests waiting for a response per worker.
+    A worker that crashes and is restarted by the LocustWorkerFleet sends its share of the schedule again
+    from the beginning; a worker that has sent its share exits with 0, so that it is not restarted.
+    """
+    abstract = not use_open_loop
+    wait_time = constant(1)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._schedule = None
+        self._numbers = None
+
+        self._max_in_flight = int(os.environ.get('OPEN_LOOP_MAX_IN_FLIGHT', 1000))
+        # geventhttpclient opens one connection per host by default, which would serialize the requests
+        self.client = FastHttpSession(
+            self.environment,
+            base_url=self.host,
+            network_timeout=self.network_timeout,
+            connection_timeout=self.connection_timeout,
+            max_redirects=self.max_redirects,
+            max_retries=self.max_retries,
+            insecure=self.insecure,
+            concurrency=self._max_in_flight
+        )
+
+    def send_request(self, index: int, intended_send_time: float):
+        number = int(self._numbers[index])
+        # drawn by the request's own random sequence, so that it does not depend on the number of workers
+        cmd_to_use = choose_request(random.Random(seed_of(42, number)), float(self._schedule[number]))
+
+        self.client.post(f"/{cmd_to_use}")
+        if is_coordinated_omission_corrected():
+            # includes the time the request waited for a free slot or connection
+            record_scheduled_request(self.environment, f"/{cmd_to_use}", intended_send_time)
+
+    @task(1)
+    def execute_schedule(self):
+        # every worker computes the same schedule and sends every shard.count-th request of it
+        self._schedule = schedule_from_environment(load_workload_trace(REQUESTS_WITHOUT_ALARMS))
+        self._numbers = shard.numbers_of(len(self._schedule))
+        OpenLoopDriver(self._schedule[self._numbers], self.send_request, self._max_in_flight).run()
+
+        if isinstance(self.environment.runner, WorkerRunner):
+            # a worker exits with 1 if any request failed, which the LocustWorkerFleet would take for a crash;
+            # the failures are reported to the master, which decides the exit code of the load test
+            self.environment.process_exit_code = 0
+
+        # Locust does not quit by itself in headless mode
+        gevent.spawn_later(2, self.environment.runner.quit)
+        raise StopUser()
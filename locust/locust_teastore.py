@@ -7,15 +7,14 @@
 import logging
 import random
 import re
-from re import search
-from datetime import timedelta, datetime
-from glob import glob
 
 import requests
 from locust import between, task, HttpUser, events, LoadTestShape, constant
 from locust.contrib.fasthttp import FastHttpUser
 from locust.env import Environment
 
+from common.workload_trace import ALL_REQUESTS, TraceReplay, load_workload_trace
+
 
 @events.test_start.add_listener
 def on_test_start(environment: Environment, **kwargs):
@@ -31,64 +30,26 @@ def my_success_handler(request_type, name, response_time, response_length, **kw)
     logging.info("Response time %s ms", response_time)
 
 
-def contains_timestamp_with_ms(line: str):
-    return search(r"\s*\d*-\d*-\d*\s\d*:\d*:\d*\.\d*", line) is not None
-
-
-def get_timestamp_from_string(line: str):
-    return search(r"\s*\d*-\d*-\d*\s\d*:\d*:\d*\.?\d*", line).group().strip()
-
-
-def get_timestamp_from_line(line: str) -> datetime:
-    if contains_timestamp_with_ms(line):
-        format_string = '%Y-%m-%d %H:%M:%S.%f'
-    else:
-        format_string = '%Y-%m-%d %H:%M:%S'
-
-    return datetime.strptime(
-        get_timestamp_from_string(line),
-        format_string
-    )
-
-
 class RealWorkloadShape(LoadTestShape):
     def __init__(self):
         super().__init__()
 
-        self._max_requests_per_hour_within_the_workload = 0
-        self._max_requests_per_second_within_the_workload = 0
+        # compiled once from the logs, see common/workload_trace.py
+        self._workload_trace = load_workload_trace(ALL_REQUESTS)
 
-        self._workload_pattern = dict()
-
-        self._number_of_days_recorded = 0
-        for file_path in sorted(glob("GS Production Workload/All_requests_per_*.log")):
-            print(file_path)
-            with open(file_path) as logfile:
-                for line in logfile:
-                    requests_per_second = re.search('(?<=RPS:\\s)\\d*', line)
-                    if requests_per_second is not None:
-                        requests_per_second = int(requests_per_second.group())
-                        self._max_requests_per_second_within_the_workload = max(
-                            self._max_requests_per_second_within_the_workload,
-                            requests_per_second
-                        )
-
-                    requests_per_hour = re.search('(?<=RPH:\\s)\\d*', line)
-                    if requests_per_hour is None:
-                        continue
-
-                    time_stamp = get_timestamp_from_line(line)
-
-                    requests_per_hour = int(requests_per_hour.group())
-
-                    self._workload_pattern[self._number_of_days_recorded * 24 + time_stamp.hour] = requests_per_hour
-            self._number_of_days_recorded += 1
-
-        self._max_requests_per_hour_within_the_workload = max(self._workload_pattern.values())
+        self._number_of_days_recorded = self._workload_trace.number_of_days
+        self._max_requests_per_hour_within_the_workload = self._workload_trace.max_requests_per_hour
+        self._max_requests_per_second_within_the_workload = self._workload_trace.max_requests_per_second
         print(f"Requests per hour to send: {self._max_requests_per_hour_within_the_workload}")
         print(f"Requests per sec to send: {self._max_requests_per_second_within_the_workload}")
 
+        # with WORKLOAD_REPLAY, the recorded requests per second are replayed instead of the maximum
+        self._replay = TraceReplay.from_environment(self._workload_trace)
+
     def tick(self):
+        if self._replay is not None:
+            return self._replay.tick(self.get_run_time())
+
         avg_requests_per_second = int(self._max_requests_per_second_within_the_workload)
         return avg_requests_per_second, avg_requests_per_second
 
@@ -18,6 +18,7 @@
 import logging
 import os
 import re
+import time
 from datetime import timedelta
 from random import seed, Random
 
@@ -33,6 +34,8 @@ from locust.contrib.fasthttp import FastHttpUser
 
 import requests
 
+from common.coordinated_omission import is_coordinated_omission_corrected, record_periodic_request
+
 # set this number to scale the load defined in the load intensity profiles, e.g.,
 # value of 2.0 doubles the load, 0.5 halves the load.
 LOAD_SCALING_FACTOR = 1.0
@@ -322,10 +325,18 @@ class UserBehavior(FastHttpUser):
     def _log_error(self, msg: str):
         logging.error(f"{self._user}: {msg}")
 
+    def _record_corrected(self, url, start: float, with_wait: bool):
+        if is_coordinated_omission_corrected():
+            # without a wait, the next request is not scheduled but sent right after the response
+            interval_s = self.wait_time() if with_wait else 0
+            record_periodic_request(self.environment, url, (time.monotonic() - start) * 1000, interval_s)
+
     def _get(self, url, params=None):
         request_id = uuid1().int
 
+        start = time.monotonic()
         resp = self.client.get(url, params=params, headers={"Request-Id": str(request_id)})
+        self._record_corrected(url, start, with_wait=True)
         global total_requests_counter
         total_requests_counter += 1
         self.wait()
@@ -334,7 +345,9 @@ class UserBehavior(FastHttpUser):
     def _post(self, url, params=None, with_wait=True):
         request_id = uuid1().int
 
+        start = time.monotonic()
         resp = self.client.post(url, params=params, headers={"Request-Id": str(request_id)})
+        self._record_corrected(url, start, with_wait)
         global total_requests_counter
         total_requests_counter += 1
         if with_wait:
@@ -1,8 +1,10 @@
 import asyncio
+import json
 import os
 import re
 import shutil
 import subprocess
+import sys
 import threading
 from datetime import datetime
 from pathlib import Path
@@ -19,6 +21,12 @@ from mininet.link import TCLink
 from mininet.topo import Topo
 from mininet.log import info, error, setLogLevel, warning
 
+# make the common package of this repository importable; appended, so that the mininet package is not shadowed
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.cooldown import STATUS_PATH, wait_until_system_is_idle
+from common.pipe_protocol import EXECUTOR_PIPE, CONTROL_PIPE, PROFILE, STATS, FIN, STOP, FrameReader, \
+    ProtocolError, write_frame
+
 setLogLevel('info')
 
 python_configured_hosts = []
@@ -34,6 +42,16 @@ current_load_intensity_profile_run_count = 0
 current_load_intensity_profile_index = 0
 
 load_intensity_profiles = ["LOW", "LOW_2", "LOW_4", "LOW_8"]
+
+# A profile is doomed, and stopped, if every second of this window exceeds the max response time allowed
+# or fails for more than half of the requests
+DOOMED_WINDOW_S = 30
+DOOMED_RESPONSE_TIME_MS = 30_000
+# The remaining reruns of a profile are skipped once two runs differ by less than this
+# in average response time and throughput
+STABLE_RESULTS_RELATIVE_DIFFERENCE = 0.05
+
+results_of_load_intensity_profiles = {}
 # load_intensity_profiles = ["LOW", "LOW_2", "LOW_4", "LOW_8", "MED", "HIGH"]
 
 
@@ -128,6 +146,30 @@ class TeaStoreTopo(Topo):
         sleep(3)
         info('*** Now, you can start the load test\n')
 
+    def add_teastore_service_graph_simulation_and_start_network(self, net: Mininet):
+        info('*** Adding TeaStore service graph simulator host\n')
+
+        teastore_simulator = net.addHost('h_sim')
+
+        # alarm provider has 2 GbE connection to his router
+        # 1 Gigabit is the maximum bandwidth allowed by mininet
+        linkopts = {'bw': 1000, 'delay': '0.19ms', 'jitter': '0.06ms'}
+        net.addLink(self.apSwitch, teastore_simulator, **linkopts)
+
+        net.configHosts()
+
+        info('*** Starting network\n')
+        net.start()
+
+        # Instead of the eight docker containers, one process simulates
+        # webui, auth, persistence, image, recommender and db.
+        setup_python_on_host(teastore_simulator)
+        teastore_simulator.cmdPrint('python teastore_simulation.py --port 8080 --service-graph &> /dev/null &')
+
+        info('*** Waiting 3 seconds for TeaStore Simulator to completely start\n')
+        sleep(3)
+        info('*** Now, you can start the load test\n')
+
     def add_tea_store_and_start_network(self, net: Containernet):
         info('*** Adding TeaStore docker containers\n')
 
@@ -498,39 +540,158 @@ def stop_workloads(self, args):
     h_runner.cmd('killall locust')
 
 
-def read_from_pipe_until_finish(pipe_path):
+def stop_load_test(reason: str):
+    try:
+        control_fd = os.open(CONTROL_PIPE, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError as e:
+        # ENXIO: the executor does not listen, e.g., because it runs without --in-process
+        warning(f"*** Could not stop the load test: {e}\n")
+        return
+
+    try:
+        write_frame(control_fd, STOP, reason=reason)
+    finally:
+        os.close(control_fd)
+
+
+def is_doomed(statistics: dict) -> bool:
+    # a stalled system under test completes no requests, so the percentiles of the second are 0;
+    # the TeaStore users send a request every second, so a second without responses is not idle
+    is_stalled = statistics["user_count"] > 0 and statistics["rps"] == 0
+
+    return is_stalled \
+        or statistics["p95"] > DOOMED_RESPONSE_TIME_MS \
+        or statistics["failures_per_s"] > 0.5 * statistics["rps"]
+
+
+def summarize_run(statistics_of_seconds: list) -> Optional[dict]:
+    requests = sum(s["rps"] for s in statistics_of_seconds)
+    if requests == 0:
+        return None
+
+    return {
+        "rps": requests / len(statistics_of_seconds),
+        "avg": sum(s["avg"] * s["rps"] for s in statistics_of_seconds) / requests,
+        "max": max(s["max"] for s in statistics_of_seconds)
+    }
+
+
+def read_from_pipe_until_finish(pipe_path) -> Optional[dict]:
+    """
+    Reads the messages of the executor until the load test has finished,
+    stops the load test early if it is doomed, and returns a summary of the run, if the executor sent statistics.
+    """
     pipe_fd = os.open(pipe_path, os.O_RDONLY)
-    while True:
-        line = os.read(pipe_fd, 1024)
-        if not line:
-            break
-        line = line.decode()
-        info(f"*** Received: {line}\n")
 
-        if line == "FIN":
-            break
+    profile = None
+    statistics_of_seconds = []
+    doomed_seconds = 0
+    is_stopping = False
+    try:
+        for frame in FrameReader(pipe_fd):
+            if frame["type"] == PROFILE:
+                profile = frame["name"]
+                info(f"*** Load intensity profile: {profile}\n")
+            elif frame["type"] == STATS:
+                statistics_of_seconds.append(frame)
+                if len(statistics_of_seconds) % 60 == 0:
+                    info(f"*** {frame['user_count']} users, {frame['rps']:.1f} rps, "
+                         f"p50: {frame['p50']:.0f} ms, p95: {frame['p95']:.0f} ms, p99: {frame['p99']:.0f} ms, "
+                         f"{frame['failures_per_s']:.1f} failures/s\n")
+
+                doomed_seconds = doomed_seconds + 1 if is_doomed(frame) else 0
+                if doomed_seconds >= DOOMED_WINDOW_S and not is_stopping:
+                    info(f"*** Profile {profile} is doomed, stopping it\n")
+                    stop_load_test(f"doomed for {doomed_seconds}s")
+                    is_stopping = True
+            elif frame["type"] == FIN:
+                break
+    except ProtocolError as e:
+        error(f"*** Invalid message from the executor: {e}\n")
 
     info(f"*** Named Pipe closed \n")
     os.close(pipe_fd)
 
+    if is_stopping:
+        return {"is_doomed": True}
+
+    summary = summarize_run(statistics_of_seconds)
+    if summary is not None:
+        info(f"*** Run of {profile}: {summary}\n")
+
+    return summary
+
+
+def are_results_stable(previous: dict, current: dict) -> bool:
+    def relative_difference(a: float, b: float) -> float:
+        return abs(a - b) / max(abs(a), abs(b), 1e-9)
+
+    return relative_difference(previous["avg"], current["avg"]) < STABLE_RESULTS_RELATIVE_DIFFERENCE \
+        and relative_difference(previous["rps"], current["rps"]) < STABLE_RESULTS_RELATIVE_DIFFERENCE
+
+
+def fetch_teastore_status(net: Mininet) -> Optional[dict]:
+    """
+    Returns the status of the TeaStore simulation (see common/cooldown.py),
+    or None if the system under test does not provide one, e.g., the real TeaStore.
+    """
+    try:
+        host: Host = net.get('h_sim')
+    except KeyError:
+        return None
+
+    h_runner = net.get('h_runner')
+    output = h_runner.cmd(f"curl -s --max-time 2 {host.IP()}:8080{STATUS_PATH}")
+    try:
+        return json.loads(output)
+    except ValueError:
+        return None
+
+
+def wait_until_teastore_is_idle(net: Mininet, settle_time_s: float = 10, timeout_s: float = 300):
+    """
+    Waits until the simulation has no requests in flight or queued for `settle_time_s` seconds,
+    or for 30 seconds if the system under test does not provide its status.
+    """
+    info('*** Waiting for the TeaStore to become idle\n')
+    if not wait_until_system_is_idle(
+            lambda: fetch_teastore_status(net),
+            settle_time_s=settle_time_s,
+            timeout_s=timeout_s,
+            fallback_sleep_s=30
+    ):
+        warning(f'*** TeaStore did not become idle within {timeout_s}s\n')
+
 
 def read_and_handle_locust_executor_pipe_messages(**kwargs):
     net: Mininet = kwargs.get('net')
 
-    pipe_name = "/tmp/locust_executor_pipe"
+    pipe_name = EXECUTOR_PIPE
     if not os.path.exists(pipe_name):
         os.mkfifo(pipe_name)
 
-    read_from_pipe_until_finish(pipe_name)
+    summary = read_from_pipe_until_finish(pipe_name)
 
     if CLI_ARGS["run_all_load_intensity_profiles"]:
         global current_load_intensity_profile_index, current_load_intensity_profile_run_count
+
+        profile = load_intensity_profiles[current_load_intensity_profile_index]
+        previous_runs = results_of_load_intensity_profiles.setdefault(profile, [])
+        if summary is not None:
+            if summary.get("is_doomed"):
+                info(f'*** Skipping the remaining runs of the doomed profile {profile}\n')
+                current_load_intensity_profile_run_count = number_of_intensity_profile_reruns
+            else:
+                if len(previous_runs) > 0 and are_results_stable(previous_runs[-1], summary):
+                    info(f'*** Results of {profile} are stable, skipping its remaining runs\n')
+                    current_load_intensity_profile_run_count = number_of_intensity_profile_reruns
+                previous_runs.append(summary)
+
         if current_load_intensity_profile_run_count >= number_of_intensity_profile_reruns:
             current_load_intensity_profile_index += 1
             current_load_intensity_profile_run_count = 0
         if current_load_intensity_profile_index < len(load_intensity_profiles):
-            info('*** Starting next load test in 30 seconds\n')
-            sleep(30)
+            wait_until_teastore_is_idle(net)
             start_teastore_loadtest(net, load_intensity_profiles[current_load_intensity_profile_index])
             return
 
@@ -545,10 +706,15 @@ def read_and_handle_locust_executor_pipe_messages(**kwargs):
 
 def main(
         use_simulation: bool = typer.Option(False, "--use-simulation", "-s"),
+        use_service_graph: bool = typer.Option(
+            False, "--use-service-graph", "-g",
+            help="Use the python TeaStore simulator that models the TeaStore services internally"
+        ),
         run_all_load_intensity_profiles: bool = typer.Option(False, "--run_all_load_intensity_profiles", "-a")
 ):
     global CLI_ARGS
-    CLI_ARGS = {"use_simulation": use_simulation, "run_all_load_intensity_profiles": run_all_load_intensity_profiles}
+    CLI_ARGS = {"use_simulation": use_simulation or use_service_graph,
+                "run_all_load_intensity_profiles": run_all_load_intensity_profiles}
 
     try:
         start_pox()
@@ -559,7 +725,9 @@ def main(
             link=TCLink,
             autoSetMacs=True
         )
-        if use_simulation:
+        if use_service_graph:
+            teastore_topo.add_teastore_service_graph_simulation_and_start_network(net)
+        elif use_simulation:
             teastore_topo.add_teastore_simulation_and_start_network(net)
         else:
             teastore_topo.add_tea_store_and_start_network(net)
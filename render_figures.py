@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+from typing_extensions import Annotated
+
+from common.log_ingestion import find_logfiles_of_run_of
+
+# Renders the figures of a manifest with loadtest_plotter.py in worker processes, e.g.:
+# {
+#   "figures": [
+#     {"output": "figures/ramp.pdf", "logfile": "runs/locust_log.log", "plot_mode": "minmax", "rolling_window_s": 10},
+#     {"output": "figures/sweep.pdf", "logfile": "runs/a.log", "additional_logfiles": ["runs/b.log"]}
+#   ]
+# }
+# Paths are relative to the manifest. The keys of a figure are the parameters of loadtest_plotter.render_figure.
+# A figure is only rendered again if its entry, one of its input files or the plotter changed since the last time.
+
+STAMP_SUFFIX = ".stamp"
+DEFAULT_TEXT_CACHE_DIRECTORY = ".matplotlib-cache"
+
+_PATH_KEYS = ("logfile", "additional_logfiles", "fault_injector_logfiles")
+_PLOTTER_SOURCES = (
+    "loadtest_plotter.py",
+    "common/Common.py",
+    "common/log_cache.py",
+    "common/log_ingestion.py",
+    "common/plot_downsampling.py",
+    "common/fault_windows.py",
+    "common/rolling_percentiles.py",
+)
+
+
+def read_manifest(manifest: Path) -> List[dict]:
+    with open(manifest) as manifest_file:
+        figures = json.load(manifest_file)["figures"]
+
+    base_directory = manifest.parent
+    for figure in figures:
+        figure["output"] = str(base_directory / figure["output"])
+        figure["logfile"] = str(base_directory / figure["logfile"])
+        for key in ("additional_logfiles", "fault_injector_logfiles"):
+            figure[key] = [str(base_directory / path) for path in figure.get(key, [])]
+
+    return figures
+
+
+def _input_files_of(figure: dict) -> List[str]:
+    # the plotter reads the worker logs of a distributed run instead of its master log
+    logfiles_of_run = [str(path) for path in find_logfiles_of_run_of(Path(figure["logfile"])).values()]
+
+    return ([figure["logfile"]] + logfiles_of_run
+            + figure["additional_logfiles"] + figure["fault_injector_logfiles"])
+
+
+def fingerprint_of(figure: dict) -> str:
+    """
+    Hashes the entry of the figure, the size and modification time of its input files and the plotter sources.
+    """
+    digest = hashlib.sha1(json.dumps(figure, sort_keys=True).encode())
+
+    repository = Path(__file__).parent
+    for path in _input_files_of(figure) + [str(repository / source) for source in _PLOTTER_SOURCES]:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        else:
+            digest.update(f"{path}:missing".encode())
+
+    return digest.hexdigest()
+
+
+def stamp_path_of(figure: dict) -> Path:
+    return Path(figure["output"] + STAMP_SUFFIX)
+
+
+def is_up_to_date(figure: dict, fingerprint: str) -> bool:
+    stamp_path = stamp_path_of(figure)
+    if not os.path.exists(figure["output"]) or not stamp_path.exists():
+        return False
+
+    return stamp_path.read_text().strip() == fingerprint
+
+
+def _parse_logfile(logfile: str) -> str:
+    # writes the cache next to the log file, so that the figures of the same run do not parse it again
+    import matplotlib
+    matplotlib.use("Agg")
+    from loadtest_plotter import load_response_times
+
+    load_response_times(Path(logfile))
+
+    return logfile
+
+
+def _render(figure: dict, fingerprint: str) -> str:
+    # imported in the worker, so that matplotlib picks up MPLCONFIGDIR and is imported once per worker
+    import matplotlib
+    matplotlib.use("Agg")
+    from loadtest_plotter import render_figure
+
+    os.makedirs(os.path.dirname(figure["output"]) or ".", exist_ok=True)
+
+    arguments = {key: value for key, value in figure.items() if key not in _PATH_KEYS and key != "output"}
+    render_figure(
+        Path(figure["logfile"]),
+        [Path(path) for path in figure["additional_logfiles"]],
+        [Path(path) for path in figure["fault_injector_logfiles"]],
+        Path(figure["output"]),
+        **arguments
+    )
+
+    stamp_path_of(figure).write_text(fingerprint + "\n")
+
+    return figure["output"]
+
+
+def main(
+    manifest: Annotated[
+        Path,
+        typer.Argument(..., help="JSON manifest of the figures to render", exists=True, readable=True)
+    ],
+    jobs: Annotated[
+        int,
+        typer.Option("--jobs", "-j", help="Number of worker processes")
+    ] = os.cpu_count() or 1,
+    force: Annotated[
+        bool,
+        typer.Option("--force", help="Render all figures, even if their inputs did not change")
+    ] = False,
+    text_cache_directory: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--text-cache",
+            help="Matplotlib configuration directory, which holds the cache of the LaTeX rendered text; "
+                 f"defaults to {DEFAULT_TEXT_CACHE_DIRECTORY} next to the manifest"
+        )
+    ] = None
+) -> None:
+    """Render the figures of a manifest in parallel, skipping figures whose inputs did not change."""
+    figures = read_manifest(manifest)
+
+    outdated = []
+    for figure in figures:
+        fingerprint = fingerprint_of(figure)
+        if not force and is_up_to_date(figure, fingerprint):
+            print(f"Up to date: {figure['output']}")
+            continue
+        outdated.append((figure, fingerprint))
+
+    if len(outdated) == 0:
+        return
+
+    # the tex cache of matplotlib lives in its configuration directory; sharing it across runs and workers
+    # means every label is only rendered by LaTeX once
+    if text_cache_directory is None:
+        text_cache_directory = manifest.parent / DEFAULT_TEXT_CACHE_DIRECTORY
+    text_cache_directory.mkdir(parents=True, exist_ok=True)
+    os.environ["MPLCONFIGDIR"] = str(text_cache_directory.resolve())
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        logfiles = sorted({figure["logfile"] for figure, _ in outdated})
+        for future in as_completed([executor.submit(_parse_logfile, logfile) for logfile in logfiles]):
+            try:
+                future.result()
+            except Exception as e:
+                # the plotter falls back to other formats, e.g., the logs of locust-parameter-variation.py
+                print(f"Could not parse a log file in advance: {e}")
+
+        futures = {executor.submit(_render, figure, fingerprint): figure for figure, fingerprint in outdated}
+        for future in as_completed(futures):
+            try:
+                print(f"Rendered: {future.result()}")
+            except Exception as e:
+                failed += 1
+                typer.echo(f"Error rendering {futures[future]['output']}: {e}", err=True)
+
+    if failed > 0:
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -1 +1,2 @@
+python3 -m common.workload_trace
 python3 executor.py locust/gen_gs_prod_workload.py --silent
@@ -54,7 +54,7 @@ echo "Using URL: $url"
 
 # Construct the python command with conditional silent flag
 if [ "$silent_execution" = true ]; then
-    python3 executor.py locust/official_teastore_locustfile.py -u "$url" -s
+    python3 executor.py locust/official_teastore_locustfile.py -u "$url" -s --in-process
 else
-    python3 executor.py locust/official_teastore_locustfile.py -u "$url"
+    python3 executor.py locust/official_teastore_locustfile.py -u "$url" --in-process
 fi
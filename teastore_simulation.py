@@ -7,9 +7,11 @@
 # Simulates the TeaStore software system using a model
 # obtained by the RAST approach.
 
+import argparse
 import asyncio
 import logging
 import os
+import time
 from logging.handlers import TimedRotatingFileHandler
 from uuid import uuid4
 
@@ -17,10 +19,13 @@ import numpy
 import pandas
 
 from fastapi import FastAPI, Request, HTTPException, Response
+from fastapi.responses import JSONResponse
 from joblib import load
 from uvicorn import run
 import gunicorn.app.base
 
+from common.cooldown import STATUS_PATH, create_status
+from common.teastore_service_graph import TeaStoreServiceGraph
 from stopwatch import Stopwatch
 
 app = FastAPI(
@@ -31,6 +36,10 @@ app = FastAPI(
 predictive_model = None
 known_request_types = []
 
+# Optionally simulate the services of the TeaStore instead of only the WebUI,
+# see common/teastore_service_graph.py.
+service_graph = TeaStoreServiceGraph.from_environment()
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -47,6 +56,7 @@ async def startup_event():
 
 number_of_parallel_requests_pending = 0
 startedCommands = {}
+last_completion_time = None
 
 
 # Because not everyone is using Python 3.9+ we use this one.
@@ -129,6 +139,11 @@ async def simulate_processing_time(request: Request, call_next):
 
     sleep_time_to_use = predict_sleep_time(predictive_model, tid, found_command)
     logger.debug(f"--> UID: {tid}, {found_command}: Elapsed time: {stopwatch.duration}s")
+
+    if service_graph is not None:
+        await service_graph.process(found_command, sleep_time_to_use - stopwatch.duration)
+        return await call_next(request)
+
     sleep_time_to_use -= stopwatch.duration
     sleep_time_to_use = max(0, sleep_time_to_use)
 
@@ -158,6 +173,19 @@ async def simulate_processing_time(request: Request, call_next):
     return response
 
 
+def get_status() -> dict:
+    if service_graph is None:
+        return create_status(number_of_parallel_requests_pending, 0, last_completion_time)
+
+    services = service_graph.status()
+    return create_status(
+        number_of_parallel_requests_pending,
+        sum(service["queued"] for service in services.values()),
+        last_completion_time,
+        services=services
+    )
+
+
 @app.middleware("http")
 async def track_parallel_requests(request: Request, call_next):
     global number_of_parallel_requests_pending
@@ -177,9 +205,12 @@ async def track_parallel_requests(request: Request, call_next):
         "parallelCommandsFinished": 0
     }
 
+    global last_completion_time
+
     response = await call_next(request)
 
     number_of_parallel_requests_pending = number_of_parallel_requests_pending - 1
+    last_completion_time = time.time()
 
     startedCommands.pop(tid)
 
@@ -198,6 +229,9 @@ async def extract_command(request: Request, call_next):
     if request.url.path == "/" or request.url.path == "/logs/reset":
         return Response(content="Empty response", media_type="text/plain")
 
+    if request.url.path == STATUS_PATH:
+        return JSONResponse(get_status())
+
     # command = request.url.path.removeprefix(prefix)
     if request.url.path != prefix:
         command = remove_prefix(request.url.path, prefix)
@@ -342,10 +376,21 @@ class StandaloneApplication(gunicorn.app.base.BaseApplication):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Simulate the TeaStore using a model obtained by the RAST approach.')
+    parser.add_argument('--port', type=int, default=1337, help='port to listen on (default: 1337)')
+    parser.add_argument('--service-graph', action='store_true',
+                        help='route every request through simulated webui, auth, persistence, image, recommender '
+                             'and db services, each with its own concurrency limit')
+    args = parser.parse_args()
+
+    if args.service_graph:
+        # uvicorn imports this module again, so we pass the option via the environment
+        os.environ['TEASTORE_SERVICE_GRAPH'] = 'True'
+
     run(
         "teastore_simulation:app",
         host="0.0.0.0",
-        port=1337,
+        port=args.port,
         log_level="info",
         access_log=False,
         backlog=2048,